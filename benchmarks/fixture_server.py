@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Serve the recorded BBC, Mail Online and Sun pages in benchmarks/fixtures from a local server.
+
+Real outlet URLs map onto the server by host, e.g. https://www.bbc.co.uk/news/uk-66001001 is served at
+http://127.0.0.1:{port}/bbc/news/uk-66001001. Pages carry an ETag so conditional requests can be benchmarked too.'''
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+import hashlib
+import json
+import os
+import threading
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+HOSTS = {"www.bbc.co.uk": "bbc", "www.dailymail.co.uk": "mail", "www.thesun.co.uk": "sun"}
+
+
+def load_manifest(fixtures_dir=FIXTURES_DIR) -> dict:
+    with open(os.path.join(fixtures_dir, "manifest.json")) as file:
+        return json.load(file)
+
+
+def local_path(url) -> str:
+    parts = urlsplit(url)
+    return f"/{HOSTS[parts.netloc]}{parts.path or '/'}"
+
+
+class FixtureServer:
+    '''Recorded pages for every outlet in the manifest, served in a background thread'''
+
+    def __init__(self, fixtures_dir=FIXTURES_DIR, port=0):
+        self.manifest = load_manifest(fixtures_dir)
+        self.pages = {}
+        for outlet in self.manifest.values():
+            self.pages[local_path(outlet["home_url"])] = os.path.join(fixtures_dir, outlet["home"])
+            for url, filename in outlet["articles"].items():
+                self.pages[local_path(url)] = os.path.join(fixtures_dir, filename)
+
+        pages = self.pages
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                filename = pages.get(self.path.split("?")[0])
+                if filename is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                with open(filename, "rb") as file:
+                    body = file.read()
+                etag = '"%s"' % hashlib.sha1(body).hexdigest()
+
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def local_url(self, url) -> str:
+        '''Where a real outlet URL is served locally'''
+
+        return self.base_url + local_path(url)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Offline benchmark of each stage of a scrape, against the recorded outlet pages in benchmarks/fixtures
+and the EquiQuote stub (web page and API).
+
+    python benchmarks/run_benchmark.py                  # run, save results and compare with the baseline
+    python benchmarks/run_benchmark.py --save-baseline  # run and make this the new baseline
+
+Stages that need Chrome are skipped, and marked as skipped in the results, if no browser can be started.'''
+
+from datetime import datetime
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+
+from fixture_server import FixtureServer
+from driver_pool import DriverPool
+from equiquote_client import EquiQuoteClient
+from fast_extract import FastArticleContent, article_text, make_session
+from outlets import OUTLETS
+from sinks import make_sink
+import equiquote_stub
+import scraper
+
+
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, "results")
+BASELINE_PATH = os.path.join(BENCHMARKS_DIR, "baseline.json")
+
+
+def time_stage(function, repeat) -> dict:
+    '''Run a stage several times and keep every timing. Returns the timings and the last result'''
+
+    runs = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        runs.append(time.perf_counter() - start)
+    return {"seconds": statistics.median(runs), "min": min(runs), "runs": runs}, result
+
+
+def run_benchmark(repeat=3, equiquote_port=5000, equiquote_delay=0.2, browser=True) -> dict:
+    fixtures = FixtureServer()
+    stub = equiquote_stub.serve_in_thread(port=equiquote_port, delay=equiquote_delay)
+    equiquote_url = f"http://127.0.0.1:{stub.server_port}"
+    scraper.EQUIQUOTE_URL = equiquote_url
+    scraper.EQUIQUOTE_URLS = [equiquote_url]
+    # A second copy of the backend, for spreading texts over several instances
+    second_stub = equiquote_stub.serve_in_thread(port=0, delay=equiquote_delay)
+
+    stages = {}
+    links_by_source = {source_name: list(outlet["articles"]) for source_name, outlet in fixtures.manifest.items()}
+    article_count = sum(len(links) for links in links_by_source.values())
+
+    pool = DriverPool(size=1)
+    if browser:
+        try:
+            stages["driver_start"], _ = time_stage(lambda: pool.warm_up(1), 1)
+        except Exception as e:
+            print("No browser available, skipping browser stages:", e)
+            browser = False
+    skipped = {"skipped": "no browser"}
+
+    # Homepage link discovery in Chrome
+    if browser:
+        def discover_links():
+            found = {}
+            with pool.driver() as driver:
+                for source_name in fixtures.manifest:
+                    outlet = OUTLETS[source_name]
+                    found[source_name] = scraper.Homepage(driver, outlet, home_url=fixtures.local_url(outlet.home_url)).links
+            return found
+
+        stages["homepage_discovery"], found = time_stage(discover_links, repeat)
+        stages["homepage_discovery"]["links"] = {source_name: len(links) for source_name, links in found.items()}
+    else:
+        stages["homepage_discovery"] = skipped
+
+    # Article extraction over plain HTTP
+    session = make_session(pool_size=4)
+
+    def extract_fast():
+        return [FastArticleContent(session, fixtures.local_url(link), source_name)
+                for source_name, links in links_by_source.items() for link in links]
+
+    stages["article_extraction_fast"], articles = time_stage(extract_fast, repeat)
+    stages["article_extraction_fast"]["per_article"] = stages["article_extraction_fast"]["seconds"] / article_count
+    session.close()
+
+    # Article extraction in Chrome
+    if browser:
+        def extract_browser():
+            with pool.driver() as driver:
+                return [scraper.load_article(lambda: driver, fixtures.local_url(link), source_name)
+                        for source_name, links in links_by_source.items() for link in links]
+
+        stages["article_extraction_browser"], _ = time_stage(extract_browser, repeat)
+        stages["article_extraction_browser"]["per_article"] = stages["article_extraction_browser"]["seconds"] / article_count
+    else:
+        stages["article_extraction_browser"] = skipped
+
+    texts = [article_text(article.text) for article in articles]
+
+    # EquiQuote round trip through the API and through the web page
+    client = EquiQuoteClient(equiquote_url, workers=scraper.EQUIQUOTE_WORKERS, batch_size=scraper.EQUIQUOTE_BATCH_SIZE)
+    stages["equiquote_api"], results = time_stage(lambda: client.get_results(texts), repeat)
+    client.close()
+
+    def dispatch_to_two():
+        scraper.EQUIQUOTE_URLS = [equiquote_url, f"http://127.0.0.1:{second_stub.server_port}"]
+        try:
+            return scraper.analyse_texts(pool, texts)
+        finally:
+            scraper.EQUIQUOTE_URLS = [equiquote_url]
+
+    stages["equiquote_two_backends"], _ = time_stage(dispatch_to_two, repeat)
+    scraper.close_equiquote_clients()
+
+    if browser:
+        def analyse_in_browser():
+            with pool.driver() as driver:
+                return scraper.get_equiquote_results(texts, driver)
+
+        stages["equiquote_ui"], _ = time_stage(analyse_in_browser, 1)
+    else:
+        stages["equiquote_ui"] = skipped
+
+    # Writing every article to the CSV and JSONL sinks
+    records = []
+    for (source_name, link), article, recommendation, suggestions, detected in zip(
+            [(source_name, link) for source_name, links in links_by_source.items() for link in links], articles, *results):
+        records.append((source_name, {'link': link, 'title': article.title, 'byline': article.byline, 'time': article.time,
+                                      'text': article.text, 'recommendations': recommendation,
+                                      'source_suggestions': suggestions, 'sources_detected': detected}))
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        def write_output():
+            sink = make_sink(["csv", "jsonl"], output_dir)
+            for source_name, record in records:
+                sink.write(source_name, record)
+            sink.close()
+
+        stages["output_write"], _ = time_stage(write_output, repeat)
+
+    pool.close()
+    stub.shutdown()
+    second_stub.shutdown()
+    fixtures.close()
+
+    return {
+        "created_at": datetime.now().isoformat(timespec='seconds'),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "articles": article_count,
+        "repeat": repeat,
+        "stages": stages,
+    }
+
+
+def compare(result, baseline, tolerance) -> list:
+    '''Stages whose median time grew by more than the tolerance (and by more than 10ms, to ignore noise) since the baseline'''
+
+    regressions = []
+    for stage, timing in result["stages"].items():
+        before = baseline["stages"].get(stage, {})
+        if "seconds" not in timing or "seconds" not in before:
+            continue
+        if timing["seconds"] > before["seconds"] * (1 + tolerance) and timing["seconds"] - before["seconds"] > 0.01:
+            regressions.append((stage, before["seconds"], timing["seconds"]))
+    return regressions
+
+
+def print_report(result, baseline=None):
+    print(f"{'stage':<28}{'median (s)':>12}{'baseline (s)':>14}{'change':>10}")
+    for stage, timing in result["stages"].items():
+        if "seconds" not in timing:
+            print(f"{stage:<28}{timing.get('skipped', 'skipped'):>12}")
+            continue
+        before = (baseline or {}).get("stages", {}).get(stage, {}).get("seconds")
+        change = f"{(timing['seconds'] - before) / before:+.0%}" if before else ""
+        before_text = f"{before:.4f}" if before is not None else ""
+        print(f"{stage:<28}{timing['seconds']:>12.4f}{before_text:>14}{change:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark each scrape stage offline")
+    parser.add_argument("--repeat", type=int, default=3, help="times to run each stage")
+    parser.add_argument("--equiquote-port", type=int, default=5000, help="port for the EquiQuote stub (0 picks a free one)")
+    parser.add_argument("--equiquote-delay", type=float, default=0.2, help="seconds the stub takes per article")
+    parser.add_argument("--no-browser", action="store_true", help="only run the stages that don't need Chrome")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="record this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="slowdown allowed before a stage counts as a regression")
+    args = parser.parse_args()
+
+    result = run_benchmark(args.repeat, args.equiquote_port, args.equiquote_delay, browser=not args.no_browser)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    result_path = os.path.join(RESULTS_DIR, f"benchmark_{datetime.now().strftime('%Y-%m-%d_%H%M%S')}.json")
+    with open(result_path, "w") as file:
+        json.dump(result, file, indent=2)
+    print(f"Results written to {result_path}")
+
+    baseline = None
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(result, file, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+
+    print_report(result, baseline)
+
+    if baseline is not None:
+        regressions = compare(result, baseline, args.tolerance)
+        for stage, before, after in regressions:
+            print(f"Regression in {stage}: {before:.4f}s -> {after:.4f}s")
+        sys.exit(1 if regressions else 0)
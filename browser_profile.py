@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''How the scraper's Chrome sessions are launched: headless, with the images, fonts, video, ads and
+trackers that outlet pages pull in blocked, and a disk cache that survives between sessions and runs.
+
+Blocking is done per session over CDP (Network.setBlockedURLs), so an outlet can lift any of the blocks
+it needs (see allow_requests in outlets.py), e.g. The Sun's cookie prompt, which is loaded from its
+consent manager.
+
+To see what blocking saves on real pages, compare a plain browser with this profile:
+
+    python browser_profile.py --compare                       # every outlet's homepage
+    python browser_profile.py --compare --outlet Sun https://www.thesun.co.uk/news/...'''
+
+import argparse
+import json
+import os
+import time
+
+
+HEADLESS = True
+
+# Kinds of resource never needed to read an article. Setting the blocks works on URLs, so each kind is
+# matched by its file extensions (images are also switched off in Chrome's content settings, which catches
+# image URLs without an extension)
+BLOCK_RESOURCE_TYPES = ["image", "font", "media"]
+
+RESOURCE_TYPE_PATTERNS = {
+    "image": ["*.jpg*", "*.jpeg*", "*.png*", "*.gif*", "*.webp*", "*.avif*", "*.svg*", "*.ico*"],
+    "font": ["*.woff*", "*.ttf*", "*.otf*", "*.eot*"],
+    "media": ["*.mp4*", "*.webm*", "*.m3u8*", "*.m4s*", "*.mp3*"],
+    "stylesheet": ["*.css*"],
+}
+
+# Ad, tracking and consent scripts the outlets load on every page
+BLOCK_URL_PATTERNS = [
+    "*doubleclick.net*", "*googlesyndication.com*", "*googletagmanager.com*", "*google-analytics.com*",
+    "*googletagservices.com*", "*adservice.google.*", "*amazon-adsystem.com*", "*scorecardresearch.com*",
+    "*chartbeat.*", "*taboola.com*", "*outbrain.com*", "*facebook.net*", "*hotjar.com*", "*permutive.*",
+    "*krxd.net*", "*criteo.*", "*pubmatic.com*", "*rubiconproject.com*", "*adnxs.com*", "*indexww.com*",
+    "*privacy-mgmt.com*", "*sourcepoint*",
+]
+
+# Chrome's disk cache is kept here between sessions and runs, one directory per pool slot because
+# Chrome can't share a cache directory between browsers running at the same time
+CACHE_DIR = "data/chrome_cache"
+CACHE_SIZE_MB = 200
+
+
+class BrowserProfile:
+    '''Chrome options and request blocking for the scraper's sessions'''
+
+    def __init__(self, headless=HEADLESS, block_resource_types=BLOCK_RESOURCE_TYPES,
+                 block_url_patterns=BLOCK_URL_PATTERNS, cache_dir=CACHE_DIR):
+        self.headless = headless
+        self.block_resource_types = list(block_resource_types or [])
+        self.block_url_patterns = list(block_url_patterns or [])
+        self.cache_dir = cache_dir
+
+    def options(self, slot=None):
+        from selenium import webdriver
+
+        options = webdriver.ChromeOptions()
+        if self.headless:
+            options.add_argument("--headless=new")
+            options.add_argument("--window-size=1920,1080")
+        if self.cache_dir and slot is not None:
+            cache_dir = os.path.abspath(os.path.join(self.cache_dir, str(slot)))
+            os.makedirs(cache_dir, exist_ok=True)
+            options.add_argument(f"--disk-cache-dir={cache_dir}")
+            options.add_argument(f"--disk-cache-size={CACHE_SIZE_MB * 1024 * 1024}")
+        if "image" in self.block_resource_types:
+            options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+        return options
+
+    def blocked_urls(self, outlet=None) -> list:
+        '''URL patterns to block while loading this outlet's pages'''
+
+        patterns = [pattern for resource_type in self.block_resource_types
+                    for pattern in RESOURCE_TYPE_PATTERNS.get(resource_type, [])]
+        patterns += self.block_url_patterns
+        allowed = set(getattr(outlet, 'allow_requests', None) or [])
+        return [pattern for pattern in patterns if pattern not in allowed]
+
+    def prepare(self, driver):
+        '''Turn on blocking for a new session. Returns the driver'''
+
+        from selenium.common.exceptions import WebDriverException
+
+        driver.browser_profile = self
+        driver.blocked_for = None
+        try:
+            driver.execute_cdp_cmd("Network.enable", {})
+        except WebDriverException as e:
+            print("Error enabling request blocking:", e)
+            driver.browser_profile = None
+            return driver
+        self.use_outlet(driver, None)
+        return driver
+
+    def use_outlet(self, driver, outlet):
+        '''Switch the session's blocked URLs to this outlet's, if they aren't already'''
+
+        from selenium.common.exceptions import WebDriverException
+
+        name = getattr(outlet, 'name', '')
+        if getattr(driver, 'blocked_for', None) == name:
+            return
+        try:
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": self.blocked_urls(outlet)})
+            driver.blocked_for = name
+        except WebDriverException as e:
+            print("Error setting blocked URLs:", e)
+
+
+def use_outlet(driver, outlet):
+    '''Apply an outlet's request blocking to a session started with a BrowserProfile (no-op otherwise)'''
+
+    profile = getattr(driver, 'browser_profile', None)
+    if profile is not None:
+        profile.use_outlet(driver, outlet)
+
+
+def measure_page(driver_path, profile, url, outlet=None) -> dict:
+    '''Load a page in a fresh session with the cache off, and total what it downloaded from Chrome's network log'''
+
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+
+    options = profile.options()
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    driver = webdriver.Chrome(service=Service(driver_path), options=options)
+    try:
+        profile.prepare(driver)
+        driver.execute_cdp_cmd("Network.setCacheDisabled", {"cacheDisabled": True})
+        profile.use_outlet(driver, outlet)
+
+        start = time.perf_counter()
+        driver.get(url)
+        seconds = time.perf_counter() - start
+
+        downloaded = requests = blocked = 0
+        for entry in driver.get_log("performance"):
+            message = json.loads(entry["message"])["message"]
+            if message["method"] == "Network.loadingFinished":
+                downloaded += message["params"].get("encodedDataLength", 0)
+                requests += 1
+            elif message["method"] == "Network.loadingFailed" and message["params"].get("blockedReason"):
+                blocked += 1
+        return {"bytes": downloaded, "requests": requests, "blocked": blocked, "seconds": seconds}
+    finally:
+        driver.quit()
+
+
+def compare(pages, profile) -> dict:
+    '''Bytes and load time saved by a profile compared with a plain (but still headless) browser,
+    over a list of (url, outlet) pages'''
+
+    from driver_pool import resolve_driver_path
+
+    driver_path = resolve_driver_path()
+    plain = BrowserProfile(headless=profile.headless, block_resource_types=[], block_url_patterns=[], cache_dir=None)
+
+    totals = {"plain_bytes": 0, "profile_bytes": 0, "plain_seconds": 0.0, "profile_seconds": 0.0}
+    print(f"{'page':<60}{'plain MB':>10}{'blocked MB':>12}{'plain s':>9}{'blocked s':>11}{'requests blocked':>18}")
+    for url, outlet in pages:
+        before = measure_page(driver_path, plain, url, outlet)
+        after = measure_page(driver_path, profile, url, outlet)
+        print(f"{url[:59]:<60}{before['bytes'] / 1e6:>10.2f}{after['bytes'] / 1e6:>12.2f}"
+              f"{before['seconds']:>9.2f}{after['seconds']:>11.2f}{after['blocked']:>18}")
+        totals["plain_bytes"] += before["bytes"]
+        totals["profile_bytes"] += after["bytes"]
+        totals["plain_seconds"] += before["seconds"]
+        totals["profile_seconds"] += after["seconds"]
+
+    totals["bytes_saved"] = totals["plain_bytes"] - totals["profile_bytes"]
+    totals["seconds_saved"] = totals["plain_seconds"] - totals["profile_seconds"]
+    print(f"Saved {totals['bytes_saved'] / 1e6:.2f} MB and {totals['seconds_saved']:.2f}s over {len(pages)} pages")
+    return totals
+
+
+if __name__ == "__main__":
+    from outlets import OUTLETS
+
+    parser = argparse.ArgumentParser(description="Report what the browser profile's request blocking saves")
+    parser.add_argument("--compare", action="store_true", required=True, help="load each page with and without blocking")
+    parser.add_argument("--outlet", choices=list(OUTLETS), help="apply this outlet's allow list")
+    parser.add_argument("--headed", action="store_true", help="show the browser")
+    parser.add_argument("urls", nargs="*", help="pages to load (default: every outlet's homepage)")
+    args = parser.parse_args()
+
+    if args.urls:
+        pages = [(url, OUTLETS[args.outlet] if args.outlet else None) for url in args.urls]
+    else:
+        outlets = [OUTLETS[args.outlet]] if args.outlet else OUTLETS.values()
+        pages = [(outlet.home_url, outlet) for outlet in outlets]
+    compare(pages, BrowserProfile(headless=not args.headed))
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Progress of each outlet's run, saved after every stage: the homepage links found, then each article as
+it is scraped, analysed by EquiQuote and written out. A run that fails part-way leaves its checkpoint
+behind, and the next run of that outlet carries on from it instead of loading the homepage, the articles
+and EquiQuote again. An outlet's checkpoint is cleared once all of its articles have been written.'''
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+# Stages an article goes through, in order
+SCRAPED = "scraped"
+ANALYSED = "analysed"
+WRITTEN = "written"
+
+
+class Checkpoints:
+    '''Checkpoints for every outlet, kept in SQLite. One older than max_age_hours is stale (its homepage
+    links are out of date by then) and is thrown away rather than resumed'''
+
+    def __init__(self, path, max_age_hours=12):
+        self.path = path
+        self.max_age = max_age_hours * 60 * 60
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        with self.db:
+            self.db.execute('''CREATE TABLE IF NOT EXISTS outlet_runs (
+                source TEXT PRIMARY KEY,
+                started_at REAL,
+                links TEXT
+            )''')
+            self.db.execute('''CREATE TABLE IF NOT EXISTS articles (
+                source TEXT,
+                link TEXT,
+                stage TEXT,
+                article_data TEXT,
+                failures INTEGER DEFAULT 0,
+                updated_at REAL,
+                written_to TEXT,
+                PRIMARY KEY (source, link)
+            )''')
+            # Checkpoints from before articles recorded the sinks they were written to
+            columns = [row['name'] for row in self.db.execute('PRAGMA table_info(articles)')]
+            if 'written_to' not in columns:
+                self.db.execute('ALTER TABLE articles ADD COLUMN written_to TEXT')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self.db.close()
+
+    def links(self, source):
+        '''Links found on the outlet's homepage by an unfinished run, or None to load the homepage again'''
+
+        with self._lock:
+            row = self.db.execute('SELECT started_at, links FROM outlet_runs WHERE source = ?', (source,)).fetchone()
+        if row is None:
+            return None
+        if time.time() - row['started_at'] > self.max_age:
+            print(f"Checkpoint for {source} is too old to resume, starting again")
+            self.finish(source)
+            return None
+        return json.loads(row['links'])
+
+    def save_links(self, source, links):
+        with self._lock, self.db:
+            self.db.execute('DELETE FROM articles WHERE source = ?', (source,))
+            self.db.execute('INSERT OR REPLACE INTO outlet_runs VALUES (?, ?, ?)', (source, time.time(), json.dumps(links)))
+
+    def article(self, source, link):
+        '''{'stage', 'article_data', 'failures', 'written_to'} saved for an article by an unfinished run, or
+        None. article_data is None for an article that was skipped as unchanged, and written_to lists the
+        sinks that took the article before another one failed'''
+
+        with self._lock:
+            row = self.db.execute('SELECT stage, article_data, failures, written_to FROM articles WHERE source = ? AND link = ?',
+                                  (source, link)).fetchone()
+        if row is None:
+            return None
+        return {'stage': row['stage'], 'article_data': json.loads(row['article_data']), 'failures': row['failures'],
+                'written_to': json.loads(row['written_to'] or '[]')}
+
+    def save_article(self, source, link, stage, article_data, failures=0, written_to=()):
+        with self._lock, self.db:
+            self.db.execute('INSERT OR REPLACE INTO articles (source, link, stage, article_data, failures, updated_at, written_to) '
+                            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                            (source, link, stage, json.dumps(article_data), failures, time.time(), json.dumps(list(written_to))))
+
+    def finish(self, source):
+        '''Every article of the outlet's run has been written, so there is nothing left to resume'''
+
+        with self._lock, self.db:
+            self.db.execute('DELETE FROM articles WHERE source = ?', (source,))
+            self.db.execute('DELETE FROM outlet_runs WHERE source = ?', (source,))
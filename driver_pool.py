@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+from browser_profile import BrowserProfile
+from tracing import tracer
+from contextlib import contextmanager
+import json
+import os
+import queue
+import threading
+import time
+
+
+# A chromedriver you installed yourself. Left as None, webdriver_manager finds (and downloads) the right one
+CHROMEDRIVER_PATH = None
+
+# webdriver_manager checks online for the chromedriver that matches Chrome every time it is asked, so the
+# path it gives is kept here and reused by later runs, offline too. It is looked up again after
+# DRIVER_PATH_MAX_AGE_DAYS, or straight away if Chrome won't start with it (after a Chrome update)
+DRIVER_PATH_CACHE = "data/chromedriver_path.json"
+DRIVER_PATH_MAX_AGE_DAYS = 7
+
+
+def resolve_driver_path(refresh=False) -> str:
+    '''Path to chromedriver: CHROMEDRIVER_PATH, the cached path, or a fresh lookup with webdriver_manager.
+    If the lookup fails (e.g. no network) a cached path is used even when it is old'''
+
+    if CHROMEDRIVER_PATH:
+        return CHROMEDRIVER_PATH
+
+    cached = None
+    try:
+        with open(DRIVER_PATH_CACHE) as file:
+            cached = json.load(file)
+        if not os.path.exists(cached['path']):
+            cached = None
+    except (OSError, ValueError, KeyError, TypeError):
+        cached = None
+
+    if cached is not None and not refresh and time.time() - cached['resolved_at'] < DRIVER_PATH_MAX_AGE_DAYS * 24 * 60 * 60:
+        return cached['path']
+
+    try:
+        from webdriver_manager.chrome import ChromeDriverManager
+
+        path = ChromeDriverManager().install()
+    except Exception as e:
+        if cached is None:
+            raise
+        print("Error looking up chromedriver, using the one found before:", e)
+        return cached['path']
+
+    try:
+        directory = os.path.dirname(DRIVER_PATH_CACHE)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(DRIVER_PATH_CACHE, 'w') as file:
+            json.dump({'path': path, 'resolved_at': time.time()}, file)
+    except OSError as e:
+        print("Error caching the chromedriver path:", e)
+    return path
+
+
+class DriverPool:
+    '''Start a small number of Chrome sessions once and lend them out to each phase of a run.
+    Sessions are reset between uses (cookies, frames, extra tabs) instead of being quit, and are launched
+    with a BrowserProfile (headless and blocking what the scraper doesn't read, by default)'''
+
+    def __init__(self, size=1, profile=None):
+        self.size = max(1, size)
+        self.profile = profile or BrowserProfile()
+        self.driver_path = None
+        self.started = 0
+        # Each live session has a slot, which picks its disk cache directory
+        self._free_slots = list(range(self.size))
+        self._idle = queue.LifoQueue()
+        self._drivers = []
+        # Guards the slots and sessions; Chrome is launched outside it
+        self._lock = threading.Lock()
+        self._path_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def launch(self, slot):
+        from selenium import webdriver
+        from selenium.webdriver.chrome.service import Service
+
+        return webdriver.Chrome(service=Service(self.driver_path), options=self.profile.options(slot))
+
+    def reserve_slot(self):
+        '''Claim a slot for a new session, or None if every slot has a session running or starting'''
+
+        with self._lock:
+            return self._free_slots.pop(0) if self._free_slots else None
+
+    def start_driver(self, slot):
+        '''Launch a session in a slot claimed with reserve_slot. Runs without the pool lock, so borrowers
+        and other launches aren't held up while Chrome starts, and gives the slot back if Chrome fails'''
+
+        from selenium.common.exceptions import SessionNotCreatedException
+
+        try:
+            # Resolve chromedriver once per pool rather than once per session
+            with self._path_lock:
+                if self.driver_path is None:
+                    with tracer.span("driver.resolve"):
+                        self.driver_path = resolve_driver_path()
+                driver_path = self.driver_path
+            with tracer.span("driver.start"):
+                try:
+                    driver = self.launch(slot)
+                except SessionNotCreatedException:
+                    # Usually a cached chromedriver that no longer matches Chrome after an update
+                    with self._path_lock:
+                        if self.driver_path == driver_path:
+                            self.driver_path = resolve_driver_path(refresh=True)
+                            if self.driver_path == driver_path:
+                                raise
+                            print("Chrome wouldn't start with the cached chromedriver, using", self.driver_path)
+                    driver = self.launch(slot)
+            driver.browser_slot = slot
+            driver = self.profile.prepare(tracer.instrument_driver(driver))
+        except Exception:
+            with self._lock:
+                self._free_slots.append(slot)
+            raise
+
+        with self._lock:
+            self._drivers.append(driver)
+            self.started += 1
+        return driver
+
+    def warm_up(self, count=None):
+        '''Start sessions up front so the first borrowers don't pay for browser startup'''
+
+        count = self.size if count is None else min(count, self.size)
+        while True:
+            with self._lock:
+                if self.size - len(self._free_slots) >= count:
+                    break
+                slot = self._free_slots.pop(0)
+            self._idle.put(self.start_driver(slot))
+
+    def acquire(self, timeout=None):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        slot = self.reserve_slot()
+        if slot is not None:
+            return self.start_driver(slot)
+
+        # Every session is lent out or starting, wait for one to come back (raises queue.Empty after the timeout)
+        return self._idle.get(timeout=timeout)
+
+    def release(self, driver):
+        if self.reset(driver):
+            self._idle.put(driver)
+        else:
+            self.discard(driver)
+
+    def discard(self, driver):
+        '''Drop a broken session so the next borrower gets a fresh one'''
+
+        with self._lock:
+            if driver in self._drivers:
+                self._drivers.remove(driver)
+                self._free_slots.append(driver.browser_slot)
+        try:
+            driver.quit()
+        except Exception as e:
+            print("Error quitting webdriver:", e)
+
+    @contextmanager
+    def driver(self):
+        driver = self.acquire()
+        try:
+            yield driver
+        finally:
+            self.release(driver)
+
+    def reset(self, driver) -> bool:
+        '''Return a session to a clean state, or False if it is no longer usable'''
+
+        from selenium.common.exceptions import NoAlertPresentException, WebDriverException
+
+        try:
+            try:
+                driver.switch_to.alert.dismiss()
+            except NoAlertPresentException:
+                pass
+
+            # Close any tabs or windows opened while the session was lent out
+            handles = driver.window_handles
+            for handle in handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(handles[0])
+            driver.switch_to.default_content()
+
+            # delete_all_cookies only clears the current domain, so clear the whole browser over CDP
+            try:
+                driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+            except WebDriverException:
+                driver.delete_all_cookies()
+
+            driver.get("about:blank")
+            return True
+        except Exception as e:
+            print("Error resetting webdriver, discarding it:", e)
+            return False
+
+    def close(self):
+        with self._lock:
+            drivers, self._drivers = self._drivers, []
+            self._free_slots = list(range(self.size))
+
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception as e:
+                print("Error quitting webdriver:", e)
+
+        self._idle = queue.LifoQueue()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Client for the EquiQuote backend, so articles can be analysed without driving the web UI.
+
+The backend is expected to answer:
+
+    POST /api/analyse        {"article_text": "..."}          -> one result
+    POST /api/analyse_batch  {"articles": ["...", "..."]}     -> {"results": [result, ...]}
+    GET  /api/health                                          -> 200 while the backend is up
+
+where each result is {"recommendations": "...", "source_suggestions": [{"job": ..., "suggestions": ...}],
+"sources_detected": [{"Source": ..., "Gender": ..., ...}]}. equiquote_stub.py serves the same API offline.'''
+
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+import json
+import requests
+
+
+class EquiQuoteAPIError(Exception):
+    '''The EquiQuote backend could not be reached or does not serve the API'''
+
+
+class EquiQuoteClient:
+    '''Submit article texts to the EquiQuote backend in batches, or concurrently one by one
+    if the backend has no batch endpoint'''
+
+    def __init__(self, base_url="http://localhost:5000", workers=4, batch_size=5, timeout=150):
+        self.base_url = base_url.rstrip("/")
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.timeout = timeout
+        self.supports_batch = True
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self):
+        self.session.close()
+
+    def post(self, path, payload) -> requests.Response:
+        try:
+            return self.session.post(f"{self.base_url}{path}", json=payload, timeout=self.timeout)
+        except requests.ConnectionError as e:
+            raise EquiQuoteAPIError(f"Could not connect to EquiQuote at {self.base_url}: {e}")
+
+    def analyse(self, text) -> dict:
+        response = self.post("/api/analyse", {"article_text": text})
+        if response.status_code == 404:
+            raise EquiQuoteAPIError(f"EquiQuote at {self.base_url} has no /api/analyse endpoint")
+        response.raise_for_status()
+        return response.json()
+
+    def analyse_batch(self, texts) -> list:
+        '''Analyse several texts, returning one result per text in the same order'''
+
+        if self.supports_batch:
+            response = self.post("/api/analyse_batch", {"articles": texts})
+            if response.status_code == 404:
+                # Older backends only analyse one article per request
+                self.supports_batch = False
+            else:
+                response.raise_for_status()
+                results = response.json()["results"]
+                if len(results) != len(texts):
+                    raise ValueError(f"EquiQuote returned {len(results)} results for {len(texts)} articles")
+                return results
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return list(executor.map(self.analyse, texts))
+
+    def analyse_all(self, text_list) -> list:
+        '''Results for every text, with None for texts whose batch failed'''
+
+        batches = [text_list[i:i + self.batch_size] for i in range(0, len(text_list), self.batch_size)]
+
+        def run_batch(batch):
+            try:
+                return self.analyse_batch(batch)
+            except EquiQuoteAPIError:
+                raise
+            except Exception as e:
+                print("Error analysing batch with EquiQuote:", e)
+                return [None] * len(batch)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return [result for results in executor.map(run_batch, batches) for result in results]
+
+    def get_results(self, text_list):
+        '''Same three lists as get_equiquote_results, with 'N/A' wherever a text got no result'''
+
+        recommendations_list = []
+        source_suggestions_list = []
+        sources_detected_list = []
+
+        for result in self.analyse_all(text_list):
+            recommendation, suggestions, detected = format_result(result)
+            recommendations_list.append(recommendation)
+            source_suggestions_list.append(suggestions)
+            sources_detected_list.append(detected)
+
+        return recommendations_list, source_suggestions_list, sources_detected_list
+
+
+def format_result(result):
+    '''Turn one API result into the recommendations, source_suggestions and sources_detected
+    values the UI scraper produces'''
+
+    if not result:
+        return 'N/A', 'N/A', 'N/A'
+
+    recommendation = result.get("recommendations") or 'N/A'
+    suggestions = [{"job": item["job"], "suggestions": item["suggestions"]} for item in result.get("source_suggestions") or []]
+    detected = result.get("sources_detected") or []
+
+    return recommendation, suggestions or 'N/A', json.dumps(detected) if detected else 'N/A'
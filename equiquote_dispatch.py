@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Spread article texts over every EquiQuote backend available, through its API or through browser
+tabs on its web page, and put the results back in the order the texts came in.
+
+Each way of reaching a backend is a lane. Lanes take texts from one shared queue, so a fast backend simply
+gets through more of them. When the queue is empty, an idle lane takes a second copy of any text that has
+been in progress for longer than steal_after seconds, and whichever copy finishes first is used. A lane
+whose backend goes away hands its texts back to the queue. The results are returned as soon as every
+text has one, while a lane that lost a race finishes its copy in the background: call join() before
+starting lanes that need the same browser sessions, or closing the pool.'''
+
+from equiquote_client import EquiQuoteAPIError, format_result
+from tracing import tracer
+import math
+import requests
+import threading
+import time
+
+
+class LaneDown(Exception):
+    '''The lane can't be used any more; its texts go back to the queue for the other lanes'''
+
+
+class APILane:
+    '''Texts sent to one backend's API, up to batch_size per request. Lanes for the same backend can
+    share one EquiQuoteClient'''
+
+    def __init__(self, client, batch_size=5):
+        self.client = client
+        self.batch_size = max(1, batch_size)
+        self.name = f"api {client.base_url}"
+
+    def healthy(self, timeout=5) -> bool:
+        try:
+            return self.client.session.get(f"{self.client.base_url}/api/health", timeout=timeout).status_code == 200
+        except requests.RequestException:
+            return False
+
+    def start(self):
+        pass
+
+    def analyse(self, texts) -> list:
+        try:
+            return [format_result(result) for result in self.client.analyse_batch(texts)]
+        except EquiQuoteAPIError as e:
+            raise LaneDown(str(e))
+        except Exception as e:
+            print(f"Error analysing with {self.name}:", e)
+            return [None] * len(texts)
+
+    def close(self):
+        pass
+
+
+class BrowserLane:
+    '''One browser session from the pool with a backend's web page open, analysing one text at a time
+    with analyse_page(driver, text) -> (recommendations, source_suggestions, sources_detected)'''
+
+    batch_size = 1
+
+    def __init__(self, pool, url, analyse_page, acquire_timeout=60):
+        self.pool = pool
+        self.url = url
+        self.analyse_page = analyse_page
+        self.acquire_timeout = acquire_timeout
+        self.driver = None
+        self.name = f"tab {url}"
+
+    def healthy(self, timeout=5) -> bool:
+        try:
+            return requests.get(self.url, timeout=timeout).status_code == 200
+        except requests.RequestException:
+            return False
+
+    def start(self):
+        try:
+            self.driver = self.pool.acquire(timeout=self.acquire_timeout)
+            self.driver.get(self.url)
+        except Exception as e:
+            raise LaneDown(f"could not open {self.url}: {e}")
+
+    def analyse(self, texts) -> list:
+        try:
+            return [self.analyse_page(self.driver, text) for text in texts]
+        except Exception as e:
+            raise LaneDown(str(e))
+
+    def close(self):
+        if self.driver is not None:
+            self.pool.release(self.driver)
+            self.driver = None
+
+
+class Dispatcher:
+    '''Run texts through a set of lanes. Results come back as one (recommendations, source_suggestions,
+    sources_detected) tuple per text, or None for a text no lane could analyse'''
+
+    def __init__(self, lanes, steal_after=30, max_attempts=2):
+        self.lanes = lanes
+        self.steal_after = steal_after
+        self.max_attempts = max_attempts
+        self.threads = []
+
+    def check_health(self) -> list:
+        '''Lanes whose backend answers, checking each backend once'''
+
+        checks = {}
+        for lane in self.lanes:
+            key = (type(lane).__name__, lane.name)
+            if key not in checks:
+                checks[key] = lane.healthy()
+                if not checks[key]:
+                    print(f"EquiQuote {lane.name} is not answering, leaving it out")
+        return [lane for lane in self.lanes if checks[(type(lane).__name__, lane.name)]]
+
+    def run(self, texts, check_health=True) -> list:
+        '''Pass check_health=False if the caller has checked the lanes' backends already'''
+
+        lanes = self.check_health() if check_health else self.lanes
+        if not lanes:
+            raise EquiQuoteAPIError("No EquiQuote backend is answering")
+
+        count = len(texts)
+        results = [None] * count
+        finished = [False] * count
+        attempts = [0] * count
+        pending = list(range(count))
+        # Index -> [start time, copies in progress]
+        in_flight = {}
+        state = {'lanes': len(lanes), 'remaining': count}
+        condition = threading.Condition()
+
+        def finish(index, result):
+            if not finished[index]:
+                finished[index] = True
+                results[index] = result
+                state['remaining'] -= 1
+
+        def take(lane):
+            if pending:
+                size = min(lane.batch_size, max(1, math.ceil(len(pending) / state['lanes'])))
+                batch, pending[:size] = pending[:size], []
+                for index in batch:
+                    attempts[index] += 1
+                    in_flight[index] = [time.monotonic(), 1]
+                return batch
+
+            # Nothing queued: help with whatever has been in progress the longest
+            now = time.monotonic()
+            slow = sorted((started, index) for index, (started, copies) in in_flight.items()
+                          if copies == 1 and not finished[index] and now - started > self.steal_after)
+            batch = [index for _, index in slow[:lane.batch_size]]
+            for index in batch:
+                in_flight[index][1] += 1
+                tracer.count("equiquote.stolen")
+            return batch
+
+        def done_with(index):
+            in_flight[index][1] -= 1
+            if in_flight[index][1] == 0:
+                del in_flight[index]
+
+        def work(lane):
+            try:
+                lane.start()
+                while True:
+                    with condition:
+                        batch = take(lane)
+                        while not batch and state['remaining']:
+                            condition.wait(timeout=1)
+                            batch = take(lane)
+                        if not batch:
+                            return
+
+                    try:
+                        batch_results = lane.analyse([texts[index] for index in batch])
+                    except LaneDown:
+                        with condition:
+                            for index in batch:
+                                done_with(index)
+                                if not finished[index] and index not in in_flight:
+                                    attempts[index] -= 1
+                                    pending.insert(0, index)
+                            condition.notify_all()
+                        raise
+
+                    with condition:
+                        for index, result in zip(batch, batch_results):
+                            done_with(index)
+                            if result is not None:
+                                finish(index, result)
+                            elif not finished[index] and index not in in_flight:
+                                if attempts[index] < self.max_attempts:
+                                    pending.append(index)
+                                else:
+                                    finish(index, None)
+                        condition.notify_all()
+            except LaneDown as e:
+                print(f"EquiQuote {lane.name} stopped working, handing its texts to the others:", e)
+                tracer.count("equiquote.lanes_down")
+            finally:
+                with condition:
+                    state['lanes'] -= 1
+                    # With no lanes left, nothing else is coming for the texts still waiting
+                    if state['lanes'] == 0:
+                        for index in range(count):
+                            finish(index, None)
+                    condition.notify_all()
+                lane.close()
+
+        # Lanes finish their current text in the background if a faster copy already answered, so the
+        # results don't wait on them
+        for lane in lanes:
+            thread = threading.Thread(target=work, args=(lane,), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+        with condition:
+            while state['remaining']:
+                condition.wait()
+        return results
+
+    def join(self, timeout=None) -> bool:
+        '''Wait for every lane to finish and close, so a browser lane's session is back in its pool.
+        Returns False if some lane was still busy after timeout seconds'''
+
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        for thread in self.threads:
+            thread.join(None if deadline is None else max(0, deadline - time.monotonic()))
+        return not any(thread.is_alive() for thread in self.threads)
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Local stand-in for the EquiQuote backend API and web page, for running the scraper, EquiQuoteClient
+and the benchmarks offline.
+
+    python equiquote_stub.py --port 5000 --delay 0.5'''
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+import re
+import threading
+import time
+
+
+# Very rough stand-in for EquiQuote's source detection: names followed or preceded by "said"
+SAID_PATTERN = re.compile(r"([A-Z][a-z]+(?: [A-Z][a-z]+)+),? (?:said|says|told)|(?:said|says) ([A-Z][a-z]+(?: [A-Z][a-z]+)+)")
+FEMALE_NAMES = {"Anna", "Emma", "Jane", "Kate", "Mary", "Sarah", "Sophie", "Laura", "Rachel", "Helen"}
+
+
+def analyse_text(text) -> dict:
+    '''Deterministic fake result in the same shape as the EquiQuote API'''
+
+    sources = []
+    for match in SAID_PATTERN.finditer(text):
+        name = match.group(1) or match.group(2)
+        if any(source["Source"] == name for source in sources):
+            continue
+        gender = "Female" if name.split()[0] in FEMALE_NAMES else "Male"
+        sources.append({"Source": name, "Gender": f"{gender}: stub guess from first name", "Quotes": "1"})
+
+    men = sum("Male" in source["Gender"] for source in sources)
+    women = len(sources) - men
+    if not sources:
+        recommendations = "We were not able to confidently determine the gender of any of the additional sources quoted."
+    elif men > women:
+        recommendations = "There are more men than women quoted in your story."
+    elif women > men:
+        recommendations = "There are more women than men quoted in your story."
+    else:
+        recommendations = "There is a perfect balance of men and women quoted in your story. Great job!"
+
+    suggestions = [{"job": "Spokesperson", "suggestions": "Stub suggestion for a spokesperson"}] if men != women else []
+    return {"recommendations": recommendations, "source_suggestions": suggestions, "sources_detected": sources}
+
+
+# Mock of the EquiQuote page with the same element ids get_equiquote_results drives. It calls the stub API
+# and renders the result the way EquiQuote does: spinner, recommendations, sources table with tooltips,
+# and a modal per job suggestion
+UI_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<title>EquiQuote (stub)</title>
+<style>
+  .hidden { display: none; }
+  #myModal { position: fixed; top: 20%; left: 20%; background: white; border: 1px solid black; padding: 1em; }
+  td span { display: none; }
+</style>
+</head>
+<body>
+<textarea id="article_text" rows="10" cols="80"></textarea>
+<button id="analyse-button">Analyse</button>
+<button id="reset-button">Reset</button>
+<div id="loading-spinner" class="hidden">Loading...</div>
+<div id="results"></div>
+<div id="myModal" class="hidden"><span class="close">&times;</span><div id="modal_body"></div></div>
+<script>
+const results = document.getElementById('results');
+const spinner = document.getElementById('loading-spinner');
+const modal = document.getElementById('myModal');
+const escape = text => String(text).replace(/[&<>"]/g, c => ({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;'}[c]));
+
+document.getElementById('analyse-button').addEventListener('click', async () => {
+    results.innerHTML = '';
+    spinner.classList.remove('hidden');
+    const response = await fetch('/api/analyse', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({article_text: document.getElementById('article_text').value}),
+    });
+    const result = await response.json();
+    spinner.classList.add('hidden');
+
+    let html = `<div id="recommendations"><p>${escape(result.recommendations)}</p></div>`;
+    if (result.sources_detected.length) {
+        const keys = Object.keys(result.sources_detected[0]);
+        html += '<table id="source_table"><tr>' + keys.map(key => `<th>${escape(key)}</th>`).join('') + '</tr>';
+        for (const source of result.sources_detected) {
+            html += '<tr>' + keys.map(key => {
+                const [text, tooltip] = String(source[key]).split(': ');
+                return tooltip ? `<td>${escape(text)}<span>${escape(tooltip)}</span></td>` : `<td>${escape(text)}</td>`;
+            }).join('') + '</tr>';
+        }
+        html += '</table>';
+    }
+    if (result.source_suggestions.length) {
+        html += '<ul id="job_links_ul">' + result.source_suggestions.map((item, i) =>
+            `<li><a href="#" data-index="${i}">${escape(item.job)}</a></li>`).join('') + '</ul>';
+    }
+    results.innerHTML = html;
+
+    results.querySelectorAll('#job_links_ul a').forEach(link => link.addEventListener('click', event => {
+        event.preventDefault();
+        document.getElementById('modal_body').innerText = result.source_suggestions[link.dataset.index].suggestions;
+        modal.classList.remove('hidden');
+    }));
+});
+
+document.querySelector('#myModal .close').addEventListener('click', () => modal.classList.add('hidden'));
+document.getElementById('reset-button').addEventListener('click', () => {
+    document.getElementById('article_text').value = '';
+    results.innerHTML = '';
+});
+</script>
+</body>
+</html>
+"""
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    delay = 0
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        if self.path == "/":
+            body = UI_PAGE.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path == "/api/health":
+            self.send_json(200, {"status": "ok"})
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path == "/api/analyse":
+            payload = self.read_json()
+            time.sleep(self.delay)
+            self.send_json(200, analyse_text(payload.get("article_text", "")))
+        elif self.path == "/api/analyse_batch":
+            payload = self.read_json()
+            texts = payload.get("articles", [])
+            time.sleep(self.delay * len(texts))
+            self.send_json(200, {"results": [analyse_text(text) for text in texts]})
+        else:
+            self.send_json(404, {"error": "not found"})
+
+
+def serve_in_thread(port=0, delay=0, handler=StubHandler):
+    '''Start the stub in a background thread. Returns the server; its URL is http://127.0.0.1:{server.server_port}'''
+
+    handler_class = type("ConfiguredStubHandler", (handler,), {"delay": delay})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler_class)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a stub of the EquiQuote API")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--delay", type=float, default=0, help="seconds of fake processing per article")
+    args = parser.parse_args()
+
+    handler_class = type("ConfiguredStubHandler", (StubHandler,), {"delay": args.delay})
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), handler_class)
+    print(f"EquiQuote stub listening on http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Spot article texts that are the same story with small changes (wire copy run by more than one outlet,
+or an article re-published with a line edited), so their EquiQuote results can be reused.
+
+Texts are compared by MinHash signatures over word shingles, and candidates are found with LSH banding,
+so checking a text against thousands of stored ones is a few indexed lookups. Signatures are kept in
+SQLite rather than memory.'''
+
+from functools import lru_cache
+from array import array
+import hashlib
+import random
+import re
+
+
+SHINGLE_WORDS = 5
+NUM_PERMUTATIONS = 64
+# 16 bands of 4 rows: texts that share about half their shingles or more become candidates
+BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+
+# Each "permutation" XORs the shingle hashes with its own random mask, which is a few times quicker in
+# pure Python than a multiply-and-mod hash family. The masks use a fixed seed so signatures stored by one
+# run can be compared with the next
+_random = random.Random(20230701)
+MASKS = [_random.getrandbits(64) for _ in range(NUM_PERMUTATIONS)]
+
+
+def shingle_hash(shingle) -> int:
+    return int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def shingles(text) -> set:
+    '''Hashes of every run of SHINGLE_WORDS words, ignoring case and punctuation'''
+
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < SHINGLE_WORDS:
+        return {shingle_hash(" ".join(words))}
+    return {shingle_hash(" ".join(words[i:i + SHINGLE_WORDS])) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+@lru_cache(maxsize=256)
+def signature(text) -> tuple:
+    hashes = shingles(text)
+    return tuple(min(h ^ mask for h in hashes) for mask in MASKS)
+
+
+def similarity(signature_a, signature_b) -> float:
+    '''Estimated share of shingles two texts have in common (Jaccard similarity)'''
+
+    return sum(a == b for a, b in zip(signature_a, signature_b)) / NUM_PERMUTATIONS
+
+
+def band_keys(text_signature) -> list:
+    keys = []
+    for band in range(BANDS):
+        rows = array('Q', text_signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND])
+        keys.append((band, hashlib.blake2b(rows.tobytes(), digest_size=8).hexdigest()))
+    return keys
+
+
+class NearDuplicateIndex:
+    '''Signatures of analysed texts, stored alongside the EquiQuote result cache (in its database,
+    under its lock) and keyed by the same text hash'''
+
+    def __init__(self, db, lock, threshold=0.8):
+        self.db = db
+        self.threshold = threshold
+        self._lock = lock
+
+        with self._lock, self.db:
+            self.db.execute('''CREATE TABLE IF NOT EXISTS signatures (
+                text_hash TEXT PRIMARY KEY,
+                link TEXT,
+                signature BLOB
+            )''')
+            self.db.execute('CREATE TABLE IF NOT EXISTS lsh_bands (band INTEGER, bucket TEXT, text_hash TEXT)')
+            self.db.execute('CREATE INDEX IF NOT EXISTS lsh_bands_bucket ON lsh_bands (band, bucket)')
+            self.db.execute('CREATE INDEX IF NOT EXISTS lsh_bands_text_hash ON lsh_bands (text_hash)')
+
+    def add(self, text_hash, text, link=None):
+        text_signature = signature(text)
+        with self._lock, self.db:
+            self.db.execute('INSERT OR REPLACE INTO signatures VALUES (?, ?, ?)',
+                            (text_hash, link, array('Q', text_signature).tobytes()))
+            self.db.execute('DELETE FROM lsh_bands WHERE text_hash = ?', (text_hash,))
+            self.db.executemany('INSERT INTO lsh_bands VALUES (?, ?, ?)',
+                                [(band, bucket, text_hash) for band, bucket in band_keys(text_signature)])
+
+    def find(self, text, exclude=None):
+        '''(text_hash, link, similarity) of the most similar stored text at or above the threshold, or None'''
+
+        text_signature = signature(text)
+        keys = band_keys(text_signature)
+        with self._lock:
+            candidates = self.db.execute(
+                'SELECT DISTINCT s.text_hash, s.link, s.signature FROM lsh_bands b JOIN signatures s USING (text_hash) WHERE '
+                + ' OR '.join(['(b.band = ? AND b.bucket = ?)'] * len(keys)),
+                [value for key in keys for value in key],
+            ).fetchall()
+
+        best = None
+        for text_hash, link, stored in candidates:
+            if text_hash == exclude:
+                continue
+            score = similarity(text_signature, array('Q', stored))
+            if score >= self.threshold and (best is None or score > best[2]):
+                best = (text_hash, link, score)
+        return best
+
+    def prune(self):
+        '''Forget texts whose results are no longer in the result cache'''
+
+        with self._lock, self.db:
+            self.db.execute('DELETE FROM signatures WHERE text_hash NOT IN (SELECT text_hash FROM results)')
+            self.db.execute('DELETE FROM lsh_bands WHERE text_hash NOT IN (SELECT text_hash FROM signatures)')
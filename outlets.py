@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Registry of the news outlets the scraper knows about. Each outlet declares its homepage links, when an
+article page is ready, how to accept its cookie prompt and where each article field is found, and the
+browser and fast path extractors both work from that.
+
+Adding an outlet is one more register(Outlet(...)) call; the source name it is registered under is what
+appears in the output file names.'''
+
+from urllib.parse import urldefrag
+import json
+
+
+def field(*selectors, attribute=None, join=False, visible=False, skip_class=None) -> dict:
+    '''Where to find one article field. Selectors are tried in order until one gives a non-empty value.
+    The field is the element's text, or an attribute of it. With join, the text of every matching element
+    is joined with spaces instead of taking the first. visible only counts elements shown on the page (the
+    browser can tell, the fast path can't), and skip_class leaves out elements whose class contains it'''
+
+    return {'selectors': list(selectors), 'attribute': attribute.lower() if attribute else None,
+            'join': join, 'visible': visible, 'skip_class': skip_class}
+
+
+# Reads every field of an article in one round trip. The field specs are filled in for each outlet
+EXTRACT_SCRIPT = """
+const fields = %s;
+const isVisible = el => !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length);
+const read = (el, spec) => spec.attribute ? (el.getAttribute(spec.attribute) || '') : el.innerText.trim();
+const result = {};
+for (const [name, spec] of Object.entries(fields)) {
+    result[name] = '';
+    for (const selector of spec.selectors) {
+        let elements = Array.from(document.querySelectorAll(selector));
+        if (spec.visible) elements = elements.filter(isVisible);
+        if (spec.skip_class) elements = elements.filter(el => !(el.getAttribute('class') || '').includes(spec.skip_class));
+        if (!elements.length) continue;
+        result[name] = spec.join ? elements.map(el => read(el, spec)).join(' ') : read(elements[0], spec);
+        if (result[name]) break;
+    }
+}
+return result;
+"""
+
+# Every candidate link on a homepage in one pass, in page order: which of the outlet's selectors it matched
+# first (its tier), its position on the page and the section it sits in, named by the section's attribute or
+# else its first heading
+LINKS_SCRIPT = """
+const [selectors, section] = arguments;
+return Array.from(document.querySelectorAll(selectors.join(', '))).map((a, position) => {
+    const container = a.closest(section.selector);
+    let name = '';
+    if (container) {
+        name = (section.attribute && container.getAttribute(section.attribute)) || '';
+        const heading = name ? null : container.querySelector('h2, h3');
+        if (heading) name = heading.innerText.trim();
+    }
+    return {url: a.href || '', tier: selectors.findIndex(selector => a.matches(selector)), position: position, section: name};
+});
+"""
+
+# Sections are the nearest of these around a link unless an outlet says otherwise
+DEFAULT_SECTION = {'selector': 'section, [id]', 'attribute': 'id'}
+
+
+class Outlet:
+    '''Declarative spec of one outlet.
+
+    links: {'selectors': [...], 'prefix': ..., 'exclude': [...], 'limit': 5, 'section': {...}} - homepage links
+        to follow that start with prefix and contain none of the exclude patterns. Selectors are in order of
+        priority, the top stories first and broader ones after, and limit is how many are followed by default.
+        section ({'selector', 'attribute'}) finds the part of the page a link is in (see DEFAULT_SECTION)
+    ready: selectors that must all be on an article page before it is read
+    fields: title, byline, time and text, each made with field()
+    consent: {'button': ..., 'frame': ...} - the cookie prompt's accept button, and the iframe it sits in if any
+    allow_requests: patterns from browser_profile's block lists that this outlet's pages need loaded'''
+
+    def __init__(self, name, display_name, home_url, links, ready, fields, consent=None, allow_requests=()):
+        self.name = name
+        self.display_name = display_name
+        self.home_url = home_url
+        self.links = links
+        self.ready = ready
+        self.fields = fields
+        self.consent = consent
+        self.allow_requests = list(allow_requests)
+
+        self.extract_script = EXTRACT_SCRIPT % json.dumps(fields)
+        self.ready_predicate = (
+            "return document.readyState !== 'loading' && "
+            f"{json.dumps(ready)}.every(selector => document.querySelector(selector));"
+        )
+
+    @property
+    def section(self) -> dict:
+        return self.links.get('section') or DEFAULT_SECTION
+
+    def rank_links(self, candidates, limit=None) -> list:
+        '''The top `limit` distinct links worth scraping (the outlet's own limit by default), from the
+        {'url', 'tier', 'position', 'section'} candidates LINKS_SCRIPT finds. Higher priority selectors come
+        first. Within a selector, links are taken from each section in turn, in page order, so a large
+        sample isn't all from the top of the page. Each link is returned with its rank'''
+
+        limit = limit or self.links.get('limit', 5)
+        by_tier = {}
+        seen = set()
+        for candidate in sorted(candidates, key=lambda candidate: (candidate['tier'], candidate['position'])):
+            # The same story is often linked from more than one place on a homepage
+            url = urldefrag(candidate['url'] or '')[0]
+            if not url.startswith(self.links['prefix']) or url in seen:
+                continue
+            if any(pattern in url for pattern in self.links.get('exclude', ())):
+                continue
+            seen.add(url)
+            by_tier.setdefault(candidate['tier'], {}).setdefault(candidate['section'], []).append(dict(candidate, url=url))
+
+        ranked = []
+        for tier in sorted(by_tier):
+            sections = list(by_tier[tier].values())
+            while sections and len(ranked) < limit:
+                for links in sections:
+                    if len(ranked) < limit:
+                        ranked.append(dict(links.pop(0), rank=len(ranked) + 1))
+                sections = [links for links in sections if links]
+        return ranked
+
+
+OUTLETS = {}
+
+
+def register(outlet) -> Outlet:
+    OUTLETS[outlet.name] = outlet
+    return outlet
+
+
+def get_outlet(source_name) -> Outlet:
+    try:
+        return OUTLETS[source_name]
+    except KeyError:
+        raise ValueError(f"Unknown source_name: {source_name}")
+
+
+# ## BBC
+
+register(Outlet(
+    name="BBC",
+    display_name="BBC",
+    home_url="https://www.bbc.co.uk/news",
+    # The top stories, then every other story promo on the page
+    links={'selectors': ['#nw-c-topstories-domestic a.gs-c-promo-heading', 'a.gs-c-promo-heading'],
+           'prefix': "https://www.bbc.co.uk/news", 'exclude': ["/live/", "/av/"], 'limit': 5,
+           'section': {'selector': '[id^="nw-c-"]', 'attribute': 'id'}},
+    ready=['h1#main-heading'],
+    fields={
+        'time': field('time[data-testid="timestamp"]', attribute='dateTime'),
+        'text': field('div[data-component="text-block"] p.ssrcss-1q0x1qg-Paragraph.e1jhz7w10', join=True,
+                      skip_class='ssrcss-xbdn93-ItalicText.e5tfeyi2'),
+        'title': field('h1#main-heading'),
+        'byline': field('div.ssrcss-68pt20-Text-TextContributorName'),
+    },
+))
+
+
+# ## The Daily Mail
+
+register(Outlet(
+    name="Mail",
+    display_name="Mail Online",
+    home_url="https://www.dailymail.co.uk/home/index.html",
+    links={'selectors': ['[itemprop="url"]'], 'prefix': "https://www.dailymail.co.uk", 'exclude': ["/live/"], 'limit': 5},
+    # Mail pages fill in dynamically, so wait for the article paragraphs themselves
+    ready=['#js-article-text p.mol-para-with-font'],
+    fields={
+        'time': field('time', attribute='datetime', visible=True),
+        'text': field('#js-article-text p.mol-para-with-font', join=True),
+        'title': field('#js-article-text h2', '#js-article-text h1', visible=True),
+        'byline': field('.author', visible=True),
+    },
+    consent={'button': '.button_127GD.primary_2xk2l'},
+))
+
+
+# ## The Sun
+
+register(Outlet(
+    name="Sun",
+    display_name="Sun",
+    home_url="https://www.thesun.co.uk/",
+    # The splash story first, then the top teasers, then every other teaser on the page
+    links={'selectors': ['.splash-teaser-container a.splash-teaser_link',
+                         '.new-block.sun-row-v2.teaser.teaser--main.customiser-v2-layout-5-large-4 .teaser__copy-container a.text-anchor-wrap',
+                         '.teaser__copy-container a.text-anchor-wrap'],
+           'prefix': "https://www.thesun.co.uk/", 'exclude': ["/tv/"], 'limit': 5},
+    ready=['h1.article__headline', 'div.article__content p'],
+    fields={
+        'time': field('time', attribute='datetime'),
+        'text': field('div.article__content p', join=True),
+        'title': field('h1.article__headline'),
+        'byline': field('a[rel="author"]'),
+    },
+    consent={'button': 'button[title="Fine By Me!"]', 'frame': '#sp_message_iframe_808654'},
+    # The consent iframe is served by Sourcepoint
+    allow_requests=["*privacy-mgmt.com*", "*sourcepoint*"],
+))
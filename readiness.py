@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import time
+
+
+class Deadline:
+    '''One time budget shared by everything done for an article, instead of a separate timeout per field'''
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() == 0
+
+
+# Polls a predicate inside the page and answers as soon as it holds, so waiting costs one WebDriver call.
+# The predicate's body is written into the script (see wait_script) rather than passed in and compiled with
+# new Function, which pages with a Content Security Policy that forbids eval would block
+WAIT_FOR_SCRIPT = """
+const done = arguments[arguments.length - 1];
+const predicate = () => { PREDICATE };
+const timeout = arguments[0];
+const start = Date.now();
+(function check() {
+    let ready = false;
+    try { ready = !!predicate(); } catch (error) {}
+    if (ready || Date.now() - start >= timeout) return done(ready);
+    setTimeout(check, 50);
+})();
+"""
+
+
+def wait_script(predicate) -> str:
+    return WAIT_FOR_SCRIPT.replace("PREDICATE", predicate)
+
+
+def wait_for(driver, predicate, deadline) -> bool:
+    '''Wait until a JavaScript predicate (a function body that returns a boolean) holds, or the deadline passes'''
+
+    from selenium.common.exceptions import WebDriverException
+
+    remaining = deadline.remaining()
+    if remaining == 0:
+        return False
+    try:
+        driver.set_script_timeout(remaining + 5)
+        return bool(driver.execute_async_script(wait_script(predicate), int(remaining * 1000)))
+    except WebDriverException:
+        return False
+
+
+def wait_until_ready(driver, outlet, deadline) -> bool:
+    '''Wait until the outlet's article page has everything its spec needs to be read'''
+
+    ready = wait_for(driver, outlet.ready_predicate, deadline)
+    if not ready:
+        print(f"{outlet.name} page not ready after {deadline.seconds}s, reading whatever has loaded")
+    return ready
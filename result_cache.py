@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+from near_duplicates import NearDuplicateIndex
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+def text_key(text) -> str:
+    '''Cache key for an article text (the sanitised, 1000-word text that is sent to EquiQuote)'''
+
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    '''EquiQuote results kept across runs, keyed by a hash of the article text.
+
+    Entries older than max_age_days are dropped, the least recently used entries are evicted
+    beyond max_entries, and everything is invalidated when equiquote_version changes.
+
+    With a near_duplicate_threshold, texts that are almost the same as one analysed before can reuse
+    its results too (see get_similar)'''
+
+    def __init__(self, path, equiquote_version, max_entries=5000, max_age_days=30, near_duplicate_threshold=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 24 * 60 * 60
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.linked = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        with self.db:
+            self.db.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+            self.db.execute('''CREATE TABLE IF NOT EXISTS results (
+                text_hash TEXT PRIMARY KEY,
+                recommendations TEXT,
+                source_suggestions TEXT,
+                sources_detected TEXT,
+                created_at REAL,
+                last_used_at REAL
+            )''')
+        self.near_duplicates = NearDuplicateIndex(self.db, self._lock, near_duplicate_threshold) if near_duplicate_threshold else None
+        self.check_version(equiquote_version)
+        self.evict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self.db.close()
+
+    def check_version(self, equiquote_version):
+        '''Results from a different version of EquiQuote can't be reused, so start again'''
+
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'equiquote_version'").fetchone()
+        if row is not None and row[0] == str(equiquote_version):
+            return
+        with self._lock, self.db:
+            if row is not None:
+                print(f"EquiQuote version changed from {row[0]} to {equiquote_version}, clearing cached results")
+            self.db.execute('DELETE FROM results')
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('equiquote_version', ?)", (str(equiquote_version),))
+        if self.near_duplicates is not None:
+            self.near_duplicates.prune()
+
+    def invalidate(self) -> int:
+        '''Drop every cached result, e.g. after EquiQuote's output changed without a new version. Returns
+        how many were dropped'''
+
+        with self._lock, self.db:
+            cleared = self.db.execute('DELETE FROM results').rowcount
+        if self.near_duplicates is not None:
+            self.near_duplicates.prune()
+        return cleared
+
+    def evict(self):
+        with self._lock, self.db:
+            evicted = self.db.execute('DELETE FROM results WHERE created_at < ?', (time.time() - self.max_age,)).rowcount
+            evicted += self.db.execute('''DELETE FROM results WHERE text_hash IN (
+                SELECT text_hash FROM results ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+            )''', (self.max_entries,)).rowcount
+            self.evictions += evicted
+        if evicted and self.near_duplicates is not None:
+            self.near_duplicates.prune()
+
+    def lookup(self, key):
+        with self._lock:
+            row = self.db.execute(
+                'SELECT recommendations, source_suggestions, sources_detected FROM results WHERE text_hash = ? AND created_at >= ?',
+                (key, time.time() - self.max_age),
+            ).fetchone()
+            if row is None:
+                return None
+            with self.db:
+                self.db.execute('UPDATE results SET last_used_at = ? WHERE text_hash = ?', (time.time(), key))
+
+        return row[0], json.loads(row[1]), row[2]
+
+    def get(self, text):
+        '''(recommendations, source_suggestions, sources_detected) for a text analysed before, otherwise None'''
+
+        results = self.lookup(text_key(text))
+        if results is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return results
+
+    def get_similar(self, text):
+        '''(results, link, similarity) for the closest near-duplicate of a text analysed before, where link is
+        the article that was analysed, otherwise None'''
+
+        if self.near_duplicates is None:
+            return None
+        match = self.near_duplicates.find(text, exclude=text_key(text))
+        if match is None:
+            return None
+
+        key, link, similarity = match
+        results = self.lookup(key)
+        if results is None:
+            return None
+        self.linked += 1
+        return results, link, similarity
+
+    def put(self, text, recommendations, source_suggestions, sources_detected, link=None):
+        # Failed analyses are left out so they are retried next run
+        if recommendations == 'N/A':
+            return
+
+        now = time.time()
+        with self._lock, self.db:
+            self.db.execute(
+                'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)',
+                (text_key(text), recommendations, json.dumps(source_suggestions), sources_detected, now, now),
+            )
+        if self.near_duplicates is not None:
+            self.near_duplicates.add(text_key(text), text, link)
+        self.evict()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self.db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+        return {'hits': self.hits, 'misses': self.misses, 'linked': self.linked, 'evictions': self.evictions, 'entries': entries}
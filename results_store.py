@@ -0,0 +1,360 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''All scraped articles and their EquiQuote results in one indexed SQLite database, instead of one CSV
+per outlet per day with JSON and Python reprs inside cells.
+
+    python results_store.py import data/*.csv                 # load the CSVs (only rows added since the last import)
+    python results_store.py articles --outlet BBC --since 2023-07-01
+    python results_store.py sources --gender Female --byline "Jane Smith"
+    python results_store.py summary --by date
+
+Results are printed as CSV. Add "sqlite" to OUTPUT_SINKS in scraper.py to write new articles here as
+they are scraped. An article is stored once per outlet, scrape date and link: writing it again (a changed
+article scraped again the same day, or one re-extracted from the snapshot archive) replaces the stored
+row. Importing a CSV again only reads the rows appended to it since its last import.'''
+
+from ast import literal_eval
+from datetime import datetime
+import argparse
+import csv
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS runs (
+        id INTEGER PRIMARY KEY,
+        started_at TEXT,
+        kind TEXT,
+        source_file TEXT UNIQUE,
+        rows_imported INTEGER DEFAULT 0
+    )''',
+    '''CREATE TABLE IF NOT EXISTS articles (
+        id INTEGER PRIMARY KEY,
+        run_id INTEGER REFERENCES runs (id),
+        outlet TEXT,
+        scraped_date TEXT,
+        link TEXT,
+        title TEXT,
+        byline TEXT,
+        published TEXT,
+        text TEXT,
+        recommendations TEXT,
+        linked_to TEXT
+    )''',
+    '''CREATE TABLE IF NOT EXISTS sources_detected (
+        article_id INTEGER REFERENCES articles (id),
+        position INTEGER,
+        source TEXT,
+        gender TEXT,
+        gender_note TEXT,
+        details TEXT
+    )''',
+    '''CREATE TABLE IF NOT EXISTS source_suggestions (
+        article_id INTEGER REFERENCES articles (id),
+        position INTEGER,
+        job TEXT,
+        suggestions TEXT
+    )''',
+    # Manual counts added to the CSVs by the evaluation notebook, kept when they are imported
+    '''CREATE TABLE IF NOT EXISTS evaluations (
+        article_id INTEGER PRIMARY KEY REFERENCES articles (id),
+        my_count_men INTEGER,
+        my_count_women INTEGER,
+        match INTEGER,
+        comments TEXT
+    )''',
+    'CREATE INDEX IF NOT EXISTS articles_outlet_date ON articles (outlet, scraped_date)',
+    'CREATE INDEX IF NOT EXISTS articles_date ON articles (scraped_date)',
+    'CREATE INDEX IF NOT EXISTS articles_byline ON articles (byline)',
+    'CREATE INDEX IF NOT EXISTS articles_link ON articles (link)',
+    # Databases from before rows were deduplicated have this removed by ResultsStore.remove_duplicates first
+    'CREATE UNIQUE INDEX IF NOT EXISTS articles_key ON articles (outlet, scraped_date, link)',
+    'CREATE INDEX IF NOT EXISTS sources_detected_article ON sources_detected (article_id)',
+    'CREATE INDEX IF NOT EXISTS sources_detected_gender ON sources_detected (gender)',
+    'CREATE INDEX IF NOT EXISTS source_suggestions_article ON source_suggestions (article_id)',
+]
+
+# data/{outlet}_{date}.csv as written by the scraper
+CSV_NAME = re.compile(r"^(?P<outlet>.+)_(?P<date>\d{4}-\d{2}-\d{2})\.csv$")
+
+
+def parse_cell(value):
+    '''A list stored in a CSV cell: JSON (sources_detected) or a Python repr (source_suggestions). Older
+    CSVs hold a single {'job', 'suggestions'} dict in source_suggestions, which comes back as a list of one.
+    'N/A', empty cells and anything unreadable give an empty list'''
+
+    if isinstance(value, dict):
+        return [value]
+    if isinstance(value, list):
+        return value
+    if not value or value == 'N/A':
+        return []
+    for parse in (json.loads, literal_eval):
+        try:
+            parsed = parse(value)
+        except (ValueError, SyntaxError):
+            continue
+        if isinstance(parsed, dict):
+            return [parsed]
+        return parsed if isinstance(parsed, list) else []
+    return []
+
+
+def split_gender(gender) -> tuple:
+    '''"Female: reason shown in the tooltip" -> ("Female", "reason shown in the tooltip")'''
+
+    label, _, note = str(gender or '').partition(': ')
+    return label, note
+
+
+def none_if_na(value):
+    # The scraper writes 'N/A' for missing values, and the evaluation notebook 'NA'
+    return None if value in (None, '', 'N/A', 'NA') else value
+
+
+class ResultsStore:
+    '''Articles, the sources EquiQuote detected in them and its source suggestions, in normalised tables'''
+
+    def __init__(self, path="data/results.sqlite3"):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        with self.db:
+            for statement in SCHEMA[:2]:
+                self.db.execute(statement)
+            # Stores from before imports resumed where the last one stopped
+            if 'rows_imported' not in [row['name'] for row in self.db.execute('PRAGMA table_info(runs)')]:
+                self.db.execute('ALTER TABLE runs ADD COLUMN rows_imported INTEGER DEFAULT 0')
+            if not self.db.execute("SELECT 1 FROM sqlite_master WHERE name = 'articles_key'").fetchone():
+                self.remove_duplicates()
+            for statement in SCHEMA[2:]:
+                self.db.execute(statement)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self.db.close()
+
+    def remove_duplicates(self):
+        '''Keep the first copy of each article (outlet, scrape date and link), with its sources and
+        suggestions, and delete the rest. Called inside a transaction'''
+
+        duplicates = 'SELECT id FROM articles WHERE id NOT IN (SELECT MIN(id) FROM articles GROUP BY outlet, scraped_date, link)'
+        for table in ('sources_detected', 'source_suggestions', 'evaluations'):
+            if self.db.execute('SELECT 1 FROM sqlite_master WHERE name = ?', (table,)).fetchone():
+                self.db.execute(f'DELETE FROM {table} WHERE article_id IN ({duplicates})')
+        self.db.execute(f'DELETE FROM articles WHERE id IN ({duplicates})')
+
+    def start_run(self, kind="scrape", source_file=None) -> int:
+        with self._lock, self.db:
+            cursor = self.db.execute('INSERT INTO runs (started_at, kind, source_file) VALUES (?, ?, ?)',
+                                     (datetime.now().isoformat(timespec='seconds'), kind, source_file))
+        return cursor.lastrowid
+
+    def insert_article(self, run_id, outlet, scraped_date, article_data) -> tuple:
+        '''Store an article, replacing the row stored for the same outlet, date and link. The replaced row keeps
+        its id, so manual counts stay attached, and keeps its EquiQuote results when the new version has none
+        for the same text. Returns the article's id and whether it is new. Called with the lock held and
+        inside a transaction'''
+
+        link = article_data.get('link')
+        text = none_if_na(article_data.get('text'))
+        values = (run_id, none_if_na(article_data.get('title')), none_if_na(article_data.get('byline')),
+                  none_if_na(article_data.get('time')), text, none_if_na(article_data.get('linked_to')))
+        recommendations = none_if_na(article_data.get('recommendations'))
+        existing = self.db.execute('SELECT id, text, recommendations FROM articles WHERE outlet = ? AND scraped_date = ? AND link = ?',
+                                   (outlet, scraped_date, link)).fetchone()
+
+        if existing is None:
+            article_id = self.db.execute(
+                'INSERT INTO articles (run_id, title, byline, published, text, linked_to, recommendations, outlet, scraped_date, link) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', values + (recommendations, outlet, scraped_date, link),
+            ).lastrowid
+        else:
+            article_id = existing['id']
+            self.db.execute('UPDATE articles SET run_id = ?, title = ?, byline = ?, published = ?, text = ?, linked_to = ? WHERE id = ?',
+                            values + (article_id,))
+            if recommendations is None and existing['recommendations'] is not None and existing['text'] == text:
+                return article_id, False
+            self.db.execute('UPDATE articles SET recommendations = ? WHERE id = ?', (recommendations, article_id))
+            self.db.execute('DELETE FROM sources_detected WHERE article_id = ?', (article_id,))
+            self.db.execute('DELETE FROM source_suggestions WHERE article_id = ?', (article_id,))
+
+        sources = []
+        for position, source in enumerate(parse_cell(article_data.get('sources_detected'))):
+            if not isinstance(source, dict):
+                continue
+            gender, note = split_gender(source.get('Gender'))
+            sources.append((article_id, position, source.get('Source'), gender, note, json.dumps(source)))
+        self.db.executemany('INSERT INTO sources_detected VALUES (?, ?, ?, ?, ?, ?)', sources)
+
+        suggestions = [(article_id, position, item.get('job'), item.get('suggestions'))
+                       for position, item in enumerate(parse_cell(article_data.get('source_suggestions'))) if isinstance(item, dict)]
+        self.db.executemany('INSERT INTO source_suggestions VALUES (?, ?, ?, ?)', suggestions)
+        return article_id, existing is None
+
+    def add_article(self, run_id, outlet, article_data, scraped_date=None) -> tuple:
+        scraped_date = scraped_date or datetime.now().strftime('%Y-%m-%d')
+        with self._lock, self.db:
+            return self.insert_article(run_id, outlet, scraped_date, article_data)
+
+    def import_csv(self, path) -> int:
+        '''Load one of the scraper's CSVs, with any manual counts from the evaluation notebook. Only the rows
+        appended since the file's last import are stored, so an import doesn't undo a newer version written by
+        the sqlite output, but manual counts are updated for every row. Returns the number of articles added'''
+
+        match = CSV_NAME.match(os.path.basename(path))
+        if match is None:
+            raise ValueError(f"{path} isn't named like {{outlet}}_{{date}}.csv")
+
+        with open(path, newline='', encoding='utf-8') as file:
+            rows = list(csv.DictReader(file))
+
+        source_file = os.path.abspath(path)
+        count = 0
+        with self._lock, self.db:
+            # Every import of a file adds to the run of its first import
+            row = self.db.execute('SELECT id, rows_imported FROM runs WHERE source_file = ?', (source_file,)).fetchone()
+            if row is not None:
+                run_id, imported = row['id'], row['rows_imported'] or 0
+            else:
+                run_id = self.db.execute('INSERT INTO runs (started_at, kind, source_file) VALUES (?, ?, ?)',
+                                         (datetime.now().isoformat(timespec='seconds'), "import", source_file)).lastrowid
+                imported = 0
+            # A file that got shorter was rewritten, so all of it is read again
+            if imported > len(rows):
+                imported = 0
+            for position, row in enumerate(rows):
+                if position >= imported:
+                    article_id, added = self.insert_article(run_id, match['outlet'], match['date'], row)
+                    count += added
+                else:
+                    found = self.db.execute('SELECT id FROM articles WHERE outlet = ? AND scraped_date = ? AND link = ?',
+                                            (match['outlet'], match['date'], row.get('link'))).fetchone()
+                    if found is None:
+                        continue
+                    article_id = found['id']
+                if row.get('my_count_men') not in (None, ''):
+                    self.db.execute('INSERT OR REPLACE INTO evaluations VALUES (?, ?, ?, ?, ?)', (
+                        article_id, int(float(row['my_count_men'])), int(float(row.get('my_count_women') or 0)),
+                        int(str(row.get('match')).strip().lower() == 'true'), none_if_na(row.get('my_count_comments')),
+                    ))
+            self.db.execute('UPDATE runs SET rows_imported = ? WHERE id = ?', (len(rows), run_id))
+        return count
+
+    def query(self, sql, params=()) -> list:
+        with self._lock:
+            return [dict(row) for row in self.db.execute(sql, params).fetchall()]
+
+    def articles(self, outlet=None, since=None, until=None, byline=None, link=None, limit=None) -> list:
+        '''Articles matching every filter given. Dates are YYYY-MM-DD scrape dates, inclusive'''
+
+        where, params = self.filters(outlet, since, until, byline, link)
+        sql = ('SELECT a.id, a.outlet, a.scraped_date, a.link, a.title, a.byline, a.published, a.recommendations, a.linked_to, '
+               "(SELECT COUNT(*) FROM sources_detected s WHERE s.article_id = a.id AND s.gender = 'Male') AS men, "
+               "(SELECT COUNT(*) FROM sources_detected s WHERE s.article_id = a.id AND s.gender = 'Female') AS women "
+               f'FROM articles a {where} ORDER BY a.scraped_date, a.outlet, a.id')
+        if limit:
+            sql += f' LIMIT {int(limit)}'
+        return self.query(sql, params)
+
+    def sources(self, outlet=None, since=None, until=None, byline=None, link=None, gender=None) -> list:
+        '''Every source EquiQuote detected, with the article it was quoted in'''
+
+        where, params = self.filters(outlet, since, until, byline, link)
+        if gender:
+            where += (' AND' if where else 'WHERE') + ' s.gender = ?'
+            params.append(gender)
+        return self.query(
+            'SELECT a.outlet, a.scraped_date, a.link, a.byline, s.source, s.gender, s.gender_note '
+            f'FROM sources_detected s JOIN articles a ON a.id = s.article_id {where} ORDER BY a.scraped_date, a.outlet, a.id, s.position',
+            params,
+        )
+
+    def summary(self, by="outlet", since=None, until=None) -> list:
+        '''Articles and men/women sources per outlet, date or byline'''
+
+        group = {"outlet": "a.outlet", "date": "a.scraped_date", "byline": "a.byline"}[by]
+        where, params = self.filters(since=since, until=until)
+        return self.query(
+            f'SELECT {group} AS {by}, COUNT(DISTINCT a.id) AS articles, '
+            "SUM(s.gender = 'Male') AS men, SUM(s.gender = 'Female') AS women "
+            f'FROM articles a LEFT JOIN sources_detected s ON s.article_id = a.id {where} GROUP BY {group} ORDER BY {group}',
+            params,
+        )
+
+    @staticmethod
+    def filters(outlet=None, since=None, until=None, byline=None, link=None) -> tuple:
+        conditions, params = [], []
+        for condition, value in (('a.outlet = ?', outlet), ('a.scraped_date >= ?', since), ('a.scraped_date <= ?', until),
+                                 ('a.byline = ?', byline), ('a.link = ?', link)):
+            if value:
+                conditions.append(condition)
+                params.append(value)
+        return ('WHERE ' + ' AND '.join(conditions) if conditions else ''), params
+
+
+def print_rows(rows):
+    if not rows:
+        print("No results")
+        return
+    writer = csv.DictWriter(sys.stdout, fieldnames=list(rows[0]))
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the scraped articles and EquiQuote results")
+    parser.add_argument("--db", default="data/results.sqlite3")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="load the scraper's CSVs")
+    import_parser.add_argument("files", nargs="+")
+
+    for name in ("articles", "sources"):
+        command = commands.add_parser(name)
+        command.add_argument("--outlet")
+        command.add_argument("--since", help="YYYY-MM-DD")
+        command.add_argument("--until", help="YYYY-MM-DD")
+        command.add_argument("--byline")
+        command.add_argument("--link")
+    commands.choices["articles"].add_argument("--limit", type=int)
+    commands.choices["sources"].add_argument("--gender", help="e.g. Male or Female")
+
+    summary_parser = commands.add_parser("summary", help="articles and sources by men and women")
+    summary_parser.add_argument("--by", choices=["outlet", "date", "byline"], default="outlet")
+    summary_parser.add_argument("--since")
+    summary_parser.add_argument("--until")
+
+    args = parser.parse_args()
+
+    with ResultsStore(args.db) as store:
+        if args.command == "import":
+            for path in args.files:
+                try:
+                    count = store.import_csv(path)
+                    print(f"{path}: {count} new articles" if count else f"{path}: nothing new")
+                except Exception as e:
+                    print(f"Error importing {path}:", e)
+        elif args.command == "articles":
+            print_rows(store.articles(args.outlet, args.since, args.until, args.byline, args.link, args.limit))
+        elif args.command == "sources":
+            print_rows(store.sources(args.outlet, args.since, args.until, args.byline, args.link, args.gender))
+        else:
+            print_rows(store.summary(args.by, args.since, args.until))
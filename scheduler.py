@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Run the scraper as one long-lived process instead of from cron. Browser sessions, the chromedriver
+path, the URL index and the result cache stay open between runs, and each outlet is scraped on its own
+interval, so runs are spread out instead of all starting on the hour.
+
+    python scheduler.py'''
+
+from driver_pool import DriverPool
+from outlets import OUTLETS
+from tracing import instrument_waits, tracer
+import tracing
+import scraper
+import random
+import signal
+import threading
+import time
+
+
+# Minutes between runs of each outlet, and for any outlet not listed
+OUTLET_INTERVAL_MINUTES = {"BBC": 60, "Mail": 60, "Sun": 60}
+DEFAULT_INTERVAL_MINUTES = 60
+
+# Each run starts up to this many minutes either side of its slot, so outlets on the same interval don't
+# all hit the browser pool (or their site) at the same moment
+JITTER_MINUTES = 5
+
+# How many runs can be in progress at once, across all outlets and for any one outlet. A run that comes
+# due while the outlet's previous run is still going is skipped rather than queued
+MAX_CONCURRENT_RUNS = 2
+MAX_RUNS_PER_OUTLET = 1
+
+
+class Scheduler:
+    '''Start a run for each outlet whenever it comes due, until every outlet has used up its run budget'''
+
+    def __init__(self, pool, outlets, sink, cache=None, url_index=None, checkpoints=None, archive=None, run_budget=None,
+                 intervals=None, default_interval=60, jitter=5, max_concurrent=2, max_per_outlet=1):
+        self.pool = pool
+        self.outlets = {outlet.name: outlet for outlet in outlets}
+        self.sink = sink
+        self.cache = cache
+        self.url_index = url_index
+        self.checkpoints = checkpoints
+        self.archive = archive
+        self.run_budget = run_budget
+        self.intervals = {name: (intervals or {}).get(name, default_interval) * 60 for name in self.outlets}
+        self.jitter = jitter * 60
+
+        self.stopping = threading.Event()
+        self.running = threading.Semaphore(max(1, max_concurrent))
+        self.outlet_running = {name: threading.BoundedSemaphore(max(1, max_per_outlet)) for name in self.outlets}
+        self.runs = {name: 0 for name in self.outlets}
+        self.threads = []
+        self.active_runs = 0
+        self._metrics_lock = threading.Lock()
+
+        # First runs are spread over the jitter window rather than all starting now
+        now = time.time()
+        self.slots = {name: now for name in self.outlets}
+        self.due = {name: now + random.uniform(0, self.jitter) for name in self.outlets}
+
+    def budget_left(self, name) -> bool:
+        return self.run_budget is None or self.runs[name] < self.run_budget
+
+    def schedule_next(self, name):
+        # After a long stall (e.g. the machine slept) pick up from now instead of running every missed slot
+        self.slots[name] = max(self.slots[name] + self.intervals[name], time.time())
+        self.due[name] = self.slots[name] + random.uniform(-self.jitter, self.jitter)
+
+    def start_run(self, name):
+        if not self.outlet_running[name].acquire(blocking=False):
+            print(f"{name}'s last run hasn't finished yet, skipping this one")
+            tracer.count(f"scheduler.skipped.{name}")
+            return
+
+        self.runs[name] += 1
+        thread = threading.Thread(target=self.run, args=(name, self.runs[name]), daemon=True)
+        self.threads.append(thread)
+        thread.start()
+
+    def run(self, name, number):
+        try:
+            with self.running:
+                if self.stopping.is_set():
+                    return
+                print(f"Starting run {number} for {name}")
+                with self._metrics_lock:
+                    self.active_runs += 1
+                start = time.perf_counter()
+                try:
+                    with tracer.span(f"scheduler.run.{name}"):
+                        scraper.scrape_outlets(self.pool, [self.outlets[name]], self.sink, self.cache, self.url_index,
+                                               self.checkpoints, self.archive)
+                    print(f"Run {number} for {name} finished in {time.perf_counter() - start:.0f}s")
+                finally:
+                    self.finish_run()
+        except Exception as e:
+            print(f"Error in run {number} for {name}:", e)
+        finally:
+            self.outlet_running[name].release()
+
+    def finish_run(self):
+        # Runs that overlap add up in one set of metrics, rewritten as each of them finishes. Once none is
+        # left in progress the tracer starts afresh, so the next run gets its own file
+        with self._metrics_lock:
+            self.active_runs -= 1
+            self.write_metrics()
+            if self.active_runs == 0:
+                tracing.reset()
+
+    def write_metrics(self):
+        try:
+            tracer.write_metrics(scraper.METRICS_DIR, scraper.PROMETHEUS_TEXTFILE)
+        except Exception as e:
+            print("Error writing run metrics:", e)
+
+    def run_forever(self):
+        while not self.stopping.is_set():
+            waiting = [name for name in self.outlets if self.budget_left(name)]
+            if not waiting:
+                print("Run budget used up for every outlet")
+                break
+
+            name = min(waiting, key=self.due.get)
+            if self.stopping.wait(max(0, self.due[name] - time.time())):
+                break
+            self.start_run(name)
+            self.schedule_next(name)
+            self.threads = [thread for thread in self.threads if thread.is_alive()]
+
+        for thread in self.threads:
+            thread.join()
+
+    def stop(self, *args):
+        '''Let runs in progress finish, but start no new ones'''
+
+        print("Stopping scheduler after the runs in progress")
+        self.stopping.set()
+
+
+def main():
+    instrument_waits(tracer)
+
+    # Every concurrent run needs a session per scraping worker, plus the EquiQuote tabs if an API is down
+    tabs = len(scraper.EQUIQUOTE_URLS) * scraper.EQUIQUOTE_TABS_PER_ENDPOINT
+    pool_size = max(scraper.DRIVER_POOL_SIZE, MAX_CONCURRENT_RUNS * (scraper.SCRAPE_WORKERS + tabs))
+    with DriverPool(size=pool_size) as pool:
+        try:
+            pool.warm_up(scraper.DRIVER_POOL_SIZE)
+        except Exception as e:
+            print("Error initialising webdriver:", e)
+            return
+
+        stores = scraper.open_stores()
+        scheduler = Scheduler(pool, OUTLETS.values(), *stores,
+                              run_budget=scraper.RUN_BUDGET, intervals=OUTLET_INTERVAL_MINUTES,
+                              default_interval=DEFAULT_INTERVAL_MINUTES, jitter=JITTER_MINUTES,
+                              max_concurrent=MAX_CONCURRENT_RUNS, max_per_outlet=MAX_RUNS_PER_OUTLET)
+        signal.signal(signal.SIGTERM, scheduler.stop)
+        signal.signal(signal.SIGINT, scheduler.stop)
+
+        scheduler.run_forever()
+        scraper.close_stores(*stores)
+
+    # Startup, and anything after the last run's metrics were written
+    scheduler.write_metrics()
+    print("Scheduler stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,118 @@
 #!/usr/bin/env python
 # coding: utf-8
 
-from selenium import webdriver
-from selenium.webdriver.common.alert import Alert
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import NoSuchElementException, NoAlertPresentException, TimeoutException
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
 import time
-import csv
-from datetime import datetime
-import json
-
 
-# Run scraper only 5 times
+# Startup is timed from here. Selenium is only imported once a browser is needed, so importing this module
+# (from the scheduler, the benchmarks or a test) and --check stay quick
+IMPORT_STARTED = time.perf_counter()
+
+from driver_pool import DriverPool, resolve_driver_path
+from fast_extract import FastArticleContent, article_text, make_session
+from equiquote_client import EquiQuoteAPIError, EquiQuoteClient
+from equiquote_dispatch import APILane, BrowserLane, Dispatcher
+from result_cache import ResultCache
+from near_duplicates import signature, similarity
+from url_index import UrlIndex, content_hash
+from sinks import make_sink
+from tracing import instrument_waits, tracer
+from readiness import Deadline, wait_for, wait_until_ready
+from outlets import LINKS_SCRIPT, OUTLETS, get_outlet
+from browser_profile import use_outlet
+from checkpoints import ANALYSED, SCRAPED, WRITTEN, Checkpoints
+from snapshot_archive import SnapshotArchive
+import argparse
+import json
+import os
+import queue
+import threading
+import sys
+
+
+# How many links to follow from each outlet's homepage, or None for each outlet's own limit in outlets.py (5).
+# Links beyond an outlet's top stories are taken from each section of the homepage in turn
+LINKS_PER_OUTLET = None
+
+# Number of warm browser sessions shared by the homepage, article and EquiQuote phases
+DRIVER_POOL_SIZE = 1
+
+# Number of browser sessions scraping articles in parallel. All outlets share one queue of articles,
+# so 1 scrapes them one after another as before
+SCRAPE_WORKERS = 4
+
+# Fetch articles over plain HTTP first and only load them in Chrome when a required field comes back empty
+FAST_PATH_OUTLETS = {"BBC", "Mail", "Sun"}
+
+# Analyse articles through the EquiQuote backend API, falling back to driving the web UI if the API is unavailable
+EQUIQUOTE_URL = "http://localhost:5000"
+USE_EQUIQUOTE_API = True
+EQUIQUOTE_WORKERS = 4
+EQUIQUOTE_BATCH_SIZE = 5
+
+# Texts are shared out between every EquiQuote copy listed here, using EQUIQUOTE_WORKERS requests at a time
+# for each API, or EQUIQUOTE_TABS_PER_ENDPOINT browser sessions for each web page. A text that has taken
+# longer than EQUIQUOTE_STEAL_AFTER seconds is also given to an idle backend, and the first answer is kept
+EQUIQUOTE_URLS = [EQUIQUOTE_URL]
+EQUIQUOTE_TABS_PER_ENDPOINT = 1
+EQUIQUOTE_STEAL_AFTER = 30
+
+# EquiQuote results are reused for any article text analysed before. Change EQUIQUOTE_VERSION whenever
+# EquiQuote is updated so old results are thrown away
+RESULT_CACHE_PATH = "data/equiquote_cache.sqlite3"
+EQUIQUOTE_VERSION = "1"
+RESULT_CACHE_MAX_ENTRIES = 5000
+RESULT_CACHE_MAX_AGE_DAYS = 30
+
+# Texts that share at least this much with one analysed before (syndicated copy, lightly edited re-publishes)
+# reuse its results, and are marked with a link to the article that was analysed. None analyses every text
+NEAR_DUPLICATE_THRESHOLD = 0.8
+
+# Only scrape articles that are new or changed since a previous run. Articles whose server sent an ETag or
+# Last-Modified are revalidated with a conditional request, others are skipped until REVISIT_AFTER_HOURS has
+# passed since the last fetch
+INCREMENTAL_CRAWL = True
+URL_INDEX_PATH = "data/url_index.sqlite3"
+REVISIT_AFTER_HOURS = 24
+
+# Where each article is written as soon as it is complete: any of "csv", "jsonl", "parquet" (needs pyarrow)
+# and "sqlite" (the indexed results database, see results_store.py)
+OUTPUT_SINKS = ["csv"]
+OUTPUT_DIR = "data"
+
+# Each outlet's progress is saved here after every stage (links found, then each article scraped, analysed and
+# written), so a run that fails part-way is picked up where it stopped by that outlet's next run. Checkpoints
+# older than CHECKPOINT_MAX_AGE_HOURS are started again. An article EquiQuote couldn't analyse is held back for
+# CHECKPOINT_ANALYSIS_RETRIES more runs before it is written with 'N/A'. None turns checkpoints off
+CHECKPOINT_PATH = "data/checkpoints.sqlite3"
+CHECKPOINT_MAX_AGE_HOURS = 12
+CHECKPOINT_ANALYSIS_RETRIES = 1
+
+# The HTML of every article fetched is archived here, compressed and stored once per distinct page, so
+# extraction can be run again over it after an outlet's markup changes (python snapshot_archive.py replay).
+# Pages loaded in Chrome cost one extra WebDriver call to archive. None turns it off
+SNAPSHOT_DIR = "data/snapshots"
+
+# How many articles can wait between the scraping, EquiQuote and writing stages before the earlier stage pauses
+PIPELINE_QUEUE_SIZE = 8
+
+# Per-run timings and WebDriver command counts are written here as JSON. Set PROMETHEUS_TEXTFILE to a path
+# in node_exporter's textfile directory to also export them to Prometheus
+METRICS_DIR = "data/metrics"
+PROMETHEUS_TEXTFILE = None
+
+# Seconds an article page gets to become ready (consent prompt included) before whatever has loaded is read
+ARTICLE_DEADLINE = 15
+
+# How many times the scraper runs before it stops, or None for no limit. Each run from cron is counted in
+# counter.txt; the scheduler (scheduler.py) counts runs of each outlet itself
+RUN_BUDGET = 5
+
+
+# Count the runs made from cron
 
 def read_counter(filename="counter.txt"):
+    if not os.path.exists(filename):
+        return 0
     with open(filename, 'r') as file:
         return int(file.read().strip())
 
@@ -27,564 +121,953 @@ def increment_counter(filename="counter.txt"):
     with open(filename, 'w') as file:
         file.write(str(count + 1))
 
-# Check if we've run 5 times already
-if read_counter() >= 5:
-    exit()
-
-
-# ## BBC
-
-
-class ScrapeBBCHomepage: 
-    '''Get top 5 links that are NOT live pages or videos from BBC homepage'''
-    
-    home_url = "https://www.bbc.co.uk/news"
-    
-    def __init__(self, driver): 
-        self.driver = driver
-        self.driver.get(self.home_url)
-        self.links = self.get_links()
-    
-    def get_links(self) -> list: 
-        top_stories = self.driver.find_element(By.ID, 'nw-c-topstories-domestic')
-        top_links = top_stories.find_elements(By.CSS_SELECTOR, 'a.gs-c-promo-heading')
-        
-        unique_urls = set()
-        top_5_urls = []
-
-        for link in top_links:
-            full_url = link.get_attribute('href')
-            if full_url.startswith("https://www.bbc.co.uk/news") and "/live/" not in full_url and "/av/" not in full_url and full_url not in unique_urls:
-                unique_urls.add(full_url)
-                top_5_urls.append(full_url)
-
-            if len(top_5_urls) == 5:
-                break
 
-        return top_5_urls
+# ## Outlets
+# Every outlet is declared in outlets.py; these work for any of them
 
-class BBCArticleContent: 
-    '''Scrape the content for each BBC article'''
-    
-    def __init__(self, driver, url):
-        self.driver = driver
-        self.driver.get(url)
-        
-        self.time = self.get_time()
-        self.text = self.get_text()
-        self.title = self.get_title()
-        self.byline = self.get_byline()
-    
-    def get_time(self) -> str: 
-        try:
-            time_element = self.driver.find_element(By.CSS_SELECTOR, 'time[data-testid="timestamp"]')
-            return time_element.get_attribute('dateTime')
-        except NoSuchElementException: 
-            return ""
-        
-    def get_text(self) -> str: 
-        paragraphs = self.driver.find_elements(By.CSS_SELECTOR, 'div[data-component="text-block"] p.ssrcss-1q0x1qg-Paragraph.e1jhz7w10')
-        return " ".join([p.text for p in paragraphs if 'ssrcss-xbdn93-ItalicText.e5tfeyi2' not in p.get_attribute('class')])
-    
-    def get_title(self) -> str: 
-        return self.driver.find_element(By.CSS_SELECTOR, "h1#main-heading").text
-    
-    def get_byline(self) -> str: 
-        try:
-            return self.driver.find_element(By.CSS_SELECTOR, "div.ssrcss-68pt20-Text-TextContributorName").text
-        except NoSuchElementException: 
-            return ""
 
-        
-# ## The Daily Mail
-
-
-class ScrapeMailHomepage: 
-    '''Get top 5 links that are NOT live pages from Mail Online homepage'''
-    
-    home_url = "https://www.dailymail.co.uk/home/index.html"
+class Homepage: 
+    '''Get the top links from an outlet's homepage, leaving out the kinds of page its spec excludes.
+    Every candidate link is read in one script call, then deduplicated and ranked (see Outlet.rank_links);
+    ranked has each link's rank, position on the page and section'''
     
-    def __init__(self, driver): 
+    def __init__(self, driver, outlet, home_url=None, limit=None): 
         self.driver = driver
-        self.driver.get(self.home_url)
-        self.links = self.get_links()
+        self.outlet = outlet
+        use_outlet(self.driver, outlet)
+        self.driver.get(home_url or outlet.home_url)
+        self.ranked = self.get_links(limit or LINKS_PER_OUTLET)
+        self.links = [link['url'] for link in self.ranked]
     
-    def get_links(self) -> list: 
-        top_links = self.driver.find_elements(By.CSS_SELECTOR, '[itemprop="url"]')
-        
-        unique_urls = set()
-        top_5_urls = []
+    def get_links(self, limit=None) -> list: 
+        candidates = self.driver.execute_script(LINKS_SCRIPT, self.outlet.links['selectors'], self.outlet.section)
+        tracer.count(f"homepage.candidates.{self.outlet.name}", len(candidates))
+        return self.outlet.rank_links(candidates, limit)
 
-        for link in top_links:
-            full_url = link.get_attribute('href')
-            if full_url.startswith("https://www.dailymail.co.uk") and "/live/" not in full_url and full_url not in unique_urls:
-                unique_urls.add(full_url)
-                top_5_urls.append(full_url)
 
-            if len(top_5_urls) == 5:
-                break
+def accept_consent(driver, outlet, deadline):
+    '''Click the outlet's cookie prompt away if it shows up, within the article's deadline'''
 
-        return top_5_urls
+    if outlet.consent is None:
+        return
 
+    from selenium.common.exceptions import NoSuchElementException, TimeoutException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
 
-class MailArticleContent: 
-    '''Scrape the content from each Mail Online article'''
-    
-    def __init__(self, driver, url):
-        self.driver = driver
-        self.driver.get(url)
-        
-        self.wait = WebDriverWait(self.driver, 10)
-        
+    button = outlet.consent['button']
+    if outlet.consent.get('frame'):
         try:
-            accept_button = self.wait.until(
-                EC.visibility_of_element_located((By.CSS_SELECTOR, '.button_127GD.primary_2xk2l'))
+            iframe_element = driver.find_element(By.CSS_SELECTOR, outlet.consent['frame'])
+            driver.switch_to.frame(iframe_element)
+            accept_button = WebDriverWait(driver, deadline.remaining()).until(
+                EC.element_to_be_clickable((By.CSS_SELECTOR, button))
             )
             accept_button.click()
         except (NoSuchElementException, TimeoutException):
             print('No cookie consent prompt found')
-            
-        time.sleep(5) # Wait because the pages seem to take some time to fully load dynamically
-        
-        self.time = self.get_time()
-        self.text = self.get_text()
-        self.title = self.get_title()
-        self.byline = self.get_byline()
-        
-        
-    def get_time(self) -> str: 
-        try:
-            return self.wait.until(EC.visibility_of_element_located((By.TAG_NAME, "time"))).get_attribute("datetime")
-        except (NoSuchElementException, TimeoutException): 
-            return ""
-        
-    def get_text(self) -> str: 
-        try:
-            self.wait.until(EC.visibility_of_any_elements_located((By.CSS_SELECTOR, "#js-article-text p.mol-para-with-font")))
-            paragraphs = self.driver.find_elements(By.CSS_SELECTOR, "#js-article-text p.mol-para-with-font")
-            return " ".join([p.text for p in paragraphs])
-        except (NoSuchElementException, TimeoutException): 
-            return ""
-    
-    
-    def get_title(self) -> str: 
-        try:
-            return self.wait.until(EC.visibility_of_element_located((By.CSS_SELECTOR, "#js-article-text h2"))).text
-        except (NoSuchElementException, TimeoutException): 
-            try:
-                return self.wait.until(EC.visibility_of_element_located((By.CSS_SELECTOR, "#js-article-text h1"))).text
-            except (NoSuchElementException, TimeoutException):
-                return ""
-    
-    def get_byline(self) -> str: 
-        try:
-            return self.wait.until(EC.visibility_of_element_located((By.CLASS_NAME, "author"))).text
-        except (NoSuchElementException, TimeoutException): 
-            return ""
-
-
-# ## The Sun
-
+        finally:
+            driver.switch_to.default_content()
+        return
 
-class ScrapeSunHomepage: 
-    '''Get top 5 links that are NOT TV videos from The Sun homepage'''
-    
-    home_url = "https://www.thesun.co.uk/"
+    # The prompt either shows up or the article does, whichever comes first
+    consent_or_ready = f"""
+        const button = document.querySelector({json.dumps(button)});
+        return (!!button && button.offsetParent !== null) || (() => {{ {outlet.ready_predicate} }})();
+    """
+    wait_for(driver, consent_or_ready, deadline)
+    accept_buttons = [element for element in driver.find_elements(By.CSS_SELECTOR, button) if element.is_displayed()]
+    if accept_buttons:
+        accept_buttons[0].click()
+    else:
+        print('No cookie consent prompt found')
+
+
+class ArticleContent: 
+    '''Scrape the content of an article in Chrome. The page and any cookie prompt get one deadline
+    between them, then every field is read at once with the outlet's extraction script, so a missing
+    field comes back empty straight away'''
     
-    def __init__(self, driver): 
+    def __init__(self, driver, url, outlet):
         self.driver = driver
-        self.driver.get(self.home_url)
-        self.links = self.get_links()
-    
-    def get_links(self) -> list: 
+        use_outlet(self.driver, outlet)
+        self.driver.get(url)
+        
+        self.deadline = Deadline(ARTICLE_DEADLINE)
+        accept_consent(self.driver, outlet, self.deadline)
+        wait_until_ready(self.driver, outlet, self.deadline)
         
-        # Get the link in the div with class "splash-teaser-container"
-        splash_link = self.driver.find_element(By.CSS_SELECTOR, '.splash-teaser-container a.splash-teaser_link')
-        splash_url = splash_link.get_attribute('href')
+        fields = self.driver.execute_script(outlet.extract_script)
+        self.time = fields.get('time', "")
+        self.text = fields.get('text', "")
+        self.title = fields.get('title', "")
+        self.byline = fields.get('byline', "")
+        # The page's HTTP validators, when a fast path fetch before it got them
+        self.etag = None
+        self.last_modified = None
 
-        # Get the top links in the divs with class "teaser__copy-container"
-        teaser_links = self.driver.find_elements(By.CSS_SELECTOR, '.new-block.sun-row-v2.teaser.teaser--main.customiser-v2-layout-5-large-4 .teaser__copy-container a.text-anchor-wrap')
+    def page_html(self) -> str:
+        # The page as rendered, read only when it is archived
+        return self.driver.page_source
 
-        unique_urls = set()
-        top_5_urls = []
 
-        # Add the splash url to the list
-        top_5_urls.append(splash_url)
+# ## Getting EquiQuote Results
 
-        for link in teaser_links:
-            full_url = link.get_attribute('href')
-            if full_url.startswith("https://www.thesun.co.uk/") and "/tv/" not in full_url and full_url not in unique_urls:
-                top_5_urls.append(full_url)
 
-            # Stop after 5 links
-            if len(top_5_urls) == 5:
-                break
+# Reads the recommendations, the whole sources table (with tooltips) and every job suggestion modal
+# in one round trip instead of one WebDriver call per row, cell and tooltip
+READ_RESULTS_SCRIPT = """
+const done = arguments[arguments.length - 1];
+const modalTimeout = arguments[0];
+
+const isVisible = el => !!el && !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length);
+const waitFor = (predicate, timeout) => new Promise(resolve => {
+    const start = Date.now();
+    (function poll() {
+        if (predicate()) return resolve(true);
+        if (Date.now() - start > timeout) return resolve(false);
+        setTimeout(poll, 50);
+    })();
+});
+
+(async () => {
+    const result = {recommendations: null, sources_detected: [], job_links_found: false, source_suggestions: []};
+
+    const recommendations = document.getElementById('recommendations');
+    if (recommendations) result.recommendations = recommendations.innerText;
+
+    const table = document.getElementById('source_table');
+    const rows = table ? Array.from(table.querySelectorAll('tr')) : [];
+    if (rows.length) {
+        const keys = Array.from(rows[0].querySelectorAll('th')).map(th => th.innerText);
+        for (const row of rows.slice(1)) {
+            const cells = Array.from(row.querySelectorAll('td'));
+            const data = {};
+            keys.slice(0, cells.length).forEach((key, i) => {
+                const tdText = cells[i].innerText.split('\\n')[0];
+                // textContent still reads the tooltip while it is hidden
+                const span = cells[i].querySelector('span');
+                data[key] = span ? `${tdText}: ${span.textContent}` : tdText;
+            });
+            result.sources_detected.push(data);
+        }
+    }
+
+    const jobLinks = document.getElementById('job_links_ul');
+    if (jobLinks) {
+        result.job_links_found = true;
+        const modal = document.getElementById('myModal');
+        for (const link of Array.from(jobLinks.querySelectorAll('a'))) {
+            link.click();
+            await waitFor(() => isVisible(modal), modalTimeout);
+            const body = document.getElementById('modal_body');
+            result.source_suggestions.push({job: link.innerText, suggestions: body ? body.innerText : ''});
+            const close = document.querySelector('.close');
+            if (close) close.click();
+            await waitFor(() => !isVisible(modal), modalTimeout);
+        }
+    }
+
+    done(JSON.stringify(result));
+})().catch(error => done(JSON.stringify({error: String(error)})));
+"""
+
+
+# The previous text's results stay on the page until the new ones replace them, so they are tagged before
+# submitting, and only a results node that is new or has changed counts as the new results
+MARK_OLD_RESULTS = """
+    const results = document.getElementById('recommendations');
+    if (results) {
+        results.setAttribute('data-old-results', '');
+        window.oldResultsText = results.innerText;
+    }
+"""
+
+RESULTS_STARTED = """
+    const spinner = document.getElementById('loading-spinner');
+    const results = document.getElementById('recommendations');
+    return (!!spinner && spinner.offsetParent !== null) ||
+        (!!results && (!results.hasAttribute('data-old-results') || results.innerText !== window.oldResultsText));
+"""
+
+
+def read_equiquote_results(driver, modal_timeout=10):
+    '''Read the results page in a single execute_script call and return the recommendations,
+    source_suggestions and sources_detected for the text that was just analysed'''
+
+    driver.set_script_timeout(max(30, modal_timeout * 20))
+    results = json.loads(driver.execute_async_script(READ_RESULTS_SCRIPT, modal_timeout * 1000))
+    if 'error' in results:
+        raise RuntimeError(results['error'])
+
+    recommendations = results['recommendations'] if results['recommendations'] is not None else 'N/A'
+    print("Results statement: ", recommendations.split('\n')[0])
+
+    if not results['job_links_found']:
+        print("No job links found.")
+    source_suggestions = results['source_suggestions'] or 'N/A'
+    if results['source_suggestions']:
+        print("Suggestions for: ", ", ".join(suggestion['job'] for suggestion in results['source_suggestions']))
+
+    sources_detected = json.dumps(results['sources_detected']) if results['sources_detected'] else 'N/A'
+    print("Sources detected: ", len(results['sources_detected']))
+
+    return recommendations, source_suggestions, sources_detected
+
+
+def analyse_in_page(driver, text):
+    '''Run one article text through the EquiQuote page already open in the browser and scrape the results.
+    Returns ('N/A', 'N/A', 'N/A') if the results couldn't be read'''
+
+    from selenium.common.exceptions import NoSuchElementException, TimeoutException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
 
+    wait = WebDriverWait(driver, 150)
+    result = ('N/A', 'N/A', 'N/A')
 
-        return top_5_urls
+    try:
+        with tracer.span("equiquote.enter_text"):
+            wait.until(EC.visibility_of_element_located((By.CSS_SELECTOR, "textarea#article_text")))
+            text_box = driver.find_element(By.CSS_SELECTOR, "textarea#article_text")
+            text_box.clear()
+            text_box.send_keys(text)
+            print("Text entered into textbox")
 
+        with tracer.span("equiquote.submit"):
+            # Submit as soon as the button can take the click rather than after a fixed pause
+            submit_button = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "button#analyse-button")))
+            driver.execute_script(MARK_OLD_RESULTS)
+            driver.execute_script("arguments[0].click();", submit_button)
+            print("Text submitted")
 
-class SunArticleContent: 
-    '''Scrape the content from each The Sun article'''
-    
-    def __init__(self, driver, url):
-        self.driver = driver
-        self.driver.get(url)
-        
-        self.wait = WebDriverWait(self.driver, 10)
-        
-        try:
-            iframe_element = driver.find_element(By.CSS_SELECTOR, "#sp_message_iframe_808654")
-            driver.switch_to.frame(iframe_element)
-            accept_button = self.wait.until(
-                EC.element_to_be_clickable((By.CSS_SELECTOR, 'button[title="Fine By Me!"]'))
-            )
-            accept_button.click()
-            driver.switch_to.default_content()
-        except (NoSuchElementException, TimeoutException):
-            print('No cookie consent prompt found')
-        
-        self.time = self.get_time()
-        self.text = self.get_text()
-        self.title = self.get_title()
-        self.byline = self.get_byline()
-        
-    def get_time(self) -> str: 
-        try:
-            return self.wait.until(EC.presence_of_element_located((By.TAG_NAME, "time"))).get_attribute("datetime")
-        except (NoSuchElementException, TimeoutException): 
-            return ""
-        
-    def get_text(self) -> str: 
-        try:
-            self.wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, "div.article__content p")))
-            paragraphs = self.driver.find_elements(By.CSS_SELECTOR, "div.article__content p")
-            return " ".join([p.text for p in paragraphs])
-        except (NoSuchElementException, TimeoutException): 
-            return ""
-    
-    
-    def get_title(self) -> str: 
-        try:
-            return self.wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "h1.article__headline"))).text
-        except (NoSuchElementException, TimeoutException): 
-            return ""
-    
-    def get_byline(self) -> str: 
-        try:
-            return self.wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, 'a[rel="author"]'))).text
-        except (NoSuchElementException, TimeoutException): 
-            return ""
+        with tracer.span("equiquote.wait_results"):
+            # A quick analysis can show and hide the spinner before we look, so new results showing up counts too
+            if wait_for(driver, RESULTS_STARTED, Deadline(150)):
+                print("Loading results")
+            wait.until(EC.invisibility_of_element_located((By.ID, 'loading-spinner')))
+            print("Done loading results")
 
+            try:
+                temp_message_element = driver.find_element(By.ID, "temp-message")
+                if temp_message_element.is_displayed():
+                    print("Generating source suggestions")
+                    # Temp-message is present and displayed, wait for it to disappear
+                    wait.until_not(EC.presence_of_element_located((By.ID, "temp-message")))
+                    print("Source suggestions generated")
+            except NoSuchElementException:
+                # Temp-message is not present, nothing to wait for
+                pass
+            except TimeoutException:
+                # Temp-message did not disappear within the timeout period
+                print("Warning: temp-message did not disappear within the timeout period.")
+
+        with tracer.span("equiquote.read_results"):
+            result = read_equiquote_results(driver)
+    except Exception as e:
+        print("Error getting results for text:", e)
 
-# ## Getting EquiQuote Results
+    try:
+        reset_button = driver.find_element(By.CSS_SELECTOR, "button#reset-button")
+        reset_button.click()
+        print("Clicked to reset")
+    except Exception as e:
+        print("Error clicking the reset button:", e)
 
+    return result
 
-def get_equiquote_results(text_list):
-    '''Run article text through local version of EquiQuote and scrape results'''
 
-    try:
-        service = Service(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service)
-    except Exception as e:
-        print("Error initializing webdriver:", e)
-        return
+def get_equiquote_results(text_list, driver, url=None):
+    '''Run article text through local version of EquiQuote and scrape results'''
 
     try:
-        driver.get("http://localhost:5000")
+        driver.get(url or EQUIQUOTE_URL)
     except Exception as e:
         print("Error loading app:", e)
-        return []
+        return [], [], []
 
-    wait = WebDriverWait(driver, 150)
     recommendations_list = []
     source_suggestions_list = []
     sources_detected_list = []
 
     for text in text_list:
+        # Every text gets exactly one entry in each list, so results stay lined up with their articles
+        result = analyse_in_page(driver, text)
+        recommendations_list.append(result[0])
+        source_suggestions_list.append(result[1])
+        sources_detected_list.append(result[2])
+
+    return recommendations_list, source_suggestions_list, sources_detected_list
+
+
+# ## Putting it all together
+
+
+def load_article(get_driver, link, source_name, session=None, seen=None):
+    '''Try the browser-free fast path first, then fall back to Chrome for this outlet.
+    Returns None if the fast path revalidated a previously seen article as unchanged. An article loaded in
+    Chrome keeps the validators the fast path got, so it can be revalidated cheaply next time'''
+
+    etag, last_modified = (seen['etag'], seen['last_modified']) if seen else (None, None)
+    if session is not None and source_name in FAST_PATH_OUTLETS:
         try:
-            wait.until(EC.visibility_of_element_located((By.CSS_SELECTOR, "textarea#article_text")))
-            text_box = driver.find_element(By.CSS_SELECTOR, "textarea#article_text")
-            text_box.clear()
-            text_box.send_keys(text)
-            print("Text entered into textbox")
+            article = FastArticleContent(session, link, source_name, etag=etag, last_modified=last_modified)
+            if article.not_modified:
+                return None
+            if article.complete:
+                return article
+            etag, last_modified = article.etag, article.last_modified
+            print(f"Fast path missing {', '.join(article.missing)} for {link}, loading it in Chrome")
         except Exception as e:
-            print("Error entering text into textbox:", e)
-            recommendations_list.append('N/A')
-            source_suggestions_list.append('N/A')
-            sources_detected_list.append('N/A')
+            print(f"Fast path failed for {link}, loading it in Chrome:", e)
+
+    outlet = get_outlet(source_name)
+    article = ArticleContent(get_driver(), link, outlet)
+    article.etag, article.last_modified = etag, last_modified
+    return article
+
+
+def scrape_article(get_driver, link, source_name, session=None, url_index=None, archive=None):
+    '''Scrape a single article into a row of article data, with 'N/A' for anything that could not be found.
+    get_driver is only called if the article has to be loaded in Chrome. With an archive, the page's HTML
+    is saved to it.
+
+    With a url_index, returns None instead for an article that hasn't changed since it was last scraped. The
+    index isn't updated here: the article data carries its index_entry, which record_in_index stores once the
+    article has been analysed and written'''
+
+    seen = url_index.get(link) if url_index is not None else None
+    # Without a validator there is no cheap way to tell whether the article changed
+    revalidate = source_name in FAST_PATH_OUTLETS and seen is not None and (seen['etag'] or seen['last_modified'])
+    if seen is not None and not revalidate and url_index.is_fresh(link, REVISIT_AFTER_HOURS):
+        print(f"Skipping {link}, already scraped in the last {REVISIT_AFTER_HOURS} hours")
+        return None
+
+    article_data = {'link': link, 'title': 'N/A', 'byline': 'N/A', 'time': 'N/A', 'text': 'N/A', 'recommendations': 'N/A', 'source_suggestions': 'N/A', 'sources_detected': 'N/A', 'linked_to': ''}
+    try:
+        article = load_article(get_driver, link, source_name, session, seen)
+        if article is None:
+            print(f"Skipping {link}, not modified since it was last scraped")
+            if url_index is not None:
+                url_index.record(link, source_name)
+            return None
+
+        if archive is not None:
+            try:
+                with tracer.span("snapshot.archive"):
+                    archive.add(link, source_name, article.page_html(), "http" if isinstance(article, FastArticleContent) else "browser")
+            except Exception as e:
+                print(f"Error archiving {link}:", e)
 
         try:
-            time.sleep(2)
-            submit_button = driver.find_element(By.CSS_SELECTOR, "button#analyse-button")
-            driver.execute_script("arguments[0].click();", submit_button)
-            print("Text submitted")
+            article_data['title'] = article.title
         except Exception as e:
-            print("Error submitting or waiting for results:", e)
-            recommendations_list.append('N/A')
-            source_suggestions_list.append('N/A')
-            sources_detected_list.append('N/A')
+            print(f"Error retrieving title for link {link}:", e)
+            article_data['title'] = 'N/A'
 
         try:
-            wait.until(EC.visibility_of_element_located((By.ID, 'loading-spinner')))
-            print("Loading results")
-            wait.until(EC.invisibility_of_element_located((By.ID, 'loading-spinner')))
-            print("Done loading results")
+            article_data['byline'] = article.byline
         except Exception as e:
-            print("Results did not load:", e)
-            recommendations_list.append('N/A')
-            source_suggestions_list.append('N/A')
-            sources_detected_list.append('N/A')
-        
-        try:
-            temp_message_element = driver.find_element(By.ID, "temp-message")
-            if temp_message_element.is_displayed():
-                print("Generating source suggestions")
-                # Temp-message is present and displayed, wait for it to disappear
-                wait.until_not(EC.presence_of_element_located((By.ID, "temp-message")))
-                print("Source suggestions generated")
-        except NoSuchElementException:
-            # Temp-message is not present, nothing to wait for
-            pass
-        except TimeoutException:
-            # Temp-message did not disappear within the timeout period
-            print("Warning: temp-message did not disappear within the timeout period.")
+            print(f"Error retrieving byline for link {link}:", e)
+            article_data['byline'] = 'N/A'
 
         try:
-            # Click on each link in the "li" elements and get the source suggestions
-            job_links_ul = driver.find_element(By.ID, "job_links_ul")
-            job_links = job_links_ul.find_elements(By.TAG_NAME, "a")
-            if not job_links:  # Check if the list of job links is empty
-                source_suggestions_list.append("N/A")
-            else:
-                print("Source suggestions found.")
-                for job_link in job_links:
-                    job_link.click()
-                    wait.until(EC.visibility_of_element_located((By.ID, "myModal")))
-                    print("Modal opened")
-                    modal_body = driver.find_element(By.ID, "modal_body")
-                    source_suggestions_list.append({"job": job_link.text, "suggestions": modal_body.text})
-                    print("Suggestions for ", job_link.text, ":", modal_body.text)
-                    # Close the modal
-                    close_button = driver.find_element(By.CLASS_NAME, "close")
-                    close_button.click()
-                    print("Modal closed")
-        except NoSuchElementException:
-            print("No job links found.")
-            source_suggestions_list.append('N/A')
+            article_data['time'] = article.time
+        except Exception as e:
+            print(f"Error retrieving time for link {link}:", e)
+            article_data['time'] = 'N/A'
 
         try:
-            recommendations_element = driver.find_element(By.ID, 'recommendations')
-            recommendations_list.append(recommendations_element.text)
-            print("Results statement and text: ", recommendations_element.text)
+            article_data['text'] = article_text(article.text)
         except Exception as e:
-            print("Error retrieving the results:", e)
-            recommendations_list.append('N/A')
-            source_suggestions_list.append('N/A')
-            sources_detected_list.append('N/A')
+            print(f"Error retrieving text for link {link}:", e)
+            article_data['text'] = 'N/A'
+
+        print(f"Article data found: {link} | {article_data['title']} | {article_data['byline']} | {article_data['time']} | {len(article_data['text'].split())} words")
+
+        if url_index is not None and article_data['text'] not in ('', 'N/A'):
+            article_data['index_entry'] = {'content_hash': content_hash(article_data), 'etag': article.etag,
+                                           'last_modified': article.last_modified}
+            # Only articles that were analysed and written are in the index, so this one is done already
+            if seen is not None and seen['content_hash'] == article_data['index_entry']['content_hash']:
+                print(f"Skipping {link}, content unchanged since it was last scraped")
+                url_index.record(link, source_name, **article_data['index_entry'])
+                return None
+    except Exception as e:
+        print(f"Error processing article link {link}:", e)
+        article_data['title'] = 'N/A'
+        article_data['byline'] = 'N/A'
+        article_data['time'] = 'N/A'
+        article_data['text'] = 'N/A'
 
-        try:
-            # Get the sources_detected table by id and extract the data
-            sources_detected_table = driver.find_element(By.ID, 'source_table')
+    return article_data
 
-            # Get header row and extract keys from th elements
-            header_row = sources_detected_table.find_element(By.TAG_NAME, 'tr')
-            header_cells = header_row.find_elements(By.TAG_NAME, 'th')
-            keys = [cell.text for cell in header_cells]
 
-            rows = sources_detected_table.find_elements(By.TAG_NAME, 'tr')[1:]  # Skip header row
-            table_data = []
+def record_in_index(url_index, source_name, article_data):
+    '''Add an article to the URL index once it has been written. Articles we couldn't read or EquiQuote
+    couldn't analyse are left out, so the next run scrapes and analyses them again'''
 
-            for row in rows:
-                cell_data_dict = {}
-                cells = row.find_elements(By.TAG_NAME, 'td')
-                for key, cell in zip(keys, cells):
-                    # Extract text from td
-                    td_text = cell.text.split('\n')[0]
+    entry = article_data.get('index_entry')
+    if url_index is None or entry is None or article_data['recommendations'] == 'N/A':
+        return
+    try:
+        url_index.record(article_data['link'], source_name, **entry)
+    except Exception as e:
+        print(f"Error updating URL index for {article_data['link']}:", e)
 
-                    # Try to extract text from tool-tip (span), if present
-                    try:
-                        span_element = cell.find_element(By.TAG_NAME, 'span')
-                        # Use get_attribute('textContent') to get text even if the span is hidden
-                        span_text = span_element.get_attribute('textContent')
-                        final_text = f"{td_text}: {span_text}"
-                    except NoSuchElementException:
-                        final_text = td_text
-
-                    cell_data_dict[key] = final_text
-                table_data.append(cell_data_dict)
-
-            if not table_data:
-                sources_detected_list.append("N/A")
-            else:
-                sources_detected_list.append(json.dumps(table_data))
-                print("Sources detected: ", sources_detected_list)
-        except Exception as e:
-            print("Error processing the sources_detected table:", e)
-            sources_detected_list.append('N/A')
-        
-        try:
-            reset_button = driver.find_element(By.CSS_SELECTOR, "button#reset-button")
-            reset_button.click()
-            print("Clicked to reset")
-        except Exception as e:
-            print("Error clicking the reset button:", e)
-            continue  # Move on to the next text
 
-    driver.quit()
-    return recommendations_list, source_suggestions_list, sources_detected_list
+# One client per EquiQuote backend, kept across batches and runs so its connections (and whether the
+# backend has a batch endpoint) are reused
+equiquote_clients = {}
+equiquote_clients_lock = threading.Lock()
 
 
-# ## Putting it all together
+def equiquote_client(url) -> EquiQuoteClient:
+    with equiquote_clients_lock:
+        if url not in equiquote_clients:
+            equiquote_clients[url] = EquiQuoteClient(url, workers=EQUIQUOTE_WORKERS, batch_size=EQUIQUOTE_BATCH_SIZE)
+        return equiquote_clients[url]
 
 
-def run_scrape_task():
-    '''Get links to top 5 news articles from BBC, Mail Online and The Sun homepages,
-    scrape their content, run them through EquiQuote and export all of the article data and results as a CSV'''
-    
-    def sanitise_text(text):
-        return ''.join(char if ord(char) <= 0xFFFF else '' for char in text)
-    
-    def scrape_articles(driver, links, source_name):
-        articles_data = []
-        text_list = []
+# Dispatchers from earlier batches whose slower lanes may still be finishing a text another lane answered
+lingering_dispatchers = []
 
-        for link in links:
-            article_data = {'link': link, 'title': 'N/A', 'byline': 'N/A', 'time': 'N/A', 'text': 'N/A', 'recommendations': 'N/A', 'source_suggestions': 'N/A', 'sources_detected': 'N/A'}
-            try:
-                if source_name == "BBC":
-                    article = BBCArticleContent(driver, link)
-                elif source_name == "Mail":
-                    article = MailArticleContent(driver, link)
-                elif source_name == "Sun":
-                    article = SunArticleContent(driver, link)
-                else:
-                    raise ValueError(f"Unknown source_name: {source_name}")
 
-                try:
-                    article_data['title'] = article.title
-                except Exception as e:
-                    print(f"Error retrieving title for link {link}:", e)
-                    article_data['title'] = 'N/A'
+def wait_for_lingering_lanes():
+    '''Wait for the lanes of earlier batches, so their browser sessions are back in the pool before new
+    lanes want them or the pool is closed'''
 
-                try:
-                    article_data['byline'] = article.byline
-                except Exception as e:
-                    print(f"Error retrieving byline for link {link}:", e)
-                    article_data['byline'] = 'N/A'
+    with equiquote_clients_lock:
+        dispatchers = list(lingering_dispatchers)
+        lingering_dispatchers.clear()
+    for dispatcher in dispatchers:
+        dispatcher.join()
 
-                try:
-                    article_data['time'] = article.time
-                except Exception as e:
-                    print(f"Error retrieving time for link {link}:", e)
-                    article_data['time'] = 'N/A'
 
+def close_equiquote_clients():
+    wait_for_lingering_lanes()
+    with equiquote_clients_lock:
+        clients = list(equiquote_clients.values())
+        equiquote_clients.clear()
+    for client in clients:
+        client.close()
+
+
+def analyse_texts(pool, text_list):
+    '''Get EquiQuote results for each text, spread over every backend in EQUIQUOTE_URLS: through its API
+    if possible and otherwise through tabs on its web page'''
+
+    wait_for_lingering_lanes()
+
+    # Each backend is checked once here, so the dispatcher doesn't check it again
+    lanes = []
+    for url in EQUIQUOTE_URLS:
+        if USE_EQUIQUOTE_API:
+            api_lanes = [APILane(equiquote_client(url), EQUIQUOTE_BATCH_SIZE) for _ in range(EQUIQUOTE_WORKERS)]
+            if api_lanes[0].healthy():
+                lanes += api_lanes
+                continue
+            print(f"EquiQuote API at {url} unavailable, using the web UI instead")
+        browser_lanes = [BrowserLane(pool, url, analyse_in_page) for _ in range(EQUIQUOTE_TABS_PER_ENDPOINT)]
+        if browser_lanes and browser_lanes[0].healthy():
+            lanes += browser_lanes
+        else:
+            print(f"EquiQuote at {url} is not answering, leaving it out")
+
+    dispatcher = Dispatcher(lanes, steal_after=EQUIQUOTE_STEAL_AFTER)
+    try:
+        with tracer.span("equiquote.dispatch"):
+            results = dispatcher.run(text_list, check_health=False)
+    except EquiQuoteAPIError as e:
+        print("Error getting results from EquiQuote:", e)
+        results = [None] * len(text_list)
+    finally:
+        with equiquote_clients_lock:
+            lingering_dispatchers.append(dispatcher)
+
+    results = [result or ('N/A', 'N/A', 'N/A') for result in results]
+    return [result[0] for result in results], [result[1] for result in results], [result[2] for result in results]
+
+
+def add_equiquote_results(pool, articles_data, cache=None):
+    '''Run the articles that have text through EquiQuote and add the results to their article data.
+    Articles whose text is already in the cache skip EquiQuote, and so do near-duplicates of a text that
+    was analysed before or is being analysed in this batch: they get its results, with linked_to set to
+    the article they came from'''
+
+    analysed = []
+    linked = []
+    for data in articles_data:
+        if data['text'] == 'N/A':
+            continue
+        cached = cache.get(data['text']) if cache is not None else None
+        if cached is not None:
+            data['recommendations'], data['source_suggestions'], data['sources_detected'] = cached
+            continue
+
+        similar = cache.get_similar(data['text']) if cache is not None else None
+        if similar is not None:
+            (data['recommendations'], data['source_suggestions'], data['sources_detected']), data['linked_to'], score = similar
+            print(f"{data['link']} is a near-duplicate of {data['linked_to']} ({score:.0%}), reusing its results")
+            continue
+
+        original = None
+        if NEAR_DUPLICATE_THRESHOLD:
+            original = next((other for other in analysed
+                             if similarity(signature(other['text']), signature(data['text'])) >= NEAR_DUPLICATE_THRESHOLD), None)
+        if original is not None:
+            linked.append((data, original))
+        else:
+            analysed.append(data)
+
+    text_list = [data['text'] for data in analysed]
+    if not text_list:
+        return
+
+    try:
+        # Get results from EquiQuote
+        results_recommendations, results_sources_suggested, results_sources_detected = analyse_texts(pool, text_list)
+
+        # Incorporate the results into articles_data
+        for i, data in enumerate(analysed):
+            data['recommendations'] = results_recommendations[i] if i < len(results_recommendations) else 'N/A'
+            data['sources_detected'] = results_sources_detected[i] if i < len(results_sources_detected) else 'N/A'
+            data['source_suggestions'] = results_sources_suggested[i] if i < len(results_sources_suggested) else 'N/A'
+            if cache is not None:
+                cache.put(data['text'], data['recommendations'], data['source_suggestions'], data['sources_detected'], data['link'])
+    except Exception as e:
+        print("Error getting results from EquiQuote:", e)
+        for data in analysed:
+            data['recommendations'] = 'N/A'
+            data['sources_detected'] = 'N/A'
+            data['source_suggestions'] = 'N/A'
+
+    for data, original in linked:
+        print(f"{data['link']} is a near-duplicate of {original['link']}, reusing its results")
+        data['recommendations'] = original['recommendations']
+        data['sources_detected'] = original['sources_detected']
+        data['source_suggestions'] = original['source_suggestions']
+        if original['recommendations'] != 'N/A':
+            data['linked_to'] = original['link']
+
+
+def run_pipeline(pool, links_by_source, sink, workers=1, cache=None, url_index=None, checkpoints=None, archive=None):
+    '''Scrape, analyse and write articles as a pipeline, so EquiQuote works on the first articles while later
+    ones are still loading. Scraping workers share one queue of links from every outlet. Bounded queues between
+    the stages hold back scraping when analysis falls behind, and analysis when writing falls behind.
+    Articles are written in the order of each outlet's links.
+
+    With checkpoints, each article's progress is saved after every stage, articles an earlier run got part of
+    the way through carry on from where it stopped, and an outlet's checkpoint is cleared once all of its
+    articles are written'''
+
+    jobs = queue.Queue()
+    to_analyse = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    to_write = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    done = object()
+
+    def save_checkpoint(source_name, article_data, progress):
+        if checkpoints is None:
+            return
+        try:
+            checkpoints.save_article(source_name, progress['link'], progress['stage'], article_data, progress['failures'],
+                                     progress['written_to'])
+        except Exception as e:
+            print(f"Error saving checkpoint for {progress['link']}:", e)
+
+    for source_name, links in links_by_source.items():
+        for position, link in enumerate(links):
+            saved = None
+            if checkpoints is not None:
                 try:
-                    article_data['text'] = ' '.join(article.text.split()[:1000]) # Take only first 1000 words
-                    article_data['text'] = sanitise_text(article_data['text'])
+                    saved = checkpoints.article(source_name, link)
                 except Exception as e:
-                    print(f"Error retrieving text for link {link}:", e)
-                    article_data['text'] = 'N/A'
+                    print(f"Error reading checkpoint for {link}:", e)
+            jobs.put((source_name, position, link, saved))
 
-                print(f"Article data found: {article_data}")
-                articles_data.append(article_data)
-                text_list.append(article_data['text'])
+    session = make_session(pool_size=workers) if FAST_PATH_OUTLETS else None
+
+    def scrape_worker():
+        # Workers only hold a browser session once an article actually needs one
+        drivers = []
+
+        def get_driver():
+            if not drivers:
+                drivers.append(pool.acquire())
+            return drivers[0]
+
+        try:
+            while True:
+                try:
+                    source_name, position, link, saved = jobs.get_nowait()
+                except queue.Empty:
+                    return
+                progress = {'link': link, 'stage': SCRAPED, 'failures': 0, 'written_to': []}
+                if saved is not None:
+                    # An earlier run already got this far with the article
+                    print(f"Resuming {link} from its checkpoint ({saved['stage']})")
+                    tracer.count("checkpoint.resumed")
+                    progress.update(stage=saved['stage'], failures=saved['failures'], written_to=saved['written_to'])
+                    to_analyse.put((source_name, position, saved['article_data'], progress))
+                    continue
+
+                # Unchanged articles still pass through as None so the writer knows not to wait for them
+                with tracer.article(link, source_name), tracer.span("article"):
+                    article_data = scrape_article(get_driver, link, source_name, session, url_index, archive)
+                if article_data is None:
+                    progress['stage'] = WRITTEN
+                save_checkpoint(source_name, article_data, progress)
+                to_analyse.put((source_name, position, article_data, progress))
+        finally:
+            for driver in drivers:
+                pool.release(driver)
+
+    def analyse_worker():
+        finished = False
+        while not finished:
+            # Take whatever has queued up (up to a batch) so EquiQuote gets batches without waiting for them to fill
+            batch = [to_analyse.get()]
+            while len(batch) < EQUIQUOTE_BATCH_SIZE:
+                try:
+                    batch.append(to_analyse.get_nowait())
+                except queue.Empty:
+                    break
+            if batch[-1] is done:
+                batch.pop()
+                finished = True
+
+            # Articles analysed by an earlier run keep the results it saved
+            scraped = [item for item in batch if item[2] is not None and item[3]['stage'] == SCRAPED]
+            try:
+                add_equiquote_results(pool, [item[2] for item in scraped], cache)
             except Exception as e:
-                print(f"Error processing article link {link}:", e)
-                article_data['title'] = 'N/A'
-                article_data['byline'] = 'N/A'
-                article_data['time'] = 'N/A'
-                article_data['text'] = 'N/A'
-                articles_data.append(article_data) 
-                
-        driver.quit()
-        results_recommendations = []
-        results_sources_suggested = []
-        results_sources_detected = []
-        
+                print("Error getting results from EquiQuote:", e)
+            for source_name, _, article_data, progress in scraped:
+                if article_data['text'] == 'N/A' or article_data['recommendations'] != 'N/A':
+                    progress['stage'] = ANALYSED
+                else:
+                    progress['failures'] += 1
+                save_checkpoint(source_name, article_data, progress)
+
+            for item in batch:
+                to_write.put(item)
+        to_write.put(done)
+
+    scrapers = [threading.Thread(target=scrape_worker, daemon=True) for _ in range(max(1, min(workers, jobs.qsize())))]
+    analyser = threading.Thread(target=analyse_worker, daemon=True)
+    for thread in scrapers + [analyser]:
+        thread.start()
+
+    def close_analysis():
+        for thread in scrapers:
+            thread.join()
+        to_analyse.put(done)
+
+    threading.Thread(target=close_analysis, daemon=True).start()
+
+    # Write in link order: hold back any article that finished before the ones listed above it
+    next_position = {source_name: 0 for source_name in links_by_source}
+    pending = {source_name: {} for source_name in links_by_source}
+    exported = {source_name: 0 for source_name in links_by_source}
+    # Articles left for a later run: ones EquiQuote couldn't analyse yet, and ones that couldn't be written
+    unfinished = {source_name: 0 for source_name in links_by_source}
+
+    def write(source_name, article_data, progress):
+        if article_data is None or progress['stage'] == WRITTEN:
+            return
+        if progress['stage'] == SCRAPED and checkpoints is not None and progress['failures'] <= CHECKPOINT_ANALYSIS_RETRIES:
+            print(f"Holding back {progress['link']} until EquiQuote can analyse it on a later run")
+            unfinished[source_name] += 1
+            return
+        # A failed write only affects its own outlet, and the next run tries it again, skipping the sinks
+        # that already took the article
         try:
-            # Get results from EquiQuote
-            results_recommendations, results_sources_suggested, results_sources_detected = get_equiquote_results(text_list)
-            
-            # Incorporate the results into articles_data
-            for i, data in enumerate(articles_data):
-                data['recommendations'] = results_recommendations[i] if i < len(results_recommendations) else 'N/A'
-                data['sources_detected'] = results_sources_detected[i] if i < len(results_sources_detected) else 'N/A'
-                data['source_suggestions'] = results_sources_suggested[i] if i < len(results_sources_suggested) else 'N/A'
+            sink.write(source_name, article_data, skip=progress['written_to'])
         except Exception as e:
-            print("Error getting results from EquiQuote:", e)
-            for data in articles_data:
-                data['recommendations'] = 'N/A'
-                data['sources_detected'] = 'N/A'
-                data['source_suggestions'] = 'N/A'
+            print(f"Error writing {progress['link']}:", e)
+            progress['written_to'] += getattr(e, 'written', [])
+            save_checkpoint(source_name, article_data, progress)
+            unfinished[source_name] += 1
+            return
+        exported[source_name] += 1
+        progress['stage'] = WRITTEN
+        save_checkpoint(source_name, article_data, progress)
+        record_in_index(url_index, source_name, article_data)
+
+    while True:
+        item = to_write.get()
+        if item is done:
+            break
+        source_name, position, article_data, progress = item
+        pending[source_name][position] = (article_data, progress)
+
+        while next_position[source_name] in pending[source_name]:
+            write(source_name, *pending[source_name].pop(next_position[source_name]))
+            next_position[source_name] += 1
+
+        if next_position[source_name] == len(links_by_source[source_name]):
+            sink.flush()
+
+    # Anything still held back was waiting on an article that failed outright, so write it anyway
+    for source_name, articles in pending.items():
+        for position in sorted(articles):
+            write(source_name, *articles[position])
+    sink.flush()
+
+    analyser.join()
+    if session is not None:
+        session.close()
+
+    for source_name, count in exported.items():
+        if count:
+            print(f"Data exported for {source_name}: {count} articles")
+        else:
+            print(f"No new articles for {source_name}")
+
+        if checkpoints is None:
+            continue
+        if unfinished[source_name] or next_position[source_name] < len(links_by_source[source_name]):
+            print(f"{source_name} has articles left over, its next run will pick them up")
+            continue
+        try:
+            checkpoints.finish(source_name)
+        except Exception as e:
+            print(f"Error clearing checkpoint for {source_name}:", e)
 
-        # Save the articles data to a CSV
-        date_str = datetime.now().strftime('%Y-%m-%d')
-        filename = f"data/{source_name}_{date_str}.csv"
 
-        try:
-            with open(filename, 'w', newline='') as csvfile:
-                fieldnames = ['title', 'byline', 'time', 'link', 'text', 'recommendations', 'source_suggestions', 'sources_detected']
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+def open_stores():
+    '''Open the URL index, EquiQuote result cache, output sink, run checkpoints and snapshot archive that runs
+    write to. Any of them but the sink is left out (None) if it can't be opened'''
 
-                writer.writeheader()
-                for data in articles_data:
-                    writer.writerow(data)
+    url_index = None
+    if INCREMENTAL_CRAWL:
+        try:
+            url_index = UrlIndex(URL_INDEX_PATH)
         except Exception as e:
-            print("Error writing to CSV:", e)
-
-        print(f"Data exported to {filename}")
+            print("Error opening URL index, scraping every article:", e)
 
     try:
-        service = Service(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service)
+        cache = ResultCache(RESULT_CACHE_PATH, EQUIQUOTE_VERSION, RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_MAX_AGE_DAYS,
+                            NEAR_DUPLICATE_THRESHOLD)
     except Exception as e:
-        print("Error initialising webdriver:", e)
-        return
+        print("Error opening EquiQuote result cache, analysing every article:", e)
+        cache = None
 
     try:
-        bbc_home = ScrapeBBCHomepage(driver)
-        print("BBC links found: ", bbc_home.links)
+        sink = make_sink(OUTPUT_SINKS, OUTPUT_DIR)
     except Exception as e:
-        print("Error scraping BBC homepage:", e)
-        return
-    
-    try:
-        mail_home = ScrapeMailHomepage(driver)
-        print("Mail Online links found: ", mail_home.links)
-    except Exception as e:
-        print("Error scraping Mail Online homepage:", e)
+        print("Error setting up output, writing CSVs only:", e)
+        sink = make_sink(["csv"], OUTPUT_DIR)
+
+    checkpoints = None
+    if CHECKPOINT_PATH:
+        try:
+            checkpoints = Checkpoints(CHECKPOINT_PATH, CHECKPOINT_MAX_AGE_HOURS)
+        except Exception as e:
+            print("Error opening run checkpoints, runs will start from scratch:", e)
+
+    archive = None
+    if SNAPSHOT_DIR:
+        try:
+            archive = SnapshotArchive(SNAPSHOT_DIR)
+        except Exception as e:
+            print("Error opening snapshot archive, pages won't be archived:", e)
+
+    return url_index, cache, sink, checkpoints, archive
+
+
+def close_stores(url_index, cache, sink, checkpoints=None, archive=None):
+    sink.close()
+    close_equiquote_clients()
+    for store in (url_index, checkpoints, archive):
+        if store is not None:
+            store.close()
+
+    if cache is not None:
+        stats = cache.stats()
+        print("EquiQuote result cache:", stats)
+        tracer.count("result_cache.hits", stats['hits'])
+        tracer.count("result_cache.misses", stats['misses'])
+        tracer.count("result_cache.linked", stats['linked'])
+        cache.close()
+
+
+def scrape_outlets(pool, outlets, sink, cache=None, url_index=None, checkpoints=None, archive=None):
+    '''One run over some outlets: find the top links on each homepage, then scrape, analyse and write them.
+    An outlet with an unfinished checkpoint reuses the links its last run found. An outlet whose homepage
+    fails is left out of this run without affecting the others. Several runs can share the pool and
+    stores at the same time'''
+
+    links_by_source = {}
+    to_load = []
+    for outlet in outlets:
+        links = None
+        if checkpoints is not None:
+            try:
+                links = checkpoints.links(outlet.name)
+            except Exception as e:
+                print(f"Error reading checkpoint for {outlet.display_name}:", e)
+        if links is not None:
+            print(f"Resuming {outlet.display_name} from its last run, links: ", links)
+            links_by_source[outlet.name] = links
+        else:
+            to_load.append(outlet)
+
+    if to_load:
+        with pool.driver() as driver:
+            for outlet in to_load:
+                try:
+                    with tracer.span(f"homepage.{outlet.name}"):
+                        homepage = Homepage(driver, outlet)
+                    print(f"{outlet.display_name} links found: ", homepage.links)
+                except Exception as e:
+                    print(f"Error scraping {outlet.display_name} homepage, leaving it out of this run:", e)
+                    tracer.count(f"homepage.failed.{outlet.name}")
+                    continue
+                links_by_source[outlet.name] = homepage.links
+                if checkpoints is not None:
+                    try:
+                        checkpoints.save_links(outlet.name, homepage.links)
+                    except Exception as e:
+                        print(f"Error saving checkpoint for {outlet.display_name}:", e)
+
+    if not links_by_source:
         return
-    
+
+    # Each call is one run in sinks that record runs, such as the results database
+    sink.start_run(list(links_by_source))
     try:
-        sun_home = ScrapeSunHomepage(driver)
-        print("Sun links found: ", sun_home.links)
+        run_pipeline(pool, links_by_source, sink, workers=SCRAPE_WORKERS, cache=cache, url_index=url_index,
+                     checkpoints=checkpoints, archive=archive)
     except Exception as e:
-        print("Error scraping Sun homepage:", e)
-        return
-    
-    driver.quit()
+        print("Error in scraping articles:", e)
+    finally:
+        sink.end_run(list(links_by_source))
+
+
+def check_setup(outlets) -> bool:
+    '''Everything a run needs, short of starting Chrome and scraping: the stores open, chromedriver can be
+    found and every EquiQuote backend answers. Prints what was checked and returns whether it all passed'''
+
+    passed = True
 
-    def execute_scrape(links, source_name):
+    def check(name, test):
+        nonlocal passed
+        start = time.perf_counter()
         try:
-            service = Service(ChromeDriverManager().install())
-            driver = webdriver.Chrome(service=service)
-            scrape_articles(driver, links, source_name)
+            detail = test()
+            print(f"ok    {name} ({time.perf_counter() - start:.2f}s){f': {detail}' if detail else ''}")
         except Exception as e:
-            print(f"Error in scraping articles for {source_name}:", e)
-        finally:
-            driver.quit()
+            passed = False
+            print(f"FAIL  {name} ({time.perf_counter() - start:.2f}s): {e}")
+
+    def stores():
+        opened = open_stores()
+        missing = [name for name, store in zip(("url index", "result cache", "sink", "checkpoints", "snapshots"), opened)
+                   if store is None and name != "sink"]
+        close_stores(*opened)
+        if missing:
+            raise RuntimeError(f"couldn't open {', '.join(missing)}")
+
+    def equiquote(url):
+        import requests
+
+        health_url = f"{url}/api/health" if USE_EQUIQUOTE_API else url
+        response = requests.get(health_url, timeout=5)
+        if response.status_code != 200 and USE_EQUIQUOTE_API:
+            # The web page still works without the API
+            response = requests.get(url, timeout=5)
+            response.raise_for_status()
+            return "API unavailable, the web page will be used"
+        response.raise_for_status()
+
+    def budget():
+        if RUN_BUDGET is None:
+            return "no run budget"
+        runs = read_counter()
+        if runs >= RUN_BUDGET:
+            raise RuntimeError(f"all {RUN_BUDGET} runs in counter.txt are used up")
+        return f"{RUN_BUDGET - runs} of {RUN_BUDGET} runs left"
+
+    check(f"outlets: {', '.join(outlet.name for outlet in outlets)}", lambda: None)
+    check("run budget", budget)
+    check("stores", stores)
+    check("chromedriver", resolve_driver_path)
+    for url in EQUIQUOTE_URLS:
+        check(f"EquiQuote at {url}", lambda url=url: equiquote(url))
+    return passed
+
+
+def run_scrape_task(outlets=None):
+    '''Get links to the top news articles from every outlet's homepage (BBC, Mail Online and The Sun),
+    scrape their content, run them through EquiQuote and export all of the article data and results as a CSV'''
 
-    execute_scrape(bbc_home.links, "BBC")
-    execute_scrape(mail_home.links, "Mail")
-    execute_scrape(sun_home.links, "Sun")
+    instrument_waits(tracer)
+    outlets = list(outlets or OUTLETS.values())
+
+    # Scraping workers and any EquiQuote browser tabs each need their own session
+    with DriverPool(size=max(DRIVER_POOL_SIZE, SCRAPE_WORKERS + len(EQUIQUOTE_URLS) * EQUIQUOTE_TABS_PER_ENDPOINT)) as pool:
+        try:
+            with tracer.span("startup.warm_up"):
+                pool.warm_up(DRIVER_POOL_SIZE)
+        except Exception as e:
+            print("Error initialising webdriver:", e)
+            return
+        print(f"Browser ready {time.perf_counter() - IMPORT_STARTED:.2f}s after start")
+
+        stores = open_stores()
+        url_index, cache, sink, checkpoints, archive = stores
+        scrape_outlets(pool, outlets, sink, cache, url_index, checkpoints, archive)
+        close_stores(*stores)
+
+    try:
+        print("Run metrics written to", tracer.write_metrics(METRICS_DIR, PROMETHEUS_TEXTFILE))
+    except Exception as e:
+        print("Error writing run metrics:", e)
 
     print("All scrape tasks completed")
 
 
-run_scrape_task()
+def main(argv=None) -> int:
+    started = time.perf_counter()
+    parser = argparse.ArgumentParser(description="Scrape the top articles on each outlet's homepage and run them through EquiQuote")
+    parser.add_argument("--outlet", action="append", choices=list(OUTLETS), help="only scrape this outlet (can be given more than once)")
+    parser.add_argument("--check", "--dry-run", dest="check", action="store_true",
+                        help="check the stores, chromedriver and EquiQuote without starting Chrome or scraping")
+    parser.add_argument("--ignore-budget", action="store_true", help="run even if RUN_BUDGET is used up, without counting the run")
+    parser.add_argument("--clear-cache", action="store_true", help="drop every cached EquiQuote result before running")
+    args = parser.parse_args(argv)
+    outlets = [OUTLETS[name] for name in args.outlet] if args.outlet else list(OUTLETS.values())
+
+    tracer.record("startup.imports", started - IMPORT_STARTED)
+    print(f"Started in {started - IMPORT_STARTED:.2f}s")
+
+    if args.clear_cache:
+        try:
+            with ResultCache(RESULT_CACHE_PATH, EQUIQUOTE_VERSION, RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_MAX_AGE_DAYS,
+                             NEAR_DUPLICATE_THRESHOLD) as cache:
+                print(f"Cleared {cache.invalidate()} cached EquiQuote results")
+        except Exception as e:
+            print("Error clearing the EquiQuote result cache:", e)
+            return 1
+
+    if args.check:
+        return 0 if check_setup(outlets) else 1
+
+    # Check if we've used up the run budget already
+    if not args.ignore_budget and RUN_BUDGET is not None and read_counter() >= RUN_BUDGET:
+        print(f"Run budget of {RUN_BUDGET} used up, reset counter.txt to run again")
+        return 0
+
+    run_scrape_task(outlets)
 
+    # Increment the counter after a successful run
+    if not args.ignore_budget:
+        increment_counter()
+    return 0
 
-# Increment the counter after a successful run
-increment_counter()
 
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+from datetime import datetime
+import csv
+import io
+import json
+import os
+import threading
+import uuid
+
+
+FIELDNAMES = ['title', 'byline', 'time', 'link', 'text', 'recommendations', 'source_suggestions', 'sources_detected', 'linked_to']
+
+
+def scraped_at(article_data) -> datetime:
+    '''When the article was scraped: now, unless the record says otherwise (articles written again from the
+    snapshot archive are dated when their page was fetched)'''
+
+    value = article_data.get('scraped_at')
+    return datetime.fromisoformat(value) if value else datetime.now()
+
+
+def append_atomically(path, data: bytes):
+    '''Append a whole record with a single write and fsync it, so a crash can't leave half a row behind'''
+
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, data)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class CSVSink:
+    '''Append each article to data/{source}_{date}.csv as soon as it is complete'''
+
+    def __init__(self, directory="data"):
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, source_name, date_str=None) -> str:
+        date_str = date_str or datetime.now().strftime('%Y-%m-%d')
+        return os.path.join(self.directory, f"{source_name}_{date_str}.csv")
+
+    def write(self, source_name, article_data):
+        buffer = io.StringIO(newline='')
+        writer = csv.DictWriter(buffer, fieldnames=FIELDNAMES, extrasaction='ignore')
+        path = self.path(source_name, scraped_at(article_data).strftime('%Y-%m-%d'))
+
+        with self._lock:
+            if not os.path.exists(path) or os.path.getsize(path) == 0:
+                writer.writeheader()
+            writer.writerow(article_data)
+            append_atomically(path, buffer.getvalue().encode('utf-8'))
+
+    def start_run(self, source_names, kind="scrape"):
+        pass
+
+    def end_run(self, source_names):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def structured_record(source_name, article_data) -> dict:
+    '''Article data with sources_detected decoded from its JSON string, for sinks that keep structure'''
+
+    record = {'outlet': source_name, 'scraped_at': scraped_at(article_data).isoformat(timespec='seconds')}
+    record.update({field: article_data.get(field, 'N/A') for field in FIELDNAMES})
+    if record['sources_detected'] != 'N/A':
+        try:
+            record['sources_detected'] = json.loads(record['sources_detected'])
+        except (TypeError, ValueError):
+            pass
+    return record
+
+
+class JSONLSink:
+    '''Append each article as one JSON line to data/{source}_{date}.jsonl'''
+
+    def __init__(self, directory="data"):
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, source_name, date_str=None) -> str:
+        date_str = date_str or datetime.now().strftime('%Y-%m-%d')
+        return os.path.join(self.directory, f"{source_name}_{date_str}.jsonl")
+
+    def write(self, source_name, article_data):
+        record = structured_record(source_name, article_data)
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            append_atomically(self.path(source_name, record['scraped_at'][:10]), line.encode('utf-8'))
+
+    def start_run(self, source_names, kind="scrape"):
+        pass
+
+    def end_run(self, source_names):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class ParquetSink:
+    '''Write articles to Parquet files partitioned as data/parquet/outlet={source}/date={date}/.
+
+    Parquet files can't be appended to, so records are buffered and each flush writes a new part file,
+    first to a temporary name and then renamed into place so readers never see a partial file'''
+
+    def __init__(self, directory="data/parquet", batch_size=50):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("The parquet output needs pyarrow: pip install pyarrow")
+
+        self.pyarrow = pyarrow
+        self.parquet = pyarrow.parquet
+        self.directory = directory
+        self.batch_size = batch_size
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+    def write(self, source_name, article_data):
+        record = structured_record(source_name, article_data)
+        date_str = record['scraped_at'][:10]
+
+        # Nested values are stored as JSON text so every part file has the same all-string schema
+        for field in ('source_suggestions', 'sources_detected'):
+            if not isinstance(record[field], str):
+                record[field] = json.dumps(record[field], ensure_ascii=False)
+        del record['outlet']
+
+        with self._lock:
+            buffer = self._buffers.setdefault((source_name, date_str), [])
+            buffer.append(record)
+            if len(buffer) >= self.batch_size:
+                self.write_part(source_name, date_str, buffer)
+                self._buffers[(source_name, date_str)] = []
+
+    def write_part(self, source_name, date_str, records):
+        partition = os.path.join(self.directory, f"outlet={source_name}", f"date={date_str}")
+        os.makedirs(partition, exist_ok=True)
+
+        name = f"part-{datetime.now().strftime('%H%M%S')}-{uuid.uuid4().hex[:8]}.parquet"
+        temp_path = os.path.join(partition, f".{name}.tmp")
+        table = self.pyarrow.Table.from_pylist(records)
+        self.parquet.write_table(table, temp_path)
+        os.replace(temp_path, os.path.join(partition, name))
+
+    def start_run(self, source_names, kind="scrape"):
+        pass
+
+    def end_run(self, source_names):
+        pass
+
+    def flush(self):
+        with self._lock:
+            for (source_name, date_str), records in self._buffers.items():
+                if records:
+                    self.write_part(source_name, date_str, records)
+            self._buffers = {}
+
+    def close(self):
+        self.flush()
+
+
+class StoreSink:
+    '''Add each article to the indexed results database (data/results.sqlite3, see results_store.py).
+    Each scrape is recorded as its own run, from start_run to end_run. Several runs over different outlets
+    can be in progress at once; an outlet written outside a run gets one of its own'''
+
+    def __init__(self, directory="data"):
+        from results_store import ResultsStore
+
+        self.store = ResultsStore(os.path.join(directory, "results.sqlite3"))
+        self.run_ids = {}
+        self._lock = threading.Lock()
+
+    def start_run(self, source_names, kind="scrape"):
+        run_id = self.store.start_run(kind)
+        with self._lock:
+            for source_name in source_names:
+                self.run_ids[source_name] = run_id
+
+    def end_run(self, source_names):
+        with self._lock:
+            for source_name in source_names:
+                self.run_ids.pop(source_name, None)
+
+    def write(self, source_name, article_data):
+        with self._lock:
+            run_id = self.run_ids.get(source_name)
+        if run_id is None:
+            self.start_run([source_name])
+            with self._lock:
+                run_id = self.run_ids[source_name]
+        self.store.add_article(run_id, source_name, article_data, scraped_at(article_data).strftime('%Y-%m-%d'))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.store.close()
+
+
+SINKS = {"csv": CSVSink, "jsonl": JSONLSink, "parquet": ParquetSink, "sqlite": StoreSink}
+
+
+class SinkError(Exception):
+    '''A record couldn't be written to some of the sinks. errors maps each failed sink's name to its error,
+    and written lists the sinks that did take it'''
+
+    def __init__(self, errors, written=()):
+        self.errors = errors
+        self.written = list(written)
+        super().__init__("; ".join(f"{name}: {error}" for name, error in errors.items()))
+
+
+class MultiSink:
+    '''Send every record to several sinks, so one failing output doesn't stop the others. A record that
+    any sink failed to write raises SinkError once the rest have had it, so the caller can keep it for
+    a later run. Sinks are named by their class, and the ones named in skip are left out'''
+
+    def __init__(self, sinks):
+        self.sinks = sinks
+
+    def write(self, source_name, article_data, skip=()) -> list:
+        '''Write a record to every sink but the skipped ones, and return the names of those that took it'''
+
+        written, errors = [], {}
+        for sink in self.sinks:
+            name = type(sink).__name__
+            if name in skip:
+                continue
+            try:
+                sink.write(source_name, article_data)
+                written.append(name)
+            except Exception as e:
+                print(f"Error writing to {name}:", e)
+                errors[name] = e
+        if errors:
+            raise SinkError(errors, written)
+        return written
+
+    def start_run(self, source_names, kind="scrape"):
+        '''A scrape over these outlets starts: sinks that group records by run start a new one'''
+
+        for sink in self.sinks:
+            try:
+                sink.start_run(source_names, kind)
+            except Exception as e:
+                print(f"Error starting a run in {type(sink).__name__}:", e)
+
+    def end_run(self, source_names):
+        for sink in self.sinks:
+            try:
+                sink.end_run(source_names)
+            except Exception as e:
+                print(f"Error ending the run in {type(sink).__name__}:", e)
+
+    def flush(self):
+        for sink in self.sinks:
+            try:
+                sink.flush()
+            except Exception as e:
+                print(f"Error flushing {type(sink).__name__}:", e)
+
+    def close(self):
+        for sink in self.sinks:
+            try:
+                sink.close()
+            except Exception as e:
+                print(f"Error closing {type(sink).__name__}:", e)
+
+
+def make_sink(names, directory="data") -> MultiSink:
+    '''Build the output from a list of sink names, e.g. ["csv", "parquet"]'''
+
+    sinks = []
+    for name in names:
+        if name not in SINKS:
+            raise ValueError(f"Unknown output sink: {name}")
+        if name == "parquet":
+            sinks.append(ParquetSink(os.path.join(directory, "parquet")))
+        else:
+            sinks.append(SINKS[name](directory))
+    return MultiSink(sinks)
@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Every article page the scraper fetches, kept as gzipped HTML and stored once per distinct page, so
+extraction can be run again over the archive after an outlet changes its markup (the BBC's generated
+class names especially), without crawling the pages again or opening a browser.
+
+    python snapshot_archive.py replay --outlet BBC --since 2023-07-01 > bbc_reextracted.csv
+    python snapshot_archive.py replay --outlet BBC --since 2023-07-01 --to-sinks
+    python snapshot_archive.py stats
+
+Replay parses the pages in parallel with the current selectors in outlets.py and prints the fields as
+CSV, with a count of pages each field was found on. With --to-sinks the articles are written to the
+scraper's OUTPUT_SINKS instead, dated when their page was fetched, to backfill days that were extracted
+badly. The file outputs go to their own directory (data/replay, or --sink-dir), so the day's files keep
+one row per article; the results database replaces the rows it already has. The archive has no EquiQuote
+results: they come from the scraper's result cache when the text was analysed before, or are N/A.'''
+
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+import argparse
+import csv
+import gzip
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+
+
+class SnapshotArchive:
+    '''Pages are stored under objects/ by the SHA-256 of their HTML, so a page fetched again unchanged
+    costs one index row. The index (index.sqlite3) records every fetch: URL, outlet, when, and whether
+    it came over HTTP (the server's HTML) or from the browser (the page as rendered)'''
+
+    def __init__(self, directory="data/snapshots", compress_level=6):
+        self.directory = directory
+        self.compress_level = compress_level
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.join(directory, "objects"), exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(directory, "index.sqlite3"), check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        with self.db:
+            self.db.execute('''CREATE TABLE IF NOT EXISTS snapshots (
+                id INTEGER PRIMARY KEY,
+                url TEXT,
+                source TEXT,
+                fetched_at TEXT,
+                via TEXT,
+                content_hash TEXT
+            )''')
+            self.db.execute('CREATE INDEX IF NOT EXISTS snapshots_source_fetched ON snapshots (source, fetched_at)')
+            self.db.execute('CREATE INDEX IF NOT EXISTS snapshots_url ON snapshots (url)')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self.db.close()
+
+    def object_path(self, content_hash) -> str:
+        return os.path.join(self.directory, "objects", content_hash[:2], f"{content_hash}.html.gz")
+
+    def add(self, url, source, page_html, via="http") -> str:
+        '''Archive one fetched page and return its content hash'''
+
+        if isinstance(page_html, str):
+            page_html = page_html.encode('utf-8')
+        content_hash = hashlib.sha256(page_html).hexdigest()
+
+        path = self.object_path(content_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Written under a temporary name first, so a crash never leaves a truncated page behind
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as file:
+                file.write(gzip.compress(page_html, self.compress_level))
+            os.replace(temp_path, path)
+
+        with self._lock, self.db:
+            self.db.execute('INSERT INTO snapshots (url, source, fetched_at, via, content_hash) VALUES (?, ?, ?, ?, ?)',
+                            (url, source, datetime.now().isoformat(timespec='seconds'), via, content_hash))
+        return content_hash
+
+    def read(self, content_hash) -> bytes:
+        with gzip.open(self.object_path(content_hash), 'rb') as file:
+            return file.read()
+
+    def snapshots(self, source=None, since=None, until=None) -> list:
+        '''Each distinct page of each URL (the first time it was fetched), oldest first. since and until
+        are dates (YYYY-MM-DD), both included'''
+
+        conditions, params = [], []
+        if source:
+            conditions.append('source = ?')
+            params.append(source)
+        if since:
+            conditions.append('fetched_at >= ?')
+            params.append(since)
+        if until:
+            conditions.append('fetched_at < ?')
+            params.append((datetime.strptime(until, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d'))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+        with self._lock:
+            rows = self.db.execute(
+                f'SELECT url, source, MIN(fetched_at) AS fetched_at, via, content_hash FROM snapshots {where} '
+                'GROUP BY url, content_hash ORDER BY fetched_at', params,
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def stats(self) -> dict:
+        with self._lock:
+            fetches, pages, urls = self.db.execute(
+                'SELECT COUNT(*), COUNT(DISTINCT content_hash), COUNT(DISTINCT url) FROM snapshots').fetchone()
+        stored = 0
+        for root, _, files in os.walk(os.path.join(self.directory, "objects")):
+            stored += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+        return {'fetches': fetches, 'distinct_pages': pages, 'urls': urls, 'stored_bytes': stored}
+
+
+def extract_snapshot(job) -> dict:
+    '''Run in a worker process: read one archived page and extract its fields'''
+
+    from fast_extract import parse_article
+
+    path, source = job
+    try:
+        with gzip.open(path, 'rb') as file:
+            return parse_article(file.read(), source)
+    except Exception as e:
+        return {'error': str(e)}
+
+
+def backfill_record(snapshot, fields, cache=None) -> dict:
+    '''Article data for the output sinks from a replayed page, dated when the page was fetched. The
+    EquiQuote results are taken from the result cache when it has them for the text, or a near-duplicate'''
+
+    from fast_extract import article_text
+
+    article_data = {field: fields.get(field) or 'N/A' for field in ('title', 'byline', 'time')}
+    article_data['text'] = article_text(fields['text']) if fields.get('text') else 'N/A'
+    article_data.update(link=snapshot['url'], scraped_at=snapshot['fetched_at'], recommendations='N/A',
+                        source_suggestions='N/A', sources_detected='N/A', linked_to='')
+    if cache is None or article_data['text'] == 'N/A':
+        return article_data
+
+    cached = cache.get(article_data['text'])
+    if cached is not None:
+        article_data['recommendations'], article_data['source_suggestions'], article_data['sources_detected'] = cached
+        return article_data
+    similar = cache.get_similar(article_data['text'])
+    if similar is not None:
+        (article_data['recommendations'], article_data['source_suggestions'], article_data['sources_detected']), \
+            article_data['linked_to'], _ = similar
+    return article_data
+
+
+def backfill_sink(names, directory="data", replay_directory=None):
+    '''The output for --to-sinks: the file sinks named write to replay_directory (default directory/replay),
+    away from the day's files, and the results database in directory, where a replayed article replaces
+    the stored row'''
+
+    from sinks import StoreSink, make_sink
+
+    sink = make_sink([name for name in names if name != "sqlite"], replay_directory or os.path.join(directory, "replay"))
+    if "sqlite" in names:
+        sink.sinks.append(StoreSink(directory))
+    return sink
+
+
+def replay(archive, source=None, since=None, until=None, workers=None):
+    '''Extract every archived page again with the outlets' current selectors, spread over worker
+    processes. Yields (snapshot, fields) in archive order'''
+
+    snapshots = archive.snapshots(source, since, until)
+    jobs = [(archive.object_path(snapshot['content_hash']), snapshot['source']) for snapshot in snapshots]
+    if not jobs:
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        chunksize = max(1, len(jobs) // ((workers or os.cpu_count() or 1) * 4))
+        yield from zip(snapshots, executor.map(extract_snapshot, jobs, chunksize=chunksize))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archived article pages, and extraction over them again")
+    parser.add_argument("--dir", default="data/snapshots", help="archive directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    replay_parser = commands.add_parser("replay", help="extract every archived page again and print CSV")
+    replay_parser.add_argument("--outlet")
+    replay_parser.add_argument("--since", help="first fetch date, YYYY-MM-DD")
+    replay_parser.add_argument("--until", help="last fetch date, YYYY-MM-DD")
+    replay_parser.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    replay_parser.add_argument("--output", help="CSV file to write (default: stdout)")
+    replay_parser.add_argument("--to-sinks", action="store_true",
+                               help="write the articles to the scraper's OUTPUT_SINKS instead of printing CSV")
+    replay_parser.add_argument("--sink-dir", help="directory for the file outputs of --to-sinks (default: replay/ in OUTPUT_DIR)")
+
+    commands.add_parser("stats", help="how much is archived")
+    args = parser.parse_args()
+
+    with SnapshotArchive(args.dir) as archive:
+        if args.command == "stats":
+            for key, value in archive.stats().items():
+                print(f"{key}: {value}")
+            sys.exit(0)
+
+        from outlets import OUTLETS
+
+        if args.outlet and args.outlet not in OUTLETS:
+            parser.error(f"Unknown outlet {args.outlet}, expected one of {', '.join(OUTLETS)}")
+
+        sink = None
+        cache = None
+        if args.to_sinks:
+            from result_cache import ResultCache
+            from scraper import (EQUIQUOTE_VERSION, NEAR_DUPLICATE_THRESHOLD, OUTPUT_DIR, OUTPUT_SINKS, RESULT_CACHE_MAX_AGE_DAYS,
+                                 RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_PATH)
+
+            sink = backfill_sink(OUTPUT_SINKS, OUTPUT_DIR, args.sink_dir)
+            sink.start_run([args.outlet] if args.outlet else list(OUTLETS), "replay")
+            try:
+                cache = ResultCache(RESULT_CACHE_PATH, EQUIQUOTE_VERSION, RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_MAX_AGE_DAYS,
+                                    NEAR_DUPLICATE_THRESHOLD)
+            except Exception as e:
+                print("Error opening EquiQuote result cache, EquiQuote results will be N/A:", e, file=sys.stderr)
+        else:
+            fieldnames = ['link', 'outlet', 'fetched_at', 'via', 'title', 'byline', 'time', 'text', 'error']
+            output = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+            writer = csv.DictWriter(output, fieldnames=fieldnames, extrasaction='ignore')
+            writer.writeheader()
+
+        pages = 0
+        written = 0
+        found = {}
+        for snapshot, fields in replay(archive, args.outlet, args.since, args.until, args.workers):
+            pages += 1
+            for name, value in fields.items():
+                if value and name != 'error':
+                    found[name] = found.get(name, 0) + 1
+            if sink is None:
+                writer.writerow(dict(fields, link=snapshot['url'], outlet=snapshot['source'],
+                                     fetched_at=snapshot['fetched_at'], via=snapshot['via']))
+                continue
+            if 'error' in fields:
+                print(f"Error re-extracting {snapshot['url']}:", fields['error'], file=sys.stderr)
+                continue
+            try:
+                sink.write(snapshot['source'], backfill_record(snapshot, fields, cache))
+                written += 1
+            except Exception as e:
+                print(f"Error writing {snapshot['url']}:", e, file=sys.stderr)
+
+        if sink is not None:
+            sink.end_run([args.outlet] if args.outlet else list(OUTLETS))
+            sink.close()
+            if cache is not None:
+                cache.close()
+            print(f"Wrote {written} articles to {', '.join(OUTPUT_SINKS)}", file=sys.stderr)
+        elif output is not sys.stdout:
+            output.close()
+
+        # The counts go to stderr so they don't end up in the CSV
+        print(f"Re-extracted {pages} pages", file=sys.stderr)
+        for name in ('title', 'byline', 'time', 'text'):
+            print(f"  {name}: found on {found.get(name, 0)}", file=sys.stderr)
@@ -0,0 +1,63 @@
+import time
+
+from checkpoints import ANALYSED, SCRAPED, WRITTEN, Checkpoints
+
+LINKS = ["https://example.com/1", "https://example.com/2", "https://example.com/3"]
+
+
+def article(n):
+    return {'link': LINKS[n], 'title': f"Story {n}", 'text': f"Text {n}", 'recommendations': 'N/A'}
+
+
+def test_unfinished_run_is_resumed_after_a_restart(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite3")
+    with Checkpoints(path) as checkpoints:
+        assert checkpoints.links("BBC") is None
+        checkpoints.save_links("BBC", LINKS)
+        checkpoints.save_article("BBC", LINKS[0], WRITTEN, dict(article(0), recommendations="done"))
+        checkpoints.save_article("BBC", LINKS[1], SCRAPED, article(1), failures=1)
+        # Skipped as unchanged
+        checkpoints.save_article("BBC", LINKS[2], SCRAPED, None)
+
+    with Checkpoints(path) as checkpoints:
+        assert checkpoints.links("BBC") == LINKS
+        assert checkpoints.article("BBC", LINKS[0])['stage'] == WRITTEN
+        assert checkpoints.article("BBC", LINKS[1]) == {'stage': SCRAPED, 'article_data': article(1), 'failures': 1,
+                                                    'written_to': []}
+        assert checkpoints.article("BBC", LINKS[2])['article_data'] is None
+        assert checkpoints.links("Sun") is None
+
+        checkpoints.save_article("BBC", LINKS[1], ANALYSED, dict(article(1), recommendations="done"))
+        assert checkpoints.article("BBC", LINKS[1])['article_data']['recommendations'] == "done"
+
+
+def test_finish_clears_only_that_outlet(tmp_path):
+    with Checkpoints(str(tmp_path / "checkpoints.sqlite3")) as checkpoints:
+        for outlet in ("BBC", "Sun"):
+            checkpoints.save_links(outlet, LINKS)
+            checkpoints.save_article(outlet, LINKS[0], WRITTEN, article(0))
+
+        checkpoints.finish("BBC")
+        assert checkpoints.links("BBC") is None
+        assert checkpoints.article("BBC", LINKS[0]) is None
+        assert checkpoints.links("Sun") == LINKS
+        assert checkpoints.article("Sun", LINKS[0])['stage'] == WRITTEN
+
+
+def test_new_links_start_the_outlet_again(tmp_path):
+    with Checkpoints(str(tmp_path / "checkpoints.sqlite3")) as checkpoints:
+        checkpoints.save_links("BBC", LINKS)
+        checkpoints.save_article("BBC", LINKS[0], WRITTEN, article(0))
+        checkpoints.save_links("BBC", LINKS[1:])
+        assert checkpoints.links("BBC") == LINKS[1:]
+        assert checkpoints.article("BBC", LINKS[0]) is None
+
+
+def test_stale_checkpoint_is_not_resumed(tmp_path):
+    with Checkpoints(str(tmp_path / "checkpoints.sqlite3"), max_age_hours=1) as checkpoints:
+        checkpoints.save_links("BBC", LINKS)
+        checkpoints.save_article("BBC", LINKS[0], ANALYSED, article(0))
+        checkpoints.db.execute('UPDATE outlet_runs SET started_at = ?', (time.time() - 2 * 60 * 60,))
+
+        assert checkpoints.links("BBC") is None
+        assert checkpoints.article("BBC", LINKS[0]) is None
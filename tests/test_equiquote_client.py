@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+import equiquote_stub
+from equiquote_client import EquiQuoteAPIError, EquiQuoteClient, format_result
+
+TEXTS = ["Jane Smith said the plans were late.", "John Smith said it was fine. Mark Jones said so too.", "No one was quoted."]
+
+
+class NoBatchHandler(equiquote_stub.StubHandler):
+    '''A backend from before the batch endpoint'''
+
+    batches = 0
+
+    def do_POST(self):
+        if self.path == "/api/analyse_batch":
+            NoBatchHandler.batches += 1
+            self.read_json()
+            self.send_json(404, {"error": "not found"})
+        else:
+            super().do_POST()
+
+
+def serve(handler=equiquote_stub.StubHandler):
+    server = equiquote_stub.serve_in_thread(port=0, handler=handler)
+    return server, EquiQuoteClient(f"http://127.0.0.1:{server.server_port}", workers=2, batch_size=2)
+
+
+@pytest.fixture
+def stub():
+    server, client = serve()
+    yield client
+    client.close()
+    server.shutdown()
+
+
+def test_batches_come_back_in_order(stub):
+    results = stub.analyse_all(TEXTS)
+    assert results == [equiquote_stub.analyse_text(text) for text in TEXTS]
+    assert stub.supports_batch
+
+
+def test_backend_without_batches_is_sent_one_text_at_a_time():
+    server, client = serve(NoBatchHandler)
+    try:
+        assert client.analyse_all(TEXTS) == [equiquote_stub.analyse_text(text) for text in TEXTS]
+        assert not client.supports_batch
+        # The batches sent at once each find it missing, and after that it isn't tried again
+        tried = NoBatchHandler.batches
+        assert 1 <= tried <= 2
+        client.analyse_all(TEXTS)
+        assert NoBatchHandler.batches == tried
+    finally:
+        client.close()
+        server.shutdown()
+
+
+def test_get_results_matches_the_ui_scraper(stub):
+    recommendations, suggestions, detected = stub.get_results(TEXTS)
+    assert recommendations[0] == "There are more women than men quoted in your story."
+    assert suggestions[0] == [{"job": "Spokesperson", "suggestions": "Stub suggestion for a spokesperson"}]
+    assert [source["Source"] for source in json.loads(detected[1])] == ["John Smith", "Mark Jones"]
+    # Nobody quoted: no suggestions and no sources
+    assert (suggestions[2], detected[2]) == ('N/A', 'N/A')
+
+
+def test_missing_result_is_na():
+    assert format_result(None) == ('N/A', 'N/A', 'N/A')
+    assert format_result({"recommendations": "", "source_suggestions": [], "sources_detected": []}) == ('N/A', 'N/A', 'N/A')
+
+
+def test_unreachable_backend_raises():
+    server = equiquote_stub.serve_in_thread(port=0)
+    port = server.server_port
+    server.shutdown()
+    server.server_close()
+
+    client = EquiQuoteClient(f"http://127.0.0.1:{port}", timeout=2)
+    with pytest.raises(EquiQuoteAPIError):
+        client.analyse_all(TEXTS)
+    client.close()
@@ -0,0 +1,157 @@
+import queue
+import threading
+import time
+
+import pytest
+
+import scraper
+from equiquote_client import EquiQuoteAPIError
+from equiquote_dispatch import BrowserLane, Dispatcher, LaneDown
+
+
+class FakeLane:
+    '''A lane that answers after `delay` seconds, failing the first `failures` texts it is given'''
+
+    def __init__(self, name, delay=0.0, failures=0, down=False, healthy=True, batch_size=1):
+        self.name = name
+        self.delay = delay
+        self.failures = failures
+        self.down = down
+        self.is_healthy = healthy
+        self.batch_size = batch_size
+        self.seen = []
+        self.health_checks = 0
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def healthy(self, timeout=5):
+        self.health_checks += 1
+        return self.is_healthy
+
+    def start(self):
+        pass
+
+    def analyse(self, texts):
+        with self._lock:
+            self.seen.extend(texts)
+        if self.down:
+            raise LaneDown("backend went away")
+        time.sleep(self.delay)
+        results = []
+        for text in texts:
+            with self._lock:
+                failed = self.failures > 0
+                self.failures -= failed
+            results.append(None if failed else (f"{self.name}: {text}", [], "[]"))
+        return results
+
+    def close(self):
+        self.closed = True
+
+
+class FakeDriver:
+    def get(self, url):
+        pass
+
+
+class FakePool:
+    def __init__(self, size):
+        self.drivers = queue.Queue()
+        for _ in range(size):
+            self.drivers.put(FakeDriver())
+
+    def acquire(self, timeout=None):
+        return self.drivers.get(timeout=timeout)
+
+    def release(self, driver):
+        self.drivers.put(driver)
+
+
+def test_results_come_back_in_order():
+    lanes = [FakeLane("a"), FakeLane("b", batch_size=3)]
+    texts = [f"text {n}" for n in range(10)]
+    results = Dispatcher(lanes).run(texts)
+    assert [result[0].split(": ")[1] for result in results] == texts
+
+
+def test_idle_lane_steals_a_slow_text():
+    slow = FakeLane("slow", delay=1.5)
+    fast = FakeLane("fast")
+    start = time.monotonic()
+    [result] = Dispatcher([slow, fast], steal_after=0.2).run(["only text"])
+
+    assert result == ("fast: only text", [], "[]")
+    assert fast.seen == ["only text"]
+    assert time.monotonic() - start < 1.2
+
+
+def test_failed_text_is_retried_up_to_max_attempts():
+    lane = FakeLane("a", failures=1)
+    assert Dispatcher([lane], max_attempts=2).run(["text"]) == [("a: text", [], "[]")]
+    assert lane.seen == ["text", "text"]
+
+    lane = FakeLane("a", failures=5)
+    assert Dispatcher([lane], max_attempts=3).run(["text"]) == [None]
+    assert lane.seen == ["text"] * 3
+
+
+def test_texts_of_a_lane_that_goes_down_go_to_the_others():
+    down = FakeLane("down", down=True)
+    up = FakeLane("up", delay=0.05)
+    results = Dispatcher([down, up]).run(["one", "two", "three"])
+    assert results == [("up: one", [], "[]"), ("up: two", [], "[]"), ("up: three", [], "[]")]
+
+
+def test_unhealthy_lanes_are_left_out():
+    sick = FakeLane("sick", healthy=False)
+    well = FakeLane("well")
+    assert Dispatcher([sick, well]).run(["text"]) == [("well: text", [], "[]")]
+    assert sick.seen == []
+
+    with pytest.raises(EquiQuoteAPIError):
+        Dispatcher([FakeLane("sick", healthy=False)]).run(["text"])
+
+
+def test_each_backend_is_checked_once():
+    lanes = [FakeLane("a"), FakeLane("a"), FakeLane("b")]
+    Dispatcher(lanes).run(["one", "two"])
+    assert [lane.health_checks for lane in lanes] == [1, 0, 1]
+
+    # Lanes the caller has checked already aren't checked again
+    lanes = [FakeLane("a"), FakeLane("b")]
+    Dispatcher(lanes).run(["one"], check_health=False)
+    assert [lane.health_checks for lane in lanes] == [0, 0]
+
+
+def test_lane_that_lost_a_steal_is_waited_for():
+    slow = FakeLane("slow", delay=2.0)
+    dispatcher = Dispatcher([slow, FakeLane("fast")], steal_after=0.2)
+    assert dispatcher.run(["only text"]) == [("fast: only text", [], "[]")]
+    assert not slow.closed
+    assert not dispatcher.join(timeout=0.05)
+
+    assert dispatcher.join()
+    assert slow.closed
+
+
+def test_browser_tabs_are_back_in_the_pool_before_it_closes(monkeypatch):
+    calls = []
+
+    def analyse_page(driver, text):
+        calls.append(text)
+        # The first copy is slow, so the other tab steals it and answers first
+        time.sleep(2.0 if len(calls) == 1 else 0)
+        return ("done", [], "[]")
+
+    monkeypatch.setattr(scraper, "EQUIQUOTE_URLS", ["http://equiquote.invalid"])
+    monkeypatch.setattr(scraper, "USE_EQUIQUOTE_API", False)
+    monkeypatch.setattr(scraper, "EQUIQUOTE_TABS_PER_ENDPOINT", 2)
+    monkeypatch.setattr(scraper, "EQUIQUOTE_STEAL_AFTER", 0.2)
+    monkeypatch.setattr(scraper, "analyse_in_page", analyse_page)
+    monkeypatch.setattr(BrowserLane, "healthy", lambda self, timeout=5: True)
+    pool = FakePool(2)
+
+    assert scraper.analyse_texts(pool, ["only text"]) == (["done"], [[]], ["[]"])
+    assert pool.drivers.qsize() == 1
+    scraper.close_equiquote_clients()
+    assert pool.drivers.qsize() == 2
@@ -0,0 +1,48 @@
+import json
+import os
+
+import pytest
+
+from fast_extract import parse_article
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "fixtures")
+
+with open(os.path.join(FIXTURES, "manifest.json"), encoding="utf-8") as file:
+    MANIFEST = json.load(file)
+
+TITLES = [
+    "Hospital waiting lists reach record high",
+    "Train strikes to go ahead next week",
+    "Heatwave warning issued for southern England",
+    "Council approves plans for new housing estate",
+    "Schools prepare for new term amid teacher shortage",
+]
+
+# Byline and publication time of article-N on each outlet
+EXPECTED = {
+    "BBC": lambda n: (f"By BBC Reporter {n}", f"2023-08-0{n}T{5 + n:02d}:30:00.000Z"),
+    "Mail": lambda n: (f"Mail Reporter {n}", f"2023-08-0{n}T{6 + n:02d}:15:00+0100"),
+    "Sun": lambda n: (f"Sun Reporter {n}", f"2023-08-0{n}T{7 + n:02d}:00:00+01:00"),
+}
+
+ARTICLES = [(outlet, url, path) for outlet, spec in MANIFEST.items() for url, path in spec['articles'].items()]
+
+
+@pytest.mark.parametrize("outlet,url,path", ARTICLES, ids=[path for _, _, path in ARTICLES])
+def test_parse_article_reads_every_field(outlet, url, path):
+    with open(os.path.join(FIXTURES, path), "rb") as file:
+        fields = parse_article(file.read(), outlet)
+
+    number = int(path.rsplit("-", 1)[1].split(".")[0])
+    byline, published = EXPECTED[outlet](number)
+    assert fields['title'] == TITLES[number - 1]
+    assert fields['byline'] == byline
+    assert fields['time'] == published
+    assert fields['text'].startswith(TITLES[number - 1])
+    assert fields['text'].endswith("would publish an update in the autumn.")
+
+
+def test_parse_article_leaves_missing_fields_empty():
+    fields = parse_article(b"<html><body><p>Nothing here</p></body></html>", "BBC")
+    assert set(fields) == {'title', 'byline', 'time', 'text'}
+    assert not fields['title'] and not fields['byline'] and not fields['time']
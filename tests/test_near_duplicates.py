@@ -0,0 +1,30 @@
+import pytest
+
+from result_cache import ResultCache
+
+TEXT = (" ".join(f"Paragraph {n} of the story says the council met on Tuesday to discuss the plans for the new "
+                 f"estate, and residents spoke for and against them." for n in range(12)))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite3"), "1.0", near_duplicate_threshold=0.8)
+    yield cache
+    cache.close()
+
+
+def test_near_duplicate_reuses_the_results_of_the_original(cache):
+    cache.put(TEXT, "recommendations", [], "[]", link="https://example.com/a")
+    updated = TEXT.replace("Paragraph 11", "Paragraph eleven") + " Updated at 10:32."
+
+    results, link, similarity = cache.get_similar(updated)
+    assert results == ("recommendations", [], "[]")
+    assert link == "https://example.com/a"
+    assert 0.8 <= similarity < 1
+    assert cache.stats()['linked'] == 1
+
+
+def test_different_text_is_not_a_near_duplicate(cache):
+    cache.put(TEXT, "recommendations", [], "[]", link="https://example.com/a")
+    other = " ".join(f"Sentence {n}: the match ended in a draw after extra time at the stadium." for n in range(30))
+    assert cache.get_similar(other) is None
@@ -0,0 +1,33 @@
+from outlets import OUTLETS
+
+
+def candidate(url, tier=0, position=0, section="main"):
+    return {'url': url, 'tier': tier, 'position': position, 'section': section}
+
+
+def test_rank_links_prefers_higher_tiers_and_drops_duplicates_and_excluded():
+    bbc = OUTLETS["BBC"]
+    candidates = [
+        candidate("https://www.bbc.co.uk/news/uk-3", tier=1, position=0),
+        candidate("https://www.bbc.co.uk/news/uk-1", tier=0, position=1),
+        candidate("https://www.bbc.co.uk/news/uk-1#comments", tier=1, position=2),
+        candidate("https://www.bbc.co.uk/news/live/uk-9", tier=0, position=3),
+        candidate("https://www.bbc.co.uk/sport/football-1", tier=0, position=4),
+        candidate("https://www.bbc.co.uk/news/uk-2", tier=0, position=5),
+        candidate(None, tier=0, position=6),
+    ]
+
+    ranked = bbc.rank_links(candidates)
+    assert [link['url'] for link in ranked] == [
+        "https://www.bbc.co.uk/news/uk-1", "https://www.bbc.co.uk/news/uk-2", "https://www.bbc.co.uk/news/uk-3"]
+    assert [link['rank'] for link in ranked] == [1, 2, 3]
+
+
+def test_rank_links_takes_sections_in_turn_up_to_the_limit():
+    bbc = OUTLETS["BBC"]
+    candidates = [candidate(f"https://www.bbc.co.uk/news/top-{n}", position=n, section="top") for n in range(4)]
+    candidates += [candidate(f"https://www.bbc.co.uk/news/local-{n}", position=10 + n, section="local") for n in range(2)]
+
+    ranked = bbc.rank_links(candidates, limit=5)
+    assert [link['url'].rsplit("/", 1)[1] for link in ranked] == ["top-0", "local-0", "top-1", "local-1", "top-2"]
+    assert len(bbc.rank_links(candidates)) == bbc.links['limit']
@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+
+import pytest
+
+import scraper
+from checkpoints import ANALYSED, Checkpoints
+from sinks import CSVSink, MultiSink
+
+LINKS = [f"https://www.bbc.co.uk/news/uk-{n}" for n in range(3)]
+
+
+def article(link):
+    return {'title': f"Title of {link}", 'byline': "By Reporter", 'time': "2023-08-01", 'link': link,
+            'text': f"Text of {link}", 'recommendations': "done", 'source_suggestions': [], 'sources_detected': "[]",
+            'linked_to': ''}
+
+
+class BrokenSink:
+    def write(self, source_name, article_data):
+        raise OSError("disk full")
+
+    def start_run(self, source_names, kind="scrape"):
+        pass
+
+    def end_run(self, source_names):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def checkpoints(tmp_path):
+    checkpoints = Checkpoints(str(tmp_path / "checkpoints.sqlite3"))
+    yield checkpoints
+    checkpoints.close()
+
+
+def csv_links(csv_sink):
+    with open(csv_sink.path("BBC"), encoding="utf-8") as file:
+        return [line.split(",")[3] for line in file.read().splitlines()[1:]]
+
+
+def test_resumed_article_is_not_written_again_to_sinks_that_took_it(tmp_path, checkpoints):
+    checkpoints.save_links("BBC", LINKS[:1])
+    checkpoints.save_article("BBC", LINKS[0], ANALYSED, article(LINKS[0]))
+    csv_sink = CSVSink(str(tmp_path))
+    sink = MultiSink([csv_sink, BrokenSink()])
+
+    for _ in range(3):
+        scraper.run_pipeline(None, {"BBC": LINKS[:1]}, sink, checkpoints=checkpoints)
+
+    assert csv_links(csv_sink) == [LINKS[0]]
+    saved = checkpoints.article("BBC", LINKS[0])
+    assert saved['stage'] == ANALYSED
+    assert saved['written_to'] == ["CSVSink"]
+
+
+class Scrapes:
+    '''Stands in for scrape_article: later links load faster, and it records how many run at once'''
+
+    def __init__(self, links_by_source):
+        self.positions = {link: position for links in links_by_source.values() for position, link in enumerate(links)}
+        self.running = 0
+        self.most_at_once = 0
+        self.done = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, get_driver, link, source_name, session=None, url_index=None, archive=None):
+        with self._lock:
+            self.running += 1
+            self.most_at_once = max(self.most_at_once, self.running)
+        time.sleep(0.01 * (len(self.positions) - self.positions[link]) / len(self.positions))
+        with self._lock:
+            self.running -= 1
+            self.done += 1
+        return article(link)
+
+
+def analysed(pool, articles_data, cache=None):
+    for article_data in articles_data:
+        article_data['recommendations'] = "done"
+
+
+def test_articles_are_scraped_concurrently_and_written_in_link_order(tmp_path, monkeypatch):
+    links_by_source = {"BBC": [f"https://www.bbc.co.uk/news/uk-{n}" for n in range(8)],
+                       "Sun": [f"https://www.thesun.co.uk/news/{n}" for n in range(8)]}
+    scrapes = Scrapes(links_by_source)
+    monkeypatch.setattr(scraper, "scrape_article", scrapes)
+    monkeypatch.setattr(scraper, "add_equiquote_results", analysed)
+    csv_sink = CSVSink(str(tmp_path))
+
+    scraper.run_pipeline(None, links_by_source, MultiSink([csv_sink]), workers=4)
+
+    assert scrapes.most_at_once > 1
+    for source_name, links in links_by_source.items():
+        with open(csv_sink.path(source_name), encoding="utf-8") as file:
+            assert [line.split(",")[3] for line in file.read().splitlines()[1:]] == links
+
+
+class SlowSink(CSVSink):
+    '''Writes slowly, and records how far scraping had got ahead of writing at each article'''
+
+    def __init__(self, directory, scrapes):
+        super().__init__(directory)
+        self.scrapes = scrapes
+        self.written = 0
+        self.most_ahead = 0
+
+    def write(self, source_name, article_data):
+        self.most_ahead = max(self.most_ahead, self.scrapes.done - self.written)
+        time.sleep(0.01)
+        super().write(source_name, article_data)
+        self.written += 1
+
+
+def test_scraping_is_held_back_when_writing_falls_behind(tmp_path, monkeypatch):
+    links_by_source = {"BBC": [f"https://www.bbc.co.uk/news/uk-{n}" for n in range(40)]}
+    scrapes = Scrapes(links_by_source)
+    monkeypatch.setattr(scraper, "scrape_article", scrapes)
+    monkeypatch.setattr(scraper, "add_equiquote_results", analysed)
+    monkeypatch.setattr(scraper, "PIPELINE_QUEUE_SIZE", 2)
+    monkeypatch.setattr(scraper, "EQUIQUOTE_BATCH_SIZE", 2)
+    sink = SlowSink(str(tmp_path), scrapes)
+
+    scraper.run_pipeline(None, links_by_source, MultiSink([sink]), workers=2)
+
+    assert sink.written == 40
+    # Two queues, a batch in analysis and one blocked put per worker, with room for the one being written
+    assert sink.most_ahead <= 2 + 2 + 2 + 2 + 1
@@ -0,0 +1,42 @@
+import pytest
+
+from result_cache import ResultCache
+
+TEXT = (" ".join(f"Paragraph {n} of the story says the council met on Tuesday to discuss the plans for the new "
+                 f"estate, and residents spoke for and against them." for n in range(12)))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite3"), "1.0", near_duplicate_threshold=0.8)
+    yield cache
+    cache.close()
+
+
+def test_exact_text_is_a_hit(cache):
+    cache.put(TEXT, "recommendations", [{'job': "Doctor"}], "[]", link="https://example.com/a")
+    assert cache.get(TEXT) == ("recommendations", [{'job': "Doctor"}], "[]")
+    assert cache.get(TEXT + " changed") is None
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_failed_analyses_are_not_cached(cache):
+    cache.put(TEXT, "N/A", "N/A", "N/A", link="https://example.com/a")
+    assert cache.get(TEXT) is None
+    assert cache.get_similar(TEXT) is None
+
+
+def test_new_equiquote_version_clears_the_cache(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    with ResultCache(path, "1.0", near_duplicate_threshold=0.8) as cache:
+        cache.put(TEXT, "recommendations", [], "[]", link="https://example.com/a")
+    with ResultCache(path, "2.0", near_duplicate_threshold=0.8) as cache:
+        assert cache.get(TEXT) is None
+        assert cache.get_similar(TEXT) is None
+
+
+def test_invalidate_drops_every_result(cache):
+    cache.put(TEXT, "recommendations", [], "[]", link="https://example.com/a")
+    assert cache.invalidate() == 1
+    assert cache.get(TEXT) is None
+    assert cache.get_similar(TEXT) is None
@@ -0,0 +1,92 @@
+import json
+
+import pytest
+
+from results_store import ResultsStore, parse_cell
+from sinks import CSVSink, StoreSink
+
+SOURCES = json.dumps([{'Source': "Jane Smith", 'Gender': "Female"}, {'Source': "John Smith", 'Gender': "Male"}])
+SUGGESTION = {'job': "economist", 'suggestions': "Ann Pettifor"}
+
+
+def article(n, **fields):
+    record = {'link': f"https://example.com/{n}", 'title': f"Story {n}", 'byline': "Jane Doe", 'time': "N/A",
+              'text': f"Text {n}", 'recommendations': "Balanced", 'sources_detected': SOURCES,
+              'source_suggestions': repr(SUGGESTION), 'linked_to': '', 'scraped_at': "2023-07-01T09:00:00"}
+    record.update(fields)
+    return record
+
+
+@pytest.fixture
+def store(tmp_path):
+    with ResultsStore(str(tmp_path / "results.sqlite3")) as store:
+        yield store
+
+
+def test_parse_cell_reads_json_reprs_and_single_dicts():
+    assert parse_cell(SOURCES)[1] == {'Source': "John Smith", 'Gender': "Male"}
+    assert parse_cell(repr([SUGGESTION])) == [SUGGESTION]
+    # Older CSVs hold one suggestion dict rather than a list
+    assert parse_cell(repr(SUGGESTION)) == [SUGGESTION]
+    assert parse_cell(SUGGESTION) == [SUGGESTION]
+    for empty in ('N/A', '', None, "not a list", "42"):
+        assert parse_cell(empty) == []
+
+
+def test_import_reads_only_rows_appended_since_the_last_import(store, tmp_path):
+    sink = CSVSink(str(tmp_path))
+    sink.write("BBC", article(1))
+    path = sink.path("BBC", "2023-07-01")
+    assert store.import_csv(path) == 1
+    assert store.import_csv(path) == 0
+
+    sink.write("BBC", article(2, source_suggestions=repr([SUGGESTION])))
+    assert store.import_csv(path) == 1
+    assert [row['link'] for row in store.articles()] == ["https://example.com/1", "https://example.com/2"]
+    assert store.query('SELECT COUNT(*) AS n FROM source_suggestions')[0]['n'] == 2
+    assert store.query('SELECT COUNT(DISTINCT run_id) AS n FROM articles')[0]['n'] == 1
+
+
+def test_articles_written_by_the_sqlite_output_are_not_imported_twice(tmp_path):
+    csv_sink, store_sink = CSVSink(str(tmp_path)), StoreSink(str(tmp_path))
+    for sink in (csv_sink, store_sink):
+        sink.write("BBC", article(1))
+    store = store_sink.store
+    assert store.import_csv(csv_sink.path("BBC", "2023-07-01")) == 0
+    assert len(store.articles()) == 1
+    store_sink.close()
+
+
+def test_a_changed_article_replaces_the_stored_row(store):
+    run_id = store.start_run()
+    article_id, added = store.add_article(run_id, "BBC", article(1), "2023-07-01")
+    assert added
+    store.db.execute('INSERT INTO evaluations VALUES (?, 1, 1, 1, NULL)', (article_id,))
+
+    changed = article(1, title="Story 1, updated", text="New text",
+                      sources_detected=json.dumps([{'Source': "Jane Smith", 'Gender': "Female"}]))
+    assert store.add_article(run_id, "BBC", changed, "2023-07-01") == (article_id, False)
+    [row] = store.articles()
+    assert (row['title'], row['men'], row['women']) == ("Story 1, updated", 0, 1)
+    assert store.query('SELECT article_id FROM evaluations') == [{'article_id': article_id}]
+
+    # A version without EquiQuote results keeps those of the same text
+    store.add_article(run_id, "BBC", dict(changed, title="Story 1", recommendations='N/A', sources_detected='N/A'), "2023-07-01")
+    [row] = store.articles()
+    assert (row['title'], row['recommendations'], row['women']) == ("Story 1", "Balanced", 1)
+
+
+def test_queries_filter_and_summarise(store):
+    run_id = store.start_run()
+    store.add_article(run_id, "BBC", article(1), "2023-07-01")
+    store.add_article(run_id, "BBC", article(2, byline="John Doe"), "2023-07-02")
+    store.add_article(run_id, "Sun", article(3), "2023-07-02")
+
+    assert [row['link'] for row in store.articles(outlet="BBC", since="2023-07-02")] == ["https://example.com/2"]
+    assert len(store.articles(byline="Jane Doe")) == 2
+    assert len(store.articles(limit=1)) == 1
+    assert {row['source'] for row in store.sources(gender="Female")} == {"Jane Smith"}
+    assert len(store.sources(outlet="Sun")) == 2
+    assert store.summary() == [{'outlet': "BBC", 'articles': 2, 'men': 2, 'women': 2},
+                               {'outlet': "Sun", 'articles': 1, 'men': 1, 'women': 1}]
+    assert [row['date'] for row in store.summary(by="date")] == ["2023-07-01", "2023-07-02"]
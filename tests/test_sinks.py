@@ -0,0 +1,101 @@
+import csv
+import json
+import os
+
+import pytest
+
+from sinks import CSVSink, JSONLSink, MultiSink, SinkError, make_sink
+
+SOURCES = json.dumps([{'Source': "Jane Smith", 'Gender': "Female"}])
+
+
+def article(n, **fields):
+    record = {'title': f"Story {n}", 'byline': "By Reporter", 'time': "2023-08-01", 'link': f"https://example.com/{n}",
+              'text': f"Text, with \"quotes\"\nand a new line {n}", 'recommendations': "Balanced",
+              'source_suggestions': [{'job': "economist", 'suggestions': "Ann"}], 'sources_detected': SOURCES,
+              'linked_to': '', 'scraped_at': "2023-08-01T09:30:00"}
+    record.update(fields)
+    return record
+
+
+class BrokenSink:
+    def write(self, source_name, article_data):
+        raise OSError("disk full")
+
+    def start_run(self, source_names, kind="scrape"):
+        pass
+
+    def end_run(self, source_names):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_csv_gets_one_header_and_a_row_per_article(tmp_path):
+    sink = CSVSink(str(tmp_path))
+    for n in range(3):
+        sink.write("BBC", article(n))
+
+    with open(sink.path("BBC", "2023-08-01"), newline='', encoding='utf-8') as file:
+        rows = list(csv.DictReader(file))
+    assert [row['link'] for row in rows] == [f"https://example.com/{n}" for n in range(3)]
+    assert rows[1]['text'] == article(1)['text']
+    assert 'scraped_at' not in rows[0]
+
+
+def test_articles_are_filed_under_the_day_they_were_scraped(tmp_path):
+    sink = CSVSink(str(tmp_path))
+    sink.write("BBC", article(1, scraped_at="2023-07-01T23:59:00"))
+    assert os.path.exists(sink.path("BBC", "2023-07-01"))
+    assert not os.path.exists(sink.path("BBC", "2023-08-01"))
+
+
+def test_jsonl_keeps_the_structure(tmp_path):
+    sink = JSONLSink(str(tmp_path))
+    sink.write("BBC", article(1))
+    sink.write("BBC", article(2, sources_detected='N/A'))
+
+    with open(sink.path("BBC", "2023-08-01"), encoding='utf-8') as file:
+        records = [json.loads(line) for line in file]
+    assert records[0]['outlet'] == "BBC" and records[0]['scraped_at'] == "2023-08-01T09:30:00"
+    assert records[0]['sources_detected'] == [{'Source': "Jane Smith", 'Gender': "Female"}]
+    assert records[0]['source_suggestions'] == [{'job': "economist", 'suggestions': "Ann"}]
+    assert records[1]['sources_detected'] == 'N/A'
+
+
+def test_parquet_parts_are_written_on_flush(tmp_path):
+    parquet = pytest.importorskip("pyarrow.parquet")
+    sink = make_sink(["parquet"], str(tmp_path))
+    for n in range(3):
+        sink.write("BBC", article(n))
+    partition = tmp_path / "parquet" / "outlet=BBC" / "date=2023-08-01"
+    assert not partition.exists()
+
+    sink.close()
+    [part] = os.listdir(partition)
+    table = parquet.read_table(str(partition / part))
+    assert table.column('link').to_pylist() == [f"https://example.com/{n}" for n in range(3)]
+    assert json.loads(table.column('sources_detected')[0].as_py()) == [{'Source': "Jane Smith", 'Gender': "Female"}]
+
+
+def test_a_failing_sink_doesnt_stop_the_others(tmp_path):
+    csv_sink = CSVSink(str(tmp_path))
+    sink = MultiSink([BrokenSink(), csv_sink])
+    with pytest.raises(SinkError) as error:
+        sink.write("BBC", article(1))
+    assert list(error.value.errors) == ["BrokenSink"]
+    assert error.value.written == ["CSVSink"]
+
+    # Written again, the sinks that took it are skipped
+    assert MultiSink([csv_sink]).write("BBC", article(1), skip=["CSVSink"]) == []
+    with open(csv_sink.path("BBC", "2023-08-01"), newline='', encoding='utf-8') as file:
+        assert len(list(csv.DictReader(file))) == 1
+
+
+def test_unknown_sink_name_is_an_error(tmp_path):
+    with pytest.raises(ValueError):
+        make_sink(["csv", "xml"], str(tmp_path))
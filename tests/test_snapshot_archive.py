@@ -0,0 +1,64 @@
+import csv
+import json
+import os
+
+from fast_extract import article_text
+from result_cache import ResultCache
+from results_store import ResultsStore
+from sinks import make_sink
+from snapshot_archive import SnapshotArchive, backfill_record, backfill_sink, replay
+
+FIXTURES = os.path.join(os.path.dirname(__file__), os.pardir, "benchmarks", "fixtures")
+
+SNAPSHOT = {'url': "https://www.bbc.co.uk/news/uk-1", 'source': "BBC", 'fetched_at': "2023-07-01T10:00:00",
+            'via': "http", 'content_hash': "abc"}
+
+
+def test_backfill_text_is_normalised_like_a_scraped_article():
+    text = " ".join(["word"] * 2000) + " \U0001F600"
+    record = backfill_record(SNAPSHOT, {'title': "Title", 'byline': "", 'time': "2023-07-01", 'text': text})
+
+    assert record['text'] == " ".join(["word"] * 1000)
+    assert record['byline'] == 'N/A'
+    assert (record['link'], record['scraped_at']) == (SNAPSHOT['url'], SNAPSHOT['fetched_at'])
+
+
+def test_backfill_replaces_stored_rows_and_keeps_the_day_files_apart(tmp_path):
+    manifest = json.load(open(os.path.join(FIXTURES, "manifest.json")))
+    pages = list(manifest["BBC"]["articles"].items())[:2]
+    with SnapshotArchive(str(tmp_path / "snapshots")) as archive:
+        for url, name in pages:
+            with open(os.path.join(FIXTURES, name), 'rb') as file:
+                archive.add(url, "BBC", file.read())
+        replayed = list(replay(archive, "BBC", workers=1))
+
+    [(first, first_fields), (second, second_fields)] = replayed
+    directory = str(tmp_path / "data")
+    with ResultCache(str(tmp_path / "cache.sqlite3"), "1") as cache:
+        cache.put(article_text(first_fields['text']), "Balanced", repr([{'job': "economist", 'suggestions': "Ann"}]),
+                  json.dumps([{'Source': "Jane Smith", 'Gender': "Female"}]))
+        # The day's CSV and the store already have the first article, extracted badly
+        day_sink = make_sink(["csv"], directory)
+        day_sink.write("BBC", dict(backfill_record(first, {'text': "Broken"}), title="Broken"))
+        with ResultsStore(os.path.join(directory, "results.sqlite3")) as store:
+            store.add_article(store.start_run(), "BBC", backfill_record(first, {'text': "Broken"}), first['fetched_at'][:10])
+
+        sink = backfill_sink(["csv", "sqlite"], directory)
+        sink.start_run(["BBC"], "replay")
+        for snapshot, fields in replayed:
+            sink.write("BBC", backfill_record(snapshot, fields, cache))
+        sink.end_run(["BBC"])
+        sink.close()
+
+    date = first['fetched_at'][:10]
+    with open(day_sink.sinks[0].path("BBC", date), newline='', encoding='utf-8') as file:
+        assert [row['title'] for row in csv.DictReader(file)] == ["Broken"]
+    with open(os.path.join(directory, "replay", f"BBC_{date}.csv"), newline='', encoding='utf-8') as file:
+        assert [row['link'] for row in csv.DictReader(file)] == [first['url'], second['url']]
+
+    with ResultsStore(os.path.join(directory, "results.sqlite3")) as store:
+        rows = {row['link']: row for row in store.articles()}
+        assert len(rows) == 2
+        assert rows[first['url']]['title'] == first_fields['title']
+        assert (rows[first['url']]['recommendations'], rows[first['url']]['women']) == ("Balanced", 1)
+        assert rows[second['url']]['recommendations'] is None
@@ -0,0 +1,86 @@
+import os
+import sys
+
+import pytest
+
+import scraper
+from fast_extract import make_session
+from url_index import UrlIndex
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "benchmarks"))
+from fixture_server import FixtureServer  # noqa: E402
+
+
+class ChromeArticle:
+    '''Stands in for the browser when the fast path can't read a page'''
+
+    def __init__(self, driver, url, outlet):
+        self.title, self.byline, self.time, self.text = "Title", "By Reporter", "2023-08-01", "Text read in Chrome"
+
+
+@pytest.fixture(scope="module")
+def fixtures():
+    fixtures = FixtureServer()
+    yield fixtures
+    fixtures.close()
+
+
+@pytest.fixture
+def url_index(tmp_path):
+    url_index = UrlIndex(str(tmp_path / "url_index.sqlite3"))
+    yield url_index
+    url_index.close()
+
+
+@pytest.fixture
+def session():
+    session = make_session()
+    yield session
+    session.close()
+
+
+def bbc_link(fixtures, n=0):
+    return fixtures.local_url(list(fixtures.manifest["BBC"]["articles"])[n])
+
+
+def no_driver():
+    raise AssertionError("Chrome shouldn't be needed")
+
+
+def test_record_keeps_the_stored_hash_and_validators(url_index):
+    url_index.record("https://example.com/1", "BBC", "hash", etag='"abc"', last_modified="Tue, 01 Aug 2023 10:00:00 GMT")
+    url_index.record("https://example.com/1", "BBC")
+    entry = url_index.get("https://example.com/1")
+    assert (entry['content_hash'], entry['etag'], entry['last_modified']) == ("hash", '"abc"', "Tue, 01 Aug 2023 10:00:00 GMT")
+    assert url_index.is_fresh("https://example.com/1", 1)
+    assert not url_index.is_fresh("https://example.com/2", 1)
+
+
+def test_unchanged_article_is_revalidated_and_skipped(fixtures, url_index, session):
+    link = bbc_link(fixtures)
+    article_data = scraper.scrape_article(no_driver, link, "BBC", session, url_index)
+    assert article_data['index_entry']['etag']
+    scraper.record_in_index(url_index, "BBC", dict(article_data, recommendations="done"))
+
+    assert scraper.scrape_article(no_driver, link, "BBC", session, url_index) is None
+
+
+def test_chrome_fallback_keeps_the_fast_path_validators(fixtures, url_index, session, monkeypatch):
+    monkeypatch.setattr(scraper, "ArticleContent", ChromeArticle)
+    monkeypatch.setattr(scraper, "get_outlet", lambda source_name: None)
+    # The Sun's selectors find nothing in a BBC page, so it has to be loaded in Chrome
+    link = bbc_link(fixtures, 1)
+    article_data = scraper.scrape_article(lambda: "driver", link, "Sun", session, url_index)
+    assert article_data['text'] == "Text read in Chrome"
+    assert article_data['index_entry']['etag'] == session.get(link).headers["ETag"]
+    scraper.record_in_index(url_index, "Sun", dict(article_data, recommendations="done"))
+
+    # Revalidated with the stored ETag, so neither the page nor Chrome is needed
+    assert scraper.scrape_article(no_driver, link, "Sun", session, url_index) is None
+
+
+def test_article_without_validators_waits_for_revisit_after_hours(url_index):
+    link = "https://www.bbc.co.uk/news/uk-1"
+    url_index.record(link, "BBC", "hash")
+    # No session: any fetch would fail, so None means it was skipped before fetching
+    assert scraper.scrape_article(no_driver, link, "BBC", None, url_index) is None
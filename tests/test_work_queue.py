@@ -0,0 +1,163 @@
+import threading
+import time
+
+import pytest
+
+import work_queue
+from work_queue import EXTRACT, RemoteQueue, WorkQueue, job_key, make_server
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.sqlite3"), lease_seconds=0.2, retry_delay=0.1)
+    yield queue
+    queue.close()
+
+
+def enqueue(queue, link="https://example.com/a", max_attempts=3):
+    return queue.enqueue(run_id="run", kind=EXTRACT, key=job_key("run", EXTRACT, link),
+                         payload={'outlet': "BBC", 'link': link, 'position': 0}, max_attempts=max_attempts)
+
+
+def test_enqueue_ignores_a_key_queued_before(queue):
+    assert enqueue(queue)
+    assert not enqueue(queue)
+    assert len(queue.jobs(run_id="run")) == 1
+
+
+def test_leased_job_is_handed_to_another_worker_when_its_lease_runs_out(queue):
+    enqueue(queue)
+    [job] = queue.lease(kinds=[EXTRACT], owner="first")
+    assert queue.lease(kinds=[EXTRACT], owner="second") == []
+
+    time.sleep(0.3)
+    [again] = queue.lease(kinds=[EXTRACT], owner="second")
+    assert again['id'] == job['id']
+    assert again['attempts'] == 2
+    assert not queue.heartbeat(job_id=job['id'], owner="first")
+    assert queue.heartbeat(job_id=job['id'], owner="second")
+
+
+def test_heartbeat_keeps_the_lease(queue):
+    enqueue(queue)
+    [job] = queue.lease(kinds=[EXTRACT], owner="first")
+    for _ in range(3):
+        time.sleep(0.1)
+        assert queue.heartbeat(job_id=job['id'], owner="first")
+    assert queue.lease(kinds=[EXTRACT], owner="second") == []
+
+
+def test_failed_job_is_retried_until_it_runs_out_of_attempts(queue):
+    enqueue(queue, max_attempts=2)
+    [job] = queue.lease(kinds=[EXTRACT], owner="worker")
+    assert queue.fail(job_id=job['id'], owner="worker", error="first") == 'queued'
+    # Not due again until the retry delay has passed
+    assert queue.lease(kinds=[EXTRACT], owner="worker") == []
+
+    time.sleep(0.15)
+    [job] = queue.lease(kinds=[EXTRACT], owner="worker")
+    assert queue.fail(job_id=job['id'], owner="worker", error="second") == 'failed'
+    time.sleep(0.3)
+    assert queue.lease(kinds=[EXTRACT], owner="worker") == []
+    [job] = queue.jobs(run_id="run")
+    assert (job['status'], job['attempts'], job['error']) == ('failed', 2, "second")
+
+
+def test_lease_expiring_on_the_last_attempt_fails_the_job(queue):
+    enqueue(queue, max_attempts=1)
+    queue.lease(kinds=[EXTRACT], owner="worker")
+    time.sleep(0.3)
+    assert queue.lease(kinds=[EXTRACT], owner="other") == []
+    [job] = queue.jobs(run_id="run")
+    assert (job['status'], job['error']) == ('failed', 'lease expired')
+
+
+def test_complete_keeps_only_the_first_result(queue):
+    enqueue(queue)
+    [job] = queue.lease(kinds=[EXTRACT], owner="first")
+    time.sleep(0.3)
+    queue.lease(kinds=[EXTRACT], owner="second")
+
+    assert queue.complete(job_id=job['id'], owner="second", result={'text': "second"})
+    assert not queue.complete(job_id=job['id'], owner="first", result={'text': "first"})
+    [job] = queue.jobs(run_id="run")
+    assert job['status'] == 'done'
+    assert job['result'] == {'text': "second"}
+
+
+def test_fail_after_complete_leaves_the_job_done(queue):
+    enqueue(queue)
+    [job] = queue.lease(kinds=[EXTRACT], owner="worker")
+    queue.complete(job_id=job['id'], owner="worker", result={'text': "done"})
+
+    assert queue.fail(job_id=job['id'], owner="worker", error="late") == 'done'
+    assert queue.fail(job_id=job['id'], owner="worker", error="late") == 'done'
+    assert queue.fail(job_id=12345, owner="worker", error="late") == 'missing'
+    [job] = queue.jobs(run_id="run")
+    assert (job['status'], job['error']) == ('done', None)
+
+
+def test_mark_exported_records_sinks_and_finished_jobs(queue):
+    enqueue(queue)
+    [job] = queue.lease(kinds=[EXTRACT], owner="worker")
+    queue.complete(job_id=job['id'], owner="worker", result={'text': "done"})
+
+    queue.mark_exported(exports=[[job['id'], "CSVSink"]])
+    [exported] = queue.jobs(run_id="run")
+    assert exported['exported_to'] == ["CSVSink"]
+    assert exported['exported_at'] is None
+
+    queue.mark_exported(exports=[[job['id'], "CSVSink"], [job['id'], "JSONLSink"]], job_ids=[job['id']])
+    [exported] = queue.jobs(run_id="run")
+    assert sorted(exported['exported_to']) == ["CSVSink", "JSONLSink"]
+    assert exported['exported_at'] is not None
+
+
+@pytest.fixture
+def server(queue):
+    server = make_server(queue, "secret", port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_remote_queue_round_trip(server, queue):
+    remote = RemoteQueue(server, "secret")
+    try:
+        assert enqueue(remote)
+        [job] = remote.lease(kinds=[EXTRACT], owner="remote")
+        assert job['payload']['link'] == "https://example.com/a"
+        assert remote.heartbeat(job_id=job['id'], owner="remote")
+        assert remote.complete(job_id=job['id'], owner="remote", result={'text': "over HTTP"})
+        assert remote.counts(run_id="run") == {EXTRACT: {'done': 1}}
+        assert remote.latest_run() == "run"
+    finally:
+        remote.close()
+
+    # The server works on the same database
+    [job] = queue.jobs(run_id="run")
+    assert job['result'] == {'text': "over HTTP"}
+
+
+def test_remote_queue_needs_the_token(server):
+    for token in ("wrong", None):
+        remote = RemoteQueue(server, token)
+        try:
+            with pytest.raises(RuntimeError, match="token"):
+                remote.counts()
+        finally:
+            remote.close()
+
+
+def test_server_refuses_to_start_without_a_token(queue):
+    with pytest.raises(ValueError):
+        make_server(queue, None, port=0)
+
+
+def test_open_queue_picks_remote_for_urls(tmp_path):
+    assert isinstance(work_queue.open_queue("http://queue-host:8765", "secret"), RemoteQueue)
+    local = work_queue.open_queue(str(tmp_path / "local.sqlite3"))
+    assert isinstance(local, WorkQueue)
+    local.close()
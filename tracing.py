@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+from contextlib import contextmanager
+from datetime import datetime
+import json
+import os
+import statistics
+import threading
+import time
+
+
+class Tracer:
+    '''Timing spans and WebDriver command counts for one run, summarised as compact JSON metrics'''
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.durations = {}
+        self.counters = {}
+        self.articles = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record(self, name, seconds):
+        with self._lock:
+            self.durations.setdefault(name, []).append(seconds)
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    @contextmanager
+    def article(self, link, source_name):
+        '''Attribute the WebDriver commands and time spent on this thread to one article'''
+
+        stats = {'source': source_name, 'commands': 0, 'seconds': 0.0}
+        with self._lock:
+            self.articles[link] = stats
+        self._local.article = stats
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            stats['seconds'] = round(time.perf_counter() - start, 3)
+            self._local.article = None
+
+    def instrument_driver(self, driver):
+        '''Count and time every command a driver sends. Element lookups and waits all go through
+        driver.execute, so wrapping it on the instance sees everything'''
+
+        if getattr(driver, '_traced', False):
+            return driver
+        execute = driver.execute
+
+        def traced_execute(driver_command, params=None):
+            article = getattr(self._local, 'article', None)
+            if article is not None:
+                article['commands'] += 1
+            self.count('webdriver_commands')
+            start = time.perf_counter()
+            try:
+                return execute(driver_command, params)
+            finally:
+                self.record(f"webdriver.{driver_command}", time.perf_counter() - start)
+
+        driver.execute = traced_execute
+        driver._traced = True
+        return driver
+
+    def summary(self) -> dict:
+        with self._lock:
+            durations = {name: list(values) for name, values in self.durations.items()}
+            counters = dict(self.counters)
+            articles = {link: dict(stats) for link, stats in self.articles.items()}
+
+        spans = {}
+        for name, values in sorted(durations.items()):
+            spans[name] = {
+                'count': len(values),
+                'total': round(sum(values), 3),
+                'p50': round(statistics.median(values), 3),
+                'max': round(max(values), 3),
+            }
+
+        commands = [stats['commands'] for stats in articles.values()]
+        return {
+            'started_at': datetime.fromtimestamp(self.started_at).isoformat(timespec='seconds'),
+            'run_seconds': round(time.time() - self.started_at, 3),
+            'counters': counters,
+            'spans': spans,
+            'webdriver_commands_per_article': {
+                'mean': round(statistics.mean(commands), 1) if commands else 0,
+                'max': max(commands) if commands else 0,
+            },
+            'articles': articles,
+        }
+
+    def write_metrics(self, directory, prometheus_path=None) -> str:
+        summary = self.summary()
+
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"run_{datetime.fromtimestamp(self.started_at).strftime('%Y-%m-%d_%H%M%S')}.json")
+        with open(path, 'w') as file:
+            json.dump(summary, file, separators=(',', ':'))
+
+        if prometheus_path:
+            write_prometheus_textfile(summary, prometheus_path)
+        return path
+
+
+def write_prometheus_textfile(summary, path):
+    '''Write the run's metrics for node_exporter's textfile collector. The file is replaced atomically
+    so the collector never reads it half-written'''
+
+    lines = [
+        '# HELP equiquote_scraper_run_seconds Wall-clock time of the last run',
+        '# TYPE equiquote_scraper_run_seconds gauge',
+        f"equiquote_scraper_run_seconds {summary['run_seconds']}",
+        '# HELP equiquote_scraper_last_run_timestamp_seconds When the last run finished',
+        '# TYPE equiquote_scraper_last_run_timestamp_seconds gauge',
+        f"equiquote_scraper_last_run_timestamp_seconds {int(time.time())}",
+        '# HELP equiquote_scraper_span_seconds Time spent in each stage of the last run',
+        '# TYPE equiquote_scraper_span_seconds summary',
+    ]
+    for name, span in summary['spans'].items():
+        lines.append(f'equiquote_scraper_span_seconds_sum{{span="{name}"}} {span["total"]}')
+        lines.append(f'equiquote_scraper_span_seconds_count{{span="{name}"}} {span["count"]}')
+
+    lines += ['# HELP equiquote_scraper_events Events counted during the last run', '# TYPE equiquote_scraper_events gauge']
+    for name, value in sorted(summary['counters'].items()):
+        lines.append(f'equiquote_scraper_events{{event="{name}"}} {value}')
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as file:
+        file.write("\n".join(lines) + "\n")
+    os.replace(temp_path, path)
+
+
+def instrument_waits(tracer):
+    '''Time every WebDriverWait.until/until_not and count the ones that time out, by condition'''
+
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.support.wait import WebDriverWait
+
+    if getattr(WebDriverWait.until, 'traced', False):
+        return
+
+    def traced(original, kind):
+        def wait(self, method, message=""):
+            condition = getattr(method, '__qualname__', type(method).__name__).split('.')[0]
+            with tracer.span(f"{kind}.{condition}"):
+                try:
+                    return original(self, method, message)
+                except TimeoutException:
+                    tracer.count(f"wait_timeouts.{condition}")
+                    raise
+        wait.traced = True
+        return wait
+
+    WebDriverWait.until = traced(WebDriverWait.until, 'wait.until')
+    WebDriverWait.until_not = traced(WebDriverWait.until_not, 'wait.until_not')
+
+
+# Shared by every module so all spans of a run end up in one place
+tracer = Tracer()
+
+
+def reset():
+    '''Start a fresh set of metrics, e.g. for each run of a long-lived process. The shared tracer is
+    cleared in place so modules holding a reference to it keep recording into the new run'''
+
+    tracer.__dict__.update(Tracer().__dict__)
+    return tracer
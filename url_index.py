@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+
+def content_hash(article_data) -> str:
+    '''Hash of the fields we extract, to tell whether an article changed since we last scraped it'''
+
+    fields = [article_data.get(field, '') for field in ('title', 'byline', 'time', 'text')]
+    return hashlib.sha256('\x1f'.join(fields).encode('utf-8')).hexdigest()
+
+
+class UrlIndex:
+    '''Every article URL scraped across runs, with when it was last fetched, a hash of its content
+    and the ETag/Last-Modified headers needed to revalidate it cheaply'''
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        with self.db:
+            self.db.execute('''CREATE TABLE IF NOT EXISTS urls (
+                url TEXT PRIMARY KEY,
+                source TEXT,
+                first_seen REAL,
+                last_fetched REAL,
+                content_hash TEXT,
+                etag TEXT,
+                last_modified TEXT
+            )''')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self.db.close()
+
+    def get(self, url):
+        '''The stored entry for a URL as a dict, or None if it has never been scraped'''
+
+        with self._lock:
+            row = self.db.execute('SELECT * FROM urls WHERE url = ?', (url,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def is_fresh(self, url, max_age_hours) -> bool:
+        entry = self.get(url)
+        return entry is not None and time.time() - entry['last_fetched'] < max_age_hours * 60 * 60
+
+    def record(self, url, source, content_hash=None, etag=None, last_modified=None):
+        '''Store a fetch. A missing hash or validator keeps the one stored before'''
+
+        now = time.time()
+        with self._lock, self.db:
+            self.db.execute('''INSERT INTO urls VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    last_fetched = excluded.last_fetched,
+                    content_hash = COALESCE(excluded.content_hash, content_hash),
+                    etag = COALESCE(excluded.etag, etag),
+                    last_modified = COALESCE(excluded.last_modified, last_modified)
+            ''', (url, source, now, now, content_hash, etag, last_modified))
@@ -0,0 +1,655 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Run the scraper as jobs on a shared queue, so the browser work and the EquiQuote analysis can be spread
+over several machines. A coordinator queues a link-discovery job per outlet. Workers take jobs from the
+queue: discovering an outlet's links queues an extraction job for each article, and extracting an article
+queues its analysis. The coordinator writes each article out as soon as it is analysed.
+
+The queue is a SQLite database. Workers on other machines reach it through a small HTTP server, which
+only answers requests carrying the shared token in WORK_QUEUE_TOKEN (or --token), and listens on
+localhost unless given --host:
+
+    export WORK_QUEUE_TOKEN=...                                              # on every machine
+    python work_queue.py serve --host 0.0.0.0 --port 8765                   # on the machine with the queue
+    python work_queue.py coordinate --queue http://queue-host:8765
+    python work_queue.py worker --queue http://queue-host:8765 --kinds discover,extract --threads 4
+    python work_queue.py worker --queue http://queue-host:8765 --kinds analyse
+    python work_queue.py status --queue http://queue-host:8765
+
+--queue can also be the path of the database, for workers on the same machine as the queue.
+
+Workers lease jobs for a while and keep the lease alive while they work. A job whose worker dies is leased
+to another worker once its lease runs out, and a failed job is retried with a growing delay, up to
+max_attempts. Every job has a key (run, kind and outlet or link): queueing it again does nothing, and only
+the first result stored for a key is kept, so a job done twice (after a lease ran out) is written once.'''
+
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import hmac
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+
+
+DISCOVER = "discover"
+EXTRACT = "extract"
+ANALYSE = "analyse"
+KINDS = (DISCOVER, EXTRACT, ANALYSE)
+
+QUEUE_PATH = "data/work_queue.sqlite3"
+
+# Seconds a worker holds a job before another worker may take it over. Workers renew their lease every
+# third of this while they work on a job
+LEASE_SECONDS = 120
+
+# A failed job is tried this many times in all, waiting RETRY_DELAY seconds before the second try and
+# twice as long before each one after
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 30
+
+# Shared secret the queue server checks on every request and RemoteQueue sends with each one
+QUEUE_TOKEN = os.environ.get("WORK_QUEUE_TOKEN")
+
+
+class WorkQueue:
+    '''Jobs and their results in SQLite. Safe to use from several threads and processes on one machine'''
+
+    def __init__(self, path=QUEUE_PATH, lease_seconds=LEASE_SECONDS, retry_delay=RETRY_DELAY):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('''CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY,
+            run_id TEXT,
+            kind TEXT,
+            key TEXT UNIQUE,
+            payload TEXT,
+            status TEXT DEFAULT 'queued',
+            attempts INTEGER DEFAULT 0,
+            max_attempts INTEGER,
+            available_at REAL,
+            lease_owner TEXT,
+            lease_expires REAL,
+            error TEXT,
+            created_at REAL,
+            finished_at REAL
+        )''')
+        self.db.execute('''CREATE TABLE IF NOT EXISTS results (
+            key TEXT PRIMARY KEY,
+            run_id TEXT,
+            result TEXT,
+            stored_at REAL,
+            exported_at REAL
+        )''')
+        # Which sinks each job's result has been written to, so a run resumed after a crash skips them
+        self.db.execute('''CREATE TABLE IF NOT EXISTS exports (
+            job_id INTEGER,
+            sink TEXT,
+            exported_at REAL,
+            PRIMARY KEY (job_id, sink)
+        )''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, kind, available_at)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS jobs_run ON jobs (run_id, kind)')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self.db.close()
+
+    def transaction(self):
+        '''BEGIN IMMEDIATE takes the write lock up front, so two processes can't lease the same job'''
+
+        class Transaction:
+            def __enter__(inner):
+                self._lock.acquire()
+                self.db.execute('BEGIN IMMEDIATE')
+                return self.db
+
+            def __exit__(inner, exc_type, *exc_info):
+                try:
+                    self.db.execute('ROLLBACK' if exc_type else 'COMMIT')
+                finally:
+                    self._lock.release()
+
+        return Transaction()
+
+    def enqueue(self, run_id, kind, key, payload, max_attempts=MAX_ATTEMPTS) -> bool:
+        '''Queue a job, unless a job with this key was queued before. Returns whether it was queued'''
+
+        now = time.time()
+        with self.transaction() as db:
+            cursor = db.execute(
+                'INSERT OR IGNORE INTO jobs (run_id, kind, key, payload, max_attempts, available_at, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)', (run_id, kind, key, json.dumps(payload), max_attempts, now, now))
+        return cursor.rowcount == 1
+
+    def lease(self, kinds, owner, limit=1) -> list:
+        '''Up to limit jobs of these kinds for owner to work on, oldest first: queued ones that are due, and
+        ones whose worker's lease ran out'''
+
+        now = time.time()
+        marks = ', '.join('?' * len(kinds))
+        with self.transaction() as db:
+            # A job whose last try ran out of lease after its final attempt is not tried again
+            db.execute("UPDATE jobs SET status = 'failed', error = 'lease expired', finished_at = ? "
+                       "WHERE status = 'leased' AND lease_expires < ? AND attempts >= max_attempts", (now, now))
+            rows = db.execute(
+                f"SELECT * FROM jobs WHERE kind IN ({marks}) AND ((status = 'queued' AND available_at <= ?) "
+                f"OR (status = 'leased' AND lease_expires < ?)) ORDER BY id LIMIT ?", (*kinds, now, now, limit),
+            ).fetchall()
+            db.executemany("UPDATE jobs SET status = 'leased', lease_owner = ?, lease_expires = ?, attempts = attempts + 1 "
+                           "WHERE id = ?", [(owner, now + self.lease_seconds, row['id']) for row in rows])
+
+        jobs = []
+        for row in rows:
+            job = dict(row)
+            job['payload'] = json.loads(job['payload'])
+            job['attempts'] += 1
+            jobs.append(job)
+        return jobs
+
+    def heartbeat(self, job_id, owner) -> bool:
+        '''Renew a lease. False if the job has been handed to another worker since'''
+
+        with self.transaction() as db:
+            cursor = db.execute("UPDATE jobs SET lease_expires = ? WHERE id = ? AND lease_owner = ? AND status = 'leased'",
+                                (time.time() + self.lease_seconds, job_id, owner))
+        return cursor.rowcount == 1
+
+    def complete(self, job_id, owner, result) -> bool:
+        '''Store a job's result and mark it done. Only the first result for a job's key is kept, so a job
+        finished by two workers is only counted once. Returns whether this result was the one stored'''
+
+        now = time.time()
+        with self.transaction() as db:
+            row = db.execute('SELECT key, run_id FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if row is None:
+                return False
+            cursor = db.execute('INSERT OR IGNORE INTO results (key, run_id, result, stored_at) VALUES (?, ?, ?, ?)',
+                                (row['key'], row['run_id'], json.dumps(result), now))
+            db.execute("UPDATE jobs SET status = 'done', lease_owner = ?, finished_at = ?, error = NULL WHERE id = ?",
+                       (owner, now, job_id))
+        return cursor.rowcount == 1
+
+    def fail(self, job_id, owner, error) -> str:
+        '''Give a job back after an error: it is tried again later if it has attempts left, or marked failed.
+        Returns the job's new status'''
+
+        now = time.time()
+        with self.transaction() as db:
+            row = db.execute('SELECT attempts, max_attempts, status, lease_owner FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            # Nothing to do if another worker has the job now, or already finished it
+            if row is None or row['status'] != 'leased' or row['lease_owner'] != owner:
+                return row['status'] if row is not None else 'missing'
+            if row['attempts'] < row['max_attempts']:
+                status, available_at = 'queued', now + self.retry_delay * 2 ** (row['attempts'] - 1)
+            else:
+                status, available_at = 'failed', now
+            db.execute('UPDATE jobs SET status = ?, available_at = ?, lease_owner = NULL, error = ?, finished_at = ? '
+                       'WHERE id = ?', (status, available_at, str(error), now if status == 'failed' else None, job_id))
+        return status
+
+    def jobs(self, run_id, kind=None) -> list:
+        conditions, params = ['run_id = ?'], [run_id]
+        if kind:
+            conditions.append('kind = ?')
+            params.append(kind)
+        with self._lock:
+            rows = self.db.execute(
+                'SELECT j.id, j.key, j.kind, j.payload, j.status, j.attempts, j.error, r.result, r.exported_at, '
+                '(SELECT GROUP_CONCAT(e.sink) FROM exports e WHERE e.job_id = j.id) AS exported_to '
+                f'FROM jobs j LEFT JOIN results r USING (key) WHERE {" AND ".join("j." + c for c in conditions)} ORDER BY j.id',
+                params,
+            ).fetchall()
+        jobs = []
+        for row in rows:
+            job = dict(row)
+            job['payload'] = json.loads(job['payload'])
+            job['result'] = json.loads(job['result']) if job['result'] is not None else None
+            job['exported_to'] = job['exported_to'].split(',') if job['exported_to'] else []
+            jobs.append(job)
+        return jobs
+
+    def mark_exported(self, exports=(), job_ids=()):
+        '''In one transaction, record the sinks each job's result was written to (exports is a list of
+        [job_id, sink] pairs), and mark the jobs in job_ids as written to every sink'''
+
+        now = time.time()
+        with self.transaction() as db:
+            db.executemany('INSERT OR IGNORE INTO exports (job_id, sink, exported_at) VALUES (?, ?, ?)',
+                           [(job_id, sink, now) for job_id, sink in exports])
+            db.executemany('UPDATE results SET exported_at = ? WHERE key = (SELECT key FROM jobs WHERE id = ?)',
+                           [(now, job_id) for job_id in job_ids])
+
+    def counts(self, run_id=None) -> dict:
+        '''Jobs by kind and status, for one run or all of them'''
+
+        where, params = ('WHERE run_id = ?', [run_id]) if run_id else ('', [])
+        with self._lock:
+            rows = self.db.execute(f'SELECT kind, status, COUNT(*) FROM jobs {where} GROUP BY kind, status', params).fetchall()
+        counts = {}
+        for kind, status, count in rows:
+            counts.setdefault(kind, {})[status] = count
+        return counts
+
+    def latest_run(self):
+        with self._lock:
+            row = self.db.execute('SELECT run_id FROM jobs ORDER BY id DESC LIMIT 1').fetchone()
+        return row[0] if row is not None else None
+
+
+# ## Reaching the queue from other machines
+
+# What RemoteQueue can call on the WorkQueue behind a QueueServer
+REMOTE_METHODS = ("enqueue", "lease", "heartbeat", "complete", "fail", "jobs", "mark_exported", "counts", "latest_run")
+
+
+class QueueHandler(BaseHTTPRequestHandler):
+    '''POST /<method> with the method's keyword arguments as JSON, answered with {"result": ...}. Every
+    request must carry the server's token as "Authorization: Bearer <token>"'''
+
+    queue = None
+    token = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        method = self.path.strip("/")
+        length = int(self.headers.get("Content-Length", 0))
+        expected = f"Bearer {self.token}".encode("utf-8")
+        if not hmac.compare_digest(self.headers.get("Authorization", "").encode("utf-8"), expected):
+            self.rfile.read(length)
+            self.send_json(401, {"error": "missing or wrong queue token"})
+            return
+        if method not in REMOTE_METHODS:
+            self.rfile.read(length)
+            self.send_json(404, {"error": f"no such method: {method}"})
+            return
+        try:
+            kwargs = json.loads(self.rfile.read(length) or b"{}")
+            self.send_json(200, {"result": getattr(self.queue, method)(**kwargs)})
+        except Exception as e:
+            self.send_json(500, {"error": str(e)})
+
+
+def make_server(queue, token=QUEUE_TOKEN, host="127.0.0.1", port=8765) -> ThreadingHTTPServer:
+    if not token:
+        raise ValueError("The queue server needs a token: set WORK_QUEUE_TOKEN or pass --token")
+    handler = type("BoundQueueHandler", (QueueHandler,), {"queue": queue, "token": token})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+class RemoteQueue:
+    '''A WorkQueue on another machine, through its QueueServer. Has the same methods as WorkQueue'''
+
+    def __init__(self, url, token=QUEUE_TOKEN, timeout=30):
+        import requests
+
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        if token:
+            self.session.headers["Authorization"] = f"Bearer {token}"
+
+    def call(self, method, **kwargs):
+        response = self.session.post(f"{self.url}/{method}", json=kwargs, timeout=self.timeout)
+        payload = response.json()
+        if response.status_code != 200:
+            raise RuntimeError(f"Queue server error in {method}: {payload.get('error')}")
+        return payload["result"]
+
+    def __getattr__(self, name):
+        if name not in REMOTE_METHODS:
+            raise AttributeError(name)
+        return lambda **kwargs: self.call(name, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+def open_queue(location, token=QUEUE_TOKEN):
+    '''A RemoteQueue for an http(s) URL, otherwise the WorkQueue at that path'''
+
+    if location.startswith(("http://", "https://")):
+        return RemoteQueue(location, token)
+    return WorkQueue(location)
+
+
+# ## Coordinator
+
+
+def job_key(run_id, kind, name) -> str:
+    return f"{run_id}:{kind}:{name}"
+
+
+def coordinate(queue, outlets, sink, run_id=None, links_per_outlet=None, poll_seconds=5):
+    '''Queue one run over some outlets and write its articles out as they are analysed, in each outlet's
+    link order. Resuming a run_id picks up where it stopped: jobs already queued aren't queued again and
+    articles already written aren't written again. Returns when no job of the run is left to do'''
+
+    from sinks import SinkError
+
+    run_id = run_id or datetime.now().strftime('%Y%m%d-%H%M%S')
+    for outlet in outlets:
+        queue.enqueue(run_id=run_id, kind=DISCOVER, key=job_key(run_id, DISCOVER, outlet.name),
+                      payload={'run_id': run_id, 'outlet': outlet.name, 'limit': links_per_outlet})
+    print(f"Run {run_id} queued for {', '.join(outlet.name for outlet in outlets)}")
+
+    sink.start_run([outlet.name for outlet in outlets], "queue")
+    exported = {}
+    while True:
+        jobs = queue.jobs(run_id=run_id)
+        extractions = {}
+        analyses = {}
+        for job in jobs:
+            if job['kind'] == EXTRACT:
+                extractions.setdefault(job['payload']['outlet'], []).append(job)
+            elif job['kind'] == ANALYSE:
+                analyses[job['payload']['link']] = job
+
+        exports = []
+        finished = []
+        for source_name, outlet_jobs in extractions.items():
+            # Write in link order: stop at the first article that isn't finished yet
+            for job in sorted(outlet_jobs, key=lambda job: job['payload']['position']):
+                if job['status'] not in ('done', 'failed'):
+                    break
+                if job['exported_at'] is not None:
+                    continue
+                article_data = job['result']
+                if article_data is not None and article_data['text'] != 'N/A':
+                    analysis = analyses.get(job['payload']['link'])
+                    if analysis is None or analysis['status'] not in ('done', 'failed'):
+                        break
+                    if analysis['result'] is not None:
+                        article_data.update(analysis['result'])
+                if article_data is not None:
+                    # Sinks that already have this article from before a crash are skipped
+                    try:
+                        written = sink.write(source_name, article_data, skip=job['exported_to'])
+                    except SinkError as e:
+                        exports.extend([job['id'], name] for name in e.written)
+                        print(f"Holding back the rest of {source_name} until {job['payload']['link']} can be written")
+                        break
+                    exports.extend([job['id'], name] for name in written)
+                    exported[source_name] = exported.get(source_name, 0) + 1
+                finished.append(job['id'])
+        if exports or finished:
+            sink.flush()
+            queue.mark_exported(exports=exports, job_ids=finished)
+
+        if all(job['status'] in ('done', 'failed') for job in jobs):
+            break
+        time.sleep(poll_seconds)
+    sink.end_run([outlet.name for outlet in outlets])
+
+    for job in jobs:
+        if job['status'] == 'failed':
+            print(f"{job['kind']} job {job['key']} failed after {job['attempts']} attempts: {job['error']}")
+    for outlet in outlets:
+        print(f"Data exported for {outlet.name}: {exported.get(outlet.name, 0)} articles")
+    return run_id
+
+
+# ## Workers
+
+
+class Worker:
+    '''Takes jobs of some kinds from the queue and does them with the scraper's own functions. Holds no
+    state of its own between jobs beyond its browser sessions and the local EquiQuote result cache, so
+    any number of them can run on any machine that can reach the queue'''
+
+    def __init__(self, queue, kinds=KINDS, threads=1, owner=None, idle_seconds=5, lease_seconds=LEASE_SECONDS):
+        import scraper
+
+        self.scraper = scraper
+        self.queue = queue
+        self.kinds = list(kinds)
+        self.threads = max(1, threads)
+        self.owner = owner or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.idle_seconds = idle_seconds
+        self.lease_seconds = lease_seconds
+        self.stopping = threading.Event()
+
+        # Browser sessions for the discovery and extraction jobs, or for the EquiQuote page if its API is down
+        from driver_pool import DriverPool
+
+        self.pool = DriverPool(size=self.threads + len(scraper.EQUIQUOTE_URLS) * scraper.EQUIQUOTE_TABS_PER_ENDPOINT)
+        self.session = self.cache = self.archive = None
+        if EXTRACT in self.kinds:
+            from fast_extract import make_session
+
+            self.session = make_session(pool_size=self.threads) if scraper.FAST_PATH_OUTLETS else None
+            if scraper.SNAPSHOT_DIR:
+                try:
+                    self.archive = scraper.SnapshotArchive(scraper.SNAPSHOT_DIR)
+                except Exception as e:
+                    print("Error opening snapshot archive, pages won't be archived:", e)
+        if ANALYSE in self.kinds:
+            try:
+                self.cache = scraper.ResultCache(scraper.RESULT_CACHE_PATH, scraper.EQUIQUOTE_VERSION, scraper.RESULT_CACHE_MAX_ENTRIES,
+                                                 scraper.RESULT_CACHE_MAX_AGE_DAYS, scraper.NEAR_DUPLICATE_THRESHOLD)
+            except Exception as e:
+                print("Error opening EquiQuote result cache, analysing every article:", e)
+
+    def keep_leases(self, jobs, done):
+        '''Renew the leases on the jobs being worked on until done is set'''
+
+        while not done.wait(self.lease_seconds / 3):
+            for job in jobs:
+                if not self.queue.heartbeat(job_id=job['id'], owner=self.owner):
+                    print(f"Lost the lease on {job['key']}, another worker has it now")
+
+    def run(self):
+        workers = [threading.Thread(target=self.work, daemon=True) for _ in range(self.threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        # Waits for any EquiQuote tab still finishing a text, so it goes back to the pool before it closes
+        self.scraper.close_equiquote_clients()
+        self.pool.close()
+        for store in (self.session, self.cache, self.archive):
+            if store is not None:
+                store.close()
+
+    def stop(self, *args):
+        print("Stopping worker after the jobs in progress")
+        self.stopping.set()
+
+    def lease(self) -> list:
+        '''A batch of analysis jobs if there are any (EquiQuote takes texts in batches), otherwise one other job'''
+
+        others = [kind for kind in self.kinds if kind != ANALYSE]
+        try:
+            jobs = []
+            if ANALYSE in self.kinds:
+                jobs = self.queue.lease(kinds=[ANALYSE], owner=self.owner, limit=self.scraper.EQUIQUOTE_BATCH_SIZE)
+            if not jobs and others:
+                jobs = self.queue.lease(kinds=others, owner=self.owner, limit=1)
+            return jobs
+        except Exception as e:
+            print("Error leasing jobs:", e)
+            return []
+
+    def work(self):
+        while not self.stopping.is_set():
+            batch = self.lease()
+            if not batch:
+                self.stopping.wait(self.idle_seconds)
+                continue
+
+            done = threading.Event()
+            threading.Thread(target=self.keep_leases, args=(batch, done), daemon=True).start()
+            try:
+                if batch[0]['kind'] == ANALYSE:
+                    self.analyse(batch)
+                else:
+                    job = batch[0]
+                    result = self.discover(job) if job['kind'] == DISCOVER else self.extract(job)
+                    self.queue.complete(job_id=job['id'], owner=self.owner, result=result)
+            except Exception as e:
+                for job in batch:
+                    status = self.queue.fail(job_id=job['id'], owner=self.owner, error=str(e))
+                    print(f"Error in {job['kind']} job {job['key']} ({status}):", e)
+            finally:
+                done.set()
+
+    def discover(self, job) -> dict:
+        payload = job['payload']
+        outlet = self.scraper.get_outlet(payload['outlet'])
+        with self.pool.driver() as driver:
+            homepage = self.scraper.Homepage(driver, outlet, limit=payload.get('limit'))
+        print(f"{outlet.display_name} links found: ", homepage.links)
+
+        run_id = payload['run_id']
+        for link in homepage.ranked:
+            self.queue.enqueue(run_id=run_id, kind=EXTRACT, key=job_key(run_id, EXTRACT, link['url']),
+                               payload={'run_id': run_id, 'outlet': outlet.name, 'link': link['url'], 'position': link['rank']})
+        return {'links': homepage.ranked}
+
+    def extract(self, job):
+        payload = job['payload']
+        drivers = []
+
+        def get_driver():
+            if not drivers:
+                drivers.append(self.pool.acquire())
+            return drivers[0]
+
+        try:
+            # No URL index: every worker would keep its own, so unchanged articles can't be skipped reliably
+            article_data = self.scraper.scrape_article(get_driver, payload['link'], payload['outlet'], self.session,
+                                                       None, self.archive)
+        finally:
+            for driver in drivers:
+                self.pool.release(driver)
+
+        if article_data is not None and article_data['text'] != 'N/A':
+            run_id = payload['run_id']
+            self.queue.enqueue(run_id=run_id, kind=ANALYSE, key=job_key(run_id, ANALYSE, payload['link']),
+                               payload={'run_id': run_id, 'outlet': payload['outlet'], 'link': payload['link'],
+                                        'text': article_data['text']})
+        return article_data
+
+    def analyse(self, jobs):
+        articles = [{'link': job['payload']['link'], 'text': job['payload']['text'], 'recommendations': 'N/A',
+                     'source_suggestions': 'N/A', 'sources_detected': 'N/A', 'linked_to': ''} for job in jobs]
+        self.scraper.add_equiquote_results(self.pool, articles, self.cache)
+
+        for job, article in zip(jobs, articles):
+            if article['recommendations'] == 'N/A':
+                status = self.queue.fail(job_id=job['id'], owner=self.owner, error="EquiQuote couldn't analyse the text")
+                print(f"EquiQuote couldn't analyse {article['link']} ({status})")
+                continue
+            self.queue.complete(job_id=job['id'], owner=self.owner,
+                                result={field: article[field] for field in ('recommendations', 'source_suggestions', 'sources_detected', 'linked_to')})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Spread scraping and EquiQuote analysis over workers through a shared queue")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="serve the queue to workers on other machines")
+    serve_parser.add_argument("--db", default=QUEUE_PATH)
+    serve_parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: localhost only)")
+    serve_parser.add_argument("--port", type=int, default=8765)
+
+    coordinate_parser = commands.add_parser("coordinate", help="queue a run and write its articles out")
+    coordinate_parser.add_argument("--queue", default=QUEUE_PATH, help="queue database path or queue server URL")
+    coordinate_parser.add_argument("--outlet", action="append", help="only this outlet (can be given more than once)")
+    coordinate_parser.add_argument("--links", type=int, help="links per outlet (default: LINKS_PER_OUTLET)")
+    coordinate_parser.add_argument("--run-id", help="resume this run instead of starting a new one")
+
+    worker_parser = commands.add_parser("worker", help="do jobs from the queue")
+    worker_parser.add_argument("--queue", default=QUEUE_PATH, help="queue database path or queue server URL")
+    worker_parser.add_argument("--kinds", default=",".join(KINDS), help=f"comma-separated job kinds to take ({', '.join(KINDS)})")
+    worker_parser.add_argument("--threads", type=int, default=1, help="jobs worked on at once")
+
+    status_parser = commands.add_parser("status", help="jobs by kind and status")
+    status_parser.add_argument("--queue", default=QUEUE_PATH, help="queue database path or queue server URL")
+    status_parser.add_argument("--run-id", help="one run (default: the latest)")
+
+    for command_parser in (serve_parser, coordinate_parser, worker_parser, status_parser):
+        command_parser.add_argument("--token", default=QUEUE_TOKEN, help="shared queue token (default: $WORK_QUEUE_TOKEN)")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        if not args.token:
+            parser.error("serve needs a token: set WORK_QUEUE_TOKEN or pass --token")
+        server = make_server(WorkQueue(args.db), args.token, args.host, args.port)
+        print(f"Serving the work queue in {args.db} on port {server.server_port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        sys.exit(0)
+
+    queue = open_queue(args.queue, args.token)
+    if args.command == "status":
+        run_id = args.run_id or queue.latest_run()
+        print(f"Run {run_id}:" if run_id else "No runs queued yet")
+        for kind, statuses in queue.counts(run_id=run_id).items():
+            print(f"  {kind}: " + ", ".join(f"{count} {status}" for status, count in sorted(statuses.items())))
+
+    elif args.command == "coordinate":
+        import scraper
+        from outlets import OUTLETS
+        from sinks import make_sink
+
+        unknown = [name for name in args.outlet or [] if name not in OUTLETS]
+        if unknown:
+            parser.error(f"Unknown outlet {', '.join(unknown)}, expected one of {', '.join(OUTLETS)}")
+        outlets = [OUTLETS[name] for name in args.outlet] if args.outlet else list(OUTLETS.values())
+        sink = make_sink(scraper.OUTPUT_SINKS, scraper.OUTPUT_DIR)
+        try:
+            coordinate(queue, outlets, sink, args.run_id, args.links or scraper.LINKS_PER_OUTLET)
+        finally:
+            sink.close()
+
+    elif args.command == "worker":
+        import signal
+
+        kinds = [kind.strip() for kind in args.kinds.split(",") if kind.strip()]
+        unknown = [kind for kind in kinds if kind not in KINDS]
+        if unknown:
+            parser.error(f"Unknown job kind {', '.join(unknown)}, expected some of {', '.join(KINDS)}")
+        worker = Worker(queue, kinds, threads=args.threads)
+        signal.signal(signal.SIGTERM, worker.stop)
+        signal.signal(signal.SIGINT, worker.stop)
+        print(f"Worker {worker.owner} taking {', '.join(kinds)} jobs")
+        worker.run()
+
+    queue.close()